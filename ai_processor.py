@@ -1,164 +1,443 @@
 # ai_processor.py
+import logging
+import threading
+import time
+
 import google.generativeai as genai
-import json # For formatting data in the prompt
 
-from config import GEMINI_API_KEY
-from services.news_service import get_newsdata_io_news
+from config import (GEMINI_API_KEY, GEMINI_MODEL_NAME, REPORT_GEMINI_WAIT_SECONDS, ASSISTANT_PROMPT_TOKEN_BUDGET,
+                    NEWS_PROMPT_TOKEN_BUDGET, MAX_OUTPUT_TOKENS, BRIEF_MAX_OUTPUT_TOKENS, REPORT_OUTPUT_TOKENS_PER_COIN,
+                    NEWS_FETCH_SIZE, NEWS_TOP_K)
+from services.news_service import get_coin_news, get_coin_news_async
+from services.news_index import NewsIndex
+from services.news_store import news_store
+from services.answer_cache import answer_cache, make_answer_key
+from services.admission import provider_limits, report_limits
+from services.metrics import stage, record_stage, record_gemini_usage
+from services.prompt_builder import (PromptBudget, estimate_tokens, market_table, price_stats_table,
+                                     rank_articles, add_articles)
+
+logger = logging.getLogger(__name__)
+
+UNPARSEABLE_RESPONSE_MESSAGE = "Sorry, I received an empty or unparseable response from the AI."
+# Returned when the shared Gemini rate limit has no room for another call in time
+AI_BUSY_MESSAGE = "Sorry, the AI model is handling too many requests right now. Please try again in a minute."
+
+_model = None
+_model_lock = threading.Lock()
 
 def configure_gemini():
-    """Configures the Gemini API with the API key."""
+    """
+    Returns the process-wide Gemini model, configuring the API on first use.
+    Safe to call from any thread; later calls reuse the same model instance.
+    """
+    global _model
+    if _model is not None:
+        return _model
     if not GEMINI_API_KEY:
-        print("Error: GEMINI_API_KEY not found in config. Exiting AI processing.")
+        logger.error("Error: GEMINI_API_KEY not found in config. Exiting AI processing.")
         return None
+    with _model_lock:
+        if _model is None:
+            try:
+                genai.configure(api_key=GEMINI_API_KEY)
+                _model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+            except Exception as e:
+                logger.error("Error configuring Gemini or initializing model: %s", e)
+                return None
+    return _model
+
+def set_gemini_model(model):
+    """Replaces the shared model, e.g. with a stand-in for offline benchmarks; None resets it."""
+    global _model
+    with _model_lock:
+        _model = model
+
+def warm_up_gemini():
+    """
+    Builds the shared model ahead of the first user message and opens its connection
+    with a count_tokens call (no generation tokens are spent). Returns True on success.
+    """
+    model = configure_gemini()
+    if not model:
+        return False
     try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        return model
+        model.count_tokens("warm-up")
+        return True
     except Exception as e:
-        print(f"Error configuring Gemini or initializing model: {e}")
+        logger.warning("Gemini warm-up request failed (model is still usable): %s", e)
+        return False
+
+def build_assistant_prompt(user_query, aggregated_data, brief=False, budget=ASSISTANT_PROMPT_TOKEN_BUDGET):
+    """
+    Builds the Gemini prompt for a user's query from aggregated crypto data, within a token budget.
+
+    :param user_query: The original question from the user.
+    :param aggregated_data: A dictionary containing 'market_data' and 'news_articles'.
+    :param brief: Ask for a short, chat-sized answer.
+    :param budget: Estimated input tokens the prompt may use; news is ranked and trimmed to fit.
+    :return: The full prompt string.
+    """
+    style = "Answer in at most 3 short sentences." if brief else "Be concise and informative."
+    closing = "Based on this data, please answer the user's query. If the data is insufficient to directly answer, state that."
+    # The closing instruction is charged up front so the data can never crowd it out
+    prompt = PromptBudget(budget - estimate_tokens(closing))
+    prompt.add(f"You are an AI Crypto Assistant. Answer the user's question based on the provided data. {style}", required=True)
+    prompt.add(f"User Query: \"{user_query}\"", required=True)
+    prompt.add("--- Provided Data ---", required=True)
+
+    market_info = aggregated_data.get("market_data")
+    query_identifier = aggregated_data.get('query_identifier', 'the coin')
+    if market_info:
+        coin = dict(market_info, name=market_info.get('name', query_identifier))
+        prompt.add("Market Data:\n" + market_table([coin]), required=True)
+        stats = price_stats_table(aggregated_data.get("price_stats"))
+        if stats:
+            prompt.add("Price History (local samples):\n" + stats)
+        terms = [coin['name'], market_info.get('symbol')]
+    else:
+        prompt.add(f"No specific market data was found for '{query_identifier}'.", required=True)
+        terms = [query_identifier]
+
+    articles = rank_articles(aggregated_data.get("news_articles"), terms)
+    if not (articles and prompt.add("Recent News:")
+            and add_articles(prompt, articles, max_articles=3 if brief else 5, description_chars=0 if brief else 160)):
+        prompt.add("No news data was available.")
+
+    prompt.add("--- End of Provided Data ---", required=True)
+    prompt.add(closing, required=True)
+    return prompt.render()
+
+def _generation_config(brief):
+    """Caps the answer length, which bounds generation time as much as the prompt budget bounds input."""
+    return {"max_output_tokens": BRIEF_MAX_OUTPUT_TOKENS if brief else MAX_OUTPUT_TOKENS}
+
+def _extract_response_text(response):
+    """Pulls the text out of a Gemini response, trying the known response shapes in turn; None if there is none."""
+    if hasattr(response, 'parts') and response.parts:
+        return response.text
+    elif hasattr(response, 'text'): # Check if .text attribute exists directly
+        return response.text
+    else:
+        # This part is to try and extract text if the primary methods fail.
+        # It attempts to handle different possible response structures.
+        try:
+            # Check if response.candidates[0].content.parts[0].text exists
+            if response.candidates and response.candidates[0].content and response.candidates[0].content.parts:
+                return response.candidates[0].content.parts[0].text
+        except (IndexError, AttributeError) as e:
+            logger.warning("Could not extract text from Gemini response (candidates): %s", e)
         return None
 
-def generate_crypto_assistant_response(user_query, aggregated_data):
+def _cache_answer(cache_key, text):
+    """Caches a successfully generated answer and returns the text to show the user."""
+    if not text:
+        return UNPARSEABLE_RESPONSE_MESSAGE
+    answer_cache.put(cache_key, text)
+    return text
+
+async def _cache_answer_async(cache_key, text):
+    """Async version of _cache_answer."""
+    if not text:
+        return UNPARSEABLE_RESPONSE_MESSAGE
+    await answer_cache.put_async(cache_key, text)
+    return text
+
+def _answer_kind(kind, brief):
+    # Brief and full answers to the same question are different answers
+    return f"{kind}:brief" if brief else kind
+
+def _assistant_cache_key(user_query, aggregated_data, brief):
+    # price_stats moves with every price-history sample; the quote in market_data already decides when an answer is stale
+    payload = {k: v for k, v in aggregated_data.items() if k != "price_stats"}
+    return make_answer_key(_answer_kind("assistant", brief), user_query, aggregated_data.get("query_identifier"), payload)
+
+def generate_crypto_assistant_response(user_query, aggregated_data, brief=False):
     """
     Generates a response to a user's query using Gemini, based on aggregated crypto data.
 
     :param user_query: The original question from the user (e.g., "What's the latest on Bitcoin?").
     :param aggregated_data: A dictionary containing 'market_data' and 'news_articles'.
+    :param brief: Ask for a short, chat-sized answer with a smaller output cap.
     :return: A string containing the AI's response, or an error message.
     """
+    cache_key = _assistant_cache_key(user_query, aggregated_data, brief)
+    cached = answer_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
     model = configure_gemini()
     if not model:
         return "Sorry, I couldn't connect to the AI model at the moment."
 
-    # --- Construct the prompt for Gemini ---
-    prompt_parts = []
-    prompt_parts.append(f"You are an AI Crypto Assistant. Answer the user's question based on the provided data. Be concise and informative.")
-    prompt_parts.append(f"\nUser Query: \"{user_query}\"")
-
-    prompt_parts.append("\n--- Provided Data ---")
-
-    # Add Market Data to Prompt
-    if aggregated_data.get("market_data"):
-        market_info = aggregated_data["market_data"]
-        prompt_parts.append("\nMarket Data:")
-        # Safely get name and symbol, defaulting if not present
-        name = market_info.get('name', aggregated_data.get('query_identifier', 'the queried coin'))
-        symbol = market_info.get('symbol', 'N/A')
-        price = market_info.get('price_usd', 'N/A')
-        market_cap = market_info.get('market_cap_usd', 'N/A')
-        rank = market_info.get('rank', 'N/A')
-        change_24h = market_info.get('percent_change_24h', 'N/A')
-
-        prompt_parts.append(f"  - Name: {name} ({symbol})")
-        prompt_parts.append(f"  - Current Price: ${price:.2f}" if isinstance(price, (int, float)) else f"  - Current Price: {price}")
-        prompt_parts.append(f"  - Market Cap: ${market_cap:,.0f}" if isinstance(market_cap, (int, float)) else f"  - Market Cap: {market_cap}")
-        prompt_parts.append(f"  - Rank: {rank}")
-        prompt_parts.append(f"  - 24h Change: {change_24h:.2f}%" if isinstance(change_24h, (int, float)) else f"  - 24h Change: {change_24h}")
-        prompt_parts.append(f"  - Last Updated: {market_info.get('last_updated', 'N/A')}")
-    else:
-        prompt_parts.append(f"\nNo specific market data was found for '{aggregated_data.get('query_identifier', 'the coin')}'.")
-
-    # Add News Headlines to Prompt
-    if aggregated_data.get("news_articles"):
-        news_items = aggregated_data["news_articles"]
-        prompt_parts.append("\nRecent News Headlines:")
-        if news_items:
-            for i, article in enumerate(news_items[:5]): # Show top 5 news
-                prompt_parts.append(f"  {i+1}. {article.get('title', 'N/A')} (Source: {article.get('source_id', 'N/A')})")
-        else:
-            prompt_parts.append("  No recent news articles found.")
-    else:
-        prompt_parts.append("\nNo news data was available.")
+    with stage("prompt_build"):
+        full_prompt = build_assistant_prompt(user_query, aggregated_data, brief)
 
-    prompt_parts.append("\n--- End of Provided Data ---")
-    prompt_parts.append("\nBased on this data, please answer the user's query. If the data is insufficient to directly answer, state that.")
-    
-    full_prompt = "\n".join(prompt_parts)
+    if not provider_limits['gemini'].acquire():
+        return AI_BUSY_MESSAGE
 
+    response = None
     try:
-        response = model.generate_content(full_prompt)
-        
-        # Handle cases where the response might not have text or parts
-        if response.parts:
-            return response.text
-        elif hasattr(response, 'text'): # Check if .text attribute exists directly
-            return response.text
-        else:
-            # Investigate the response structure if this happens.
-            # print("Gemini response structure:", response)
-            # This part is to try and extract text if the primary methods fail.
-            # It attempts to handle different possible response structures.
-            try:
-                # Check if response.candidates[0].content.parts[0].text exists
-                if response.candidates and response.candidates[0].content and response.candidates[0].content.parts:
-                    return response.candidates[0].content.parts[0].text
-            except (IndexError, AttributeError) as e:
-                print(f"Could not extract text from Gemini response (candidates): {e}")
-            return "Sorry, I received an empty or unparseable response from the AI."
+        with stage("gemini"):
+            response = model.generate_content(full_prompt, generation_config=_generation_config(brief))
+        record_gemini_usage(response)
+        return _cache_answer(cache_key, _extract_response_text(response))
 
     except Exception as e:
-        print(f"Error during Gemini API call: {e}")
+        logger.error("Error during Gemini API call: %s", e)
         # You might want to inspect response.prompt_feedback if available
         if hasattr(response, 'prompt_feedback'):
-             print(f"Prompt Feedback: {response.prompt_feedback}")
+             logger.warning("Prompt Feedback: %s", response.prompt_feedback)
+        return f"Sorry, I encountered an error while generating the response: {e}"
+
+async def generate_crypto_assistant_response_async(user_query, aggregated_data, brief=False):
+    """Async version of generate_crypto_assistant_response; awaits Gemini without blocking the event loop."""
+    cache_key = _assistant_cache_key(user_query, aggregated_data, brief)
+    cached = await answer_cache.get_async(cache_key)
+    if cached is not None:
+        return cached
+
+    model = configure_gemini()
+    if not model:
+        return "Sorry, I couldn't connect to the AI model at the moment."
+
+    with stage("prompt_build"):
+        full_prompt = build_assistant_prompt(user_query, aggregated_data, brief)
+
+    if not await provider_limits['gemini'].acquire_async():
+        return AI_BUSY_MESSAGE
+
+    response = None
+    try:
+        with stage("gemini"):
+            response = await model.generate_content_async(full_prompt, generation_config=_generation_config(brief))
+        record_gemini_usage(response)
+        return await _cache_answer_async(cache_key, _extract_response_text(response))
+
+    except Exception as e:
+        logger.error("Error during Gemini API call: %s", e)
+        if hasattr(response, 'prompt_feedback'):
+             logger.warning("Prompt Feedback: %s", response.prompt_feedback)
         return f"Sorry, I encountered an error while generating the response: {e}"
-    
 
-def filter_news_by_coin(news_list, coin_name):
-    coin_name_lower = coin_name.lower()
-    filtered = []
-    for article in news_list:
-        title = article.get('title')
-        desc = article.get('description')
 
-        # Безопасно приводим к строке и к нижнему регистру
-        title_text = title.lower() if isinstance(title, str) else ""
-        desc_text = desc.lower() if isinstance(desc, str) else ""
+def filter_news_by_coin(news_list, coin_name, limit=NEWS_TOP_K):
+    """
+    Returns the `limit` articles of news_list most about the coin, best first: BM25 over title,
+    description and keywords, searched with the coin's name and symbol (see services/news_index.py).
+    Articles that don't mention the coin are dropped. Nothing is stored; None (a failed fetch) gives [].
+    """
+    if not news_list:
+        return []
+    index = NewsIndex(max_articles=len(news_list))
+    for position, article in enumerate(news_list):
+        index.add(position, article)
+    return index.search(coin_name, limit)
+
+
+def rank_coin_news(news_list, coin_name, limit=NEWS_TOP_K):
+    """
+    The `limit` articles most about the coin, best first, for a news answer. news_list (from get_coin_news)
+    has already joined the news store, so the coin's stored articles are ranked together through the store's
+    full-text index: the page just fetched plus earlier fetches and ingests. When the store doesn't hold
+    them (e.g. they were evicted), only news_list is ranked. None (a failed fetch) gives [].
+    """
+    if not news_list:
+        return []
+    return news_store.search(coin_name, limit, coin=coin_name) or filter_news_by_coin(news_list, coin_name, limit)
+
+
+def build_news_prompt(news, coin_name=None, brief=False, budget=NEWS_PROMPT_TOKEN_BUDGET):
+    """
+    Builds the Gemini prompt that summarizes a list of news articles, within a token budget.
+    Articles are expected best first (see rank_coin_news); descriptions are shortened to fit.
+    """
+    if brief:
+        task = "Summarize each news article in one sentence."
+    else:
+        task = f"Summarize each news article in 2-3 sentences, then add one sentence on what it means for {coin_name or 'the coin'}."
+    prompt = PromptBudget(budget)
+    prompt.add(
+        "You are an expert crypto analyst.\n"
+        f"{task}\n"
+        "Include the link at the end of each summary.\n"
+        "Here are the news articles:\n",
+        required=True,
+    )
+    add_articles(prompt, news, max_articles=len(news),
+                 description_chars=200 if brief else 600, with_links=True)
+    return prompt.render()
+
+
+def generate_news(coin_name, brief=False):
+    model = configure_gemini()
+    if not model:
+        return "Sorry, I couldn't connect to the AI model at the moment."
+
+    news = get_coin_news(coin_name, size=NEWS_FETCH_SIZE)
+    news = rank_coin_news(news, coin_name)
+    if not news:
+        return "No news found specifically related to this coin."
 
-        if coin_name_lower in title_text or coin_name_lower in desc_text:
-            filtered.append(article)
-    return filtered
+    # Same articles -> same summary; don't pay Gemini to write it again
+    cache_key = make_answer_key(_answer_kind("news", brief), None, coin_name, news)
+    cached = answer_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
+    with stage("prompt_build"):
+        prompt = build_news_prompt(news, coin_name, brief)
+    if not provider_limits['gemini'].acquire():
+        return AI_BUSY_MESSAGE
 
-def generate_news(coin_name):
+    try:
+        with stage("gemini"):
+            response = model.generate_content(prompt, generation_config=_generation_config(brief))
+        record_gemini_usage(response)
+        return _cache_answer(cache_key, _extract_response_text(response))
+    except Exception as e:
+        logger.error("Error during Gemini API call: %s", e)
+        return f"Sorry, I encountered an error while generating the response: {e}"
+
+
+async def generate_news_async(coin_name, brief=False):
+    """Async version of generate_news; fetches news and awaits Gemini without blocking the event loop."""
     model = configure_gemini()
     if not model:
         return "Sorry, I couldn't connect to the AI model at the moment."
 
-    news = get_newsdata_io_news(coin_name)
-    news = filter_news_by_coin(news, coin_name)
+    news = await get_coin_news_async(coin_name, size=NEWS_FETCH_SIZE)
+    news = rank_coin_news(news, coin_name)
     if not news:
         return "No news found specifically related to this coin."
 
-    news_text = ""
-    for i, article in enumerate(news):
-        title = article.get('title', 'No title')
-        desc = article.get('description', 'No description')
-        link = article.get('link', '')
-        news_text += f"{i+1}. {title}\n{desc}\nLink: {link}\n\n"
+    # Same articles -> same summary; don't pay Gemini to write it again
+    cache_key = make_answer_key(_answer_kind("news", brief), None, coin_name, news)
+    cached = await answer_cache.get_async(cache_key)
+    if cached is not None:
+        return cached
 
-    prompt = (
-        "You are an expert crypto analyst.\n"
-        "Summarize each news article briefly, then provide at least 200 words detailed explanation per article.\n"
-        "Include the link at the end of each summary.\n"
-        f"Here are the news articles:\n\n{news_text}"
-    )
+    with stage("prompt_build"):
+        prompt = build_news_prompt(news, coin_name, brief)
+    if not await provider_limits['gemini'].acquire_async():
+        return AI_BUSY_MESSAGE
 
     try:
-        response = None
-        response = model.generate_content(prompt)
-        if hasattr(response, 'parts') and response.parts:
-            return response.parts[0].text
-        elif hasattr(response, 'text'):
-            return response.text
-        else:
-            if (hasattr(response, 'candidates') and response.candidates
-                and hasattr(response.candidates[0], 'content')
-                and hasattr(response.candidates[0].content, 'parts')
-                and response.candidates[0].content.parts):
-                return response.candidates[0].content.parts[0].text
-            else:
-                return "Sorry, I received an empty or unparseable response from the AI."
+        with stage("gemini"):
+            response = await model.generate_content_async(prompt, generation_config=_generation_config(brief))
+        record_gemini_usage(response)
+        return await _cache_answer_async(cache_key, _extract_response_text(response))
     except Exception as e:
-        print(f"Error during Gemini API call: {e}")
+        logger.error("Error during Gemini API call: %s", e)
         return f"Sorry, I encountered an error while generating the response: {e}"
+
+
+def build_digest_prompt(coin_blocks):
+    """Builds the Gemini prompt for one part of a multi-coin digest; each block describes one coin."""
+    return (
+        "You are an expert crypto analyst writing a daily digest.\n"
+        "For each coin below write a short section headed by its name and symbol: "
+        "2-4 sentences on its price action and what the news says about it. "
+        "Use only the provided data and say so when a coin has no news. Keep the coins in the given order.\n\n"
+        + "\n\n".join(coin_blocks)
+    )
+
+
+async def generate_digest_async(coin_blocks, rate_limit_wait=REPORT_GEMINI_WAIT_SECONDS):
+    """
+    Writes the digest sections for a group of coins with one Gemini call.
+
+    :param coin_blocks: Compact per-coin data blocks (see report.build_coin_block).
+    :param rate_limit_wait: How long to wait for the reports' share of the Gemini rate limit; a bulk report can afford minutes.
+    :return: The generated text, or None if Gemini is unavailable, so the caller can fall back to the raw data.
+    """
+    cache_key = make_answer_key("digest", None, None, coin_blocks)
+    cached = await answer_cache.get_async(cache_key)
+    if cached is not None:
+        return cached
+
+    model = configure_gemini()
+    if not model:
+        return None
+
+    with stage("prompt_build"):
+        prompt = build_digest_prompt(coin_blocks)
+    if not await report_limits['gemini'].acquire_async(timeout=rate_limit_wait):
+        logger.warning("Gemini rate limit had no room for a digest prompt within %.0fs", rate_limit_wait)
+        return None
+
+    try:
+        with stage("gemini"):
+            response = await model.generate_content_async(
+                prompt, generation_config={"max_output_tokens": REPORT_OUTPUT_TOKENS_PER_COIN * len(coin_blocks)})
+        record_gemini_usage(response)
+        text = _extract_response_text(response)
+    except Exception as e:
+        logger.error("Error during Gemini API call: %s", e)
+        return None
+    if text:
+        await answer_cache.put_async(cache_key, text)
+    return text or None
+
+
+def _chunk_text(chunk):
+    """Text of one streamed Gemini chunk; empty for chunks without text (e.g. the final metadata chunk)."""
+    try:
+        return chunk.text
+    except (ValueError, AttributeError, IndexError):
+        return ""
+
+
+async def stream_news_async(coin_name, brief=False):
+    """
+    Streaming version of generate_news_async: an async iterator that yields the summary
+    piece by piece as Gemini generates it, so callers can show text before the whole answer is done.
+    A cached answer is yielded in one piece.
+    """
+    model = configure_gemini()
+    if not model:
+        yield "Sorry, I couldn't connect to the AI model at the moment."
+        return
+
+    news = await get_coin_news_async(coin_name, size=NEWS_FETCH_SIZE)
+    news = rank_coin_news(news, coin_name)
+    if not news:
+        yield "No news found specifically related to this coin."
+        return
+
+    cache_key = make_answer_key(_answer_kind("news", brief), None, coin_name, news)
+    cached = await answer_cache.get_async(cache_key)
+    if cached is not None:
+        yield cached
+        return
+
+    with stage("prompt_build"):
+        prompt = build_news_prompt(news, coin_name, brief)
+    if not await provider_limits['gemini'].acquire_async():
+        yield AI_BUSY_MESSAGE
+        return
+
+    parts = []
+    chunk = None
+    started_at = time.perf_counter()
+    try:
+        response = await model.generate_content_async(prompt, generation_config=_generation_config(brief), stream=True)
+        async for chunk in response:
+            if started_at is not None:
+                # Time to first chunk is what the user waits for; the rest overlaps with our Telegram edits
+                record_stage("gemini_first_chunk", time.perf_counter() - started_at)
+                started_at = None
+            text = _chunk_text(chunk)
+            if text:
+                parts.append(text)
+                yield text
+        record_gemini_usage(chunk) # the last chunk carries the totals
+    except Exception as e:
+        logger.error("Error during Gemini API call: %s", e)
+        yield f"\n\nSorry, I encountered an error while generating the response: {e}"
+        return
+
+    if parts:
+        await answer_cache.put_async(cache_key, "".join(parts))
+    else:
+        yield UNPARSEABLE_RESPONSE_MESSAGE
@@ -0,0 +1,129 @@
+# bench_text_utils.py
+"""
+Micro-benchmarks for the per-message text utilities, on realistic corpora.
+Needs pytest and pytest-benchmark; run from the repository root:
+
+    python -m pytest benchmarks/bench_text_utils.py --benchmark-group-by=group
+
+Each optimized function is benchmarked next to the implementation it replaced
+(kept below as *_baseline), and its output is checked against the baseline.
+"""
+import os
+import random
+
+import pytest
+
+os.environ.setdefault("BOT_TOKEN", "123456:benchmark")
+
+from benchmarks.stub_servers import load_fixture
+from main import extract_coin_identifier_from_query
+from services.coin_resolver import coin_resolver
+from ai_processor import filter_news_by_coin
+from bot import split_message, MAX_MESSAGE_LENGTH
+
+# --- Corpora ---
+
+_COINS = [(c['symbol'], c['name']) for c in load_fixture("cmc_map")['data']]
+
+def _query_corpus():
+    templates = [
+        "What's the price of {name}?", "Tell me about {symbol}", "how is {name} doing today",
+        "{symbol} price", "latest news about {name}", "{name} news", "is {name} a good buy right now?",
+        "новости {name}", "what do you think about {symbol} vs the market this week", "{name}!!!",
+        "can you give me the current market cap and 24h volume of {name} please",
+    ]
+    queries = [t.format(symbol=s, name=n) for s, n in _COINS for t in templates]
+    queries += ["hello", "what is the weather", "tell me something interesting", "bitcion price", "shiba inu news"]
+    random.Random(7).shuffle(queries)
+    return queries
+
+def _news_corpus():
+    articles = [{'title': a['title'], 'description': a['description'], 'link': a['link']}
+                for a in load_fixture("newsdata_news")['results']]
+    articles.append({'title': None, 'description': None, 'link': ''})
+    return articles
+
+def _reply(paragraphs, words_per_paragraph, seed):
+    rng = random.Random(seed)
+    vocabulary = ("bitcoin price market volume liquidity traders etf inflows support resistance momentum "
+                  "network upgrade fees whales sentiment analysts macro rates volatility").split()
+    return "\n\n".join(" ".join(rng.choice(vocabulary) for _ in range(words_per_paragraph)) for _ in range(paragraphs))
+
+REPLIES = {
+    'typical_6k': _reply(12, 80, 1),
+    'long_60k': _reply(120, 80, 2),
+    'huge_600k': _reply(1200, 80, 3),
+    'no_newlines_200k': _reply(1, 30000, 4),
+}
+
+# Resolve against the recorded CMC map, as the bot does after coin_resolver.load()
+coin_resolver.rebuild(load_fixture("cmc_map")['data'])
+
+QUERIES = _query_corpus()
+NEWS = _news_corpus()
+NEWS_COINS = [name.lower() for _, name in _COINS]
+
+# --- Implementations being replaced ---
+
+def filter_news_by_coin_baseline(news_list, coin_name):
+    coin_name_lower = coin_name.lower()
+    filtered = []
+    for article in news_list:
+        title = article.get('title')
+        desc = article.get('description')
+        title_text = title.lower() if isinstance(title, str) else ""
+        desc_text = desc.lower() if isinstance(desc, str) else ""
+        if coin_name_lower in title_text or coin_name_lower in desc_text:
+            filtered.append(article)
+    return filtered
+
+def split_message_baseline(text):
+    chunks = []
+    while len(text) > MAX_MESSAGE_LENGTH:
+        split_index = text.rfind('\n', 0, MAX_MESSAGE_LENGTH)
+        if split_index == -1:
+            split_index = MAX_MESSAGE_LENGTH
+        chunks.append(text[:split_index])
+        text = text[split_index:]
+    chunks.append(text)
+    return chunks
+
+# --- Benchmarks ---
+
+@pytest.mark.benchmark(group="extract_coin_identifier")
+def test_extract_coin_identifier(benchmark):
+    results = benchmark(lambda: [extract_coin_identifier_from_query(q) for q in QUERIES])
+    assert results.count(None) <= 5 # only the queries that name no coin
+
+def _filter_all(fn):
+    return [fn(NEWS, coin) for coin in NEWS_COINS]
+
+@pytest.mark.benchmark(group="filter_news_by_coin")
+def test_filter_news_by_coin_baseline(benchmark):
+    benchmark(_filter_all, filter_news_by_coin_baseline)
+
+@pytest.mark.benchmark(group="filter_news_by_coin")
+def test_filter_news_by_coin(benchmark):
+    # Ranked search over the given articles: finds everything the substring filter did, and more through symbols
+    results = benchmark(_filter_all, lambda news, coin: filter_news_by_coin(news, coin, limit=len(news)))
+    for found, expected in zip(results, _filter_all(filter_news_by_coin_baseline)):
+        assert all(article in found for article in expected)
+
+@pytest.mark.parametrize("reply", sorted(REPLIES))
+def test_split_message_baseline(benchmark, reply):
+    benchmark.group = f"split_message[{reply}]"
+    benchmark(split_message_baseline, REPLIES[reply])
+
+@pytest.mark.parametrize("reply", sorted(REPLIES))
+def test_split_message(benchmark, reply):
+    benchmark.group = f"split_message[{reply}]"
+    chunks = benchmark(split_message, REPLIES[reply])
+    assert chunks == split_message_baseline(REPLIES[reply])
+    assert all(len(chunk) <= MAX_MESSAGE_LENGTH for chunk in chunks)
+    assert "".join(chunks) == REPLIES[reply]
+
+def test_split_message_leading_newline_terminates():
+    # The old loop never ended when the only newline in a window was its first character
+    text = "\n" + "x" * (2 * MAX_MESSAGE_LENGTH)
+    chunks = split_message(text)
+    assert "".join(chunks) == text and all(len(chunk) <= MAX_MESSAGE_LENGTH for chunk in chunks)
@@ -0,0 +1,112 @@
+# fake_redis.py
+import asyncio
+import threading
+import time
+
+# --- Local stand-in for a Redis server: just the commands RedisBackend uses ---
+# Lets the shared cache backend (and several worker processes) be exercised without installing Redis:
+#
+#     server = FakeRedisServer(port=6390).start()
+#     os.environ["CACHE_BACKEND_URL"] = server.url
+
+class FakeRedisServer:
+    """Speaks RESP on its own thread and event loop; supports PING, AUTH, SELECT, GET, SET [EX|PX], DEL, FLUSHDB."""
+    def __init__(self, host="127.0.0.1", port=6390):
+        self.host = host
+        self.port = port
+        self.data = {} # key -> (value bytes, expires_at or None)
+        self.commands = 0
+        self._loop = None
+        self._server = None
+        self._ready = threading.Event()
+
+    @property
+    def url(self):
+        return f"redis://{self.host}:{self.port}/0"
+
+    # --- RESP ---
+
+    @staticmethod
+    async def _read_command(reader):
+        header = await reader.readline()
+        if not header:
+            return None
+        if not header.startswith(b"*"):
+            return header.strip().split() # inline command, e.g. from redis-cli or telnet
+        args = []
+        for _ in range(int(header[1:])):
+            length = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    @staticmethod
+    def _bulk(value):
+        return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def _get(self, key):
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def _execute(self, args):
+        self.commands += 1
+        name = args[0].upper()
+        if name == b"PING":
+            return b"+PONG\r\n"
+        if name in (b"AUTH", b"SELECT"):
+            return b"+OK\r\n"
+        if name == b"GET":
+            return self._bulk(self._get(args[1]))
+        if name == b"SET":
+            expires_at = None
+            if len(args) >= 5 and args[3].upper() in (b"EX", b"PX"):
+                seconds = int(args[4]) / (1000.0 if args[3].upper() == b"PX" else 1.0)
+                expires_at = time.monotonic() + seconds
+            self.data[args[1]] = (args[2], expires_at)
+            return b"+OK\r\n"
+        if name == b"DEL":
+            removed = sum(self.data.pop(key, None) is not None for key in args[1:])
+            return b":%d\r\n" % removed
+        if name == b"FLUSHDB":
+            self.data.clear()
+            return b"+OK\r\n"
+        return b"-ERR unknown command '%s'\r\n" % name
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if not args:
+                    break
+                writer.write(self._execute(args))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    # --- Lifecycle ---
+
+    def start(self):
+        """Starts serving in a daemon thread; returns once the port is bound."""
+        threading.Thread(target=self._serve, name="fake-redis", daemon=True).start()
+        self._ready.wait()
+        return self
+
+    def _serve(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+        self._ready.set()
+        self._loop.run_forever()
+
+    def stop(self):
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._server.close)
+        self._loop.call_soon_threadsafe(self._loop.stop)
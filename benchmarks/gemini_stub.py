@@ -0,0 +1,94 @@
+# gemini_stub.py
+import aiohttp
+import requests
+
+# --- Gemini model stand-in that talks to StubUpstream over HTTP ---
+# The SDK's async client can't be pointed at a plain HTTP endpoint, so the harness swaps
+# this in with ai_processor.set_gemini_model(); it answers with the same shapes ai_processor reads.
+
+class _Part:
+    def __init__(self, text):
+        self.text = text
+
+class _Content:
+    def __init__(self, parts):
+        self.parts = parts
+
+class _Candidate:
+    def __init__(self, parts):
+        self.content = _Content(parts)
+
+class _Usage:
+    def __init__(self, usage):
+        self.prompt_token_count = usage.get('promptTokenCount', 0)
+        self.candidates_token_count = usage.get('candidatesTokenCount', 0)
+        self.total_token_count = usage.get('totalTokenCount', 0)
+
+class StubResponse:
+    """Just enough of GenerateContentResponse: text, parts, candidates, usage_metadata, prompt_feedback."""
+    def __init__(self, payload):
+        candidates = payload.get('candidates') or []
+        self.candidates = [_Candidate([_Part(p.get('text', '')) for p in c['content']['parts']]) for c in candidates]
+        self.parts = self.candidates[0].content.parts if self.candidates else []
+        usage = payload.get('usageMetadata')
+        self.usage_metadata = _Usage(usage) if usage else None
+        self.prompt_feedback = None
+
+    @property
+    def text(self):
+        if not self.parts:
+            raise ValueError("response has no parts")
+        return "".join(p.text for p in self.parts)
+
+class _StubStream:
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            raise StopAsyncIteration
+
+class StubGeminiModel:
+    def __init__(self, base_url, model_name="gemini-2.0-flash"):
+        self._generate_url = f"{base_url}/models/{model_name}:generateContent"
+        self._stream_url = f"{base_url}/models/{model_name}:streamGenerateContent"
+        self._session = requests.Session()
+        self._async_session = None
+
+    @staticmethod
+    def _body(prompt, generation_config=None):
+        body = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        if generation_config:
+            body["generationConfig"] = {"maxOutputTokens": generation_config.get("max_output_tokens")}
+        return body
+
+    def generate_content(self, prompt, generation_config=None):
+        response = self._session.post(self._generate_url, json=self._body(prompt, generation_config), timeout=30)
+        response.raise_for_status()
+        return StubResponse(response.json())
+
+    def _get_async_session(self):
+        if self._async_session is None or self._async_session.closed:
+            self._async_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=256))
+        return self._async_session
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        url = self._stream_url if stream else self._generate_url
+        async with self._get_async_session().post(url, json=self._body(prompt, generation_config)) as response:
+            response.raise_for_status()
+            payload = await response.json()
+        if stream:
+            return _StubStream([StubResponse(chunk) for chunk in payload])
+        return StubResponse(payload)
+
+    def count_tokens(self, prompt):
+        return None
+
+    async def close(self):
+        if self._async_session is not None:
+            await self._async_session.close()
@@ -0,0 +1,295 @@
+# harness.py
+"""
+Offline load benchmark: replays recorded CMC / Newsdata.io / Gemini responses from a local
+stand-in server (with optional latency and error injection) and drives the aggregator,
+the AI functions or the bot handlers at a given concurrency.
+
+    python -m benchmarks.harness --target bot --requests 500 --concurrency 32 \
+        --cmc-latency-ms 120 --news-latency-ms 250 --gemini-latency-ms 900 --error-rate 0.02
+
+Nothing leaves the machine; no API keys are needed.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stub_servers import StubUpstream, Fault, load_fixture
+
+TARGETS = ('aggregate', 'aggregate_async', 'assistant', 'assistant_async', 'news', 'news_async', 'bot')
+
+def _coins():
+    return [(c['symbol'], c['name']) for c in load_fixture("cmc_map")['data']]
+
+def _queries():
+    """A mix of the questions users send: prices, general questions, news; symbols and names."""
+    templates = ["What's the price of {name}?", "Tell me about {symbol}", "how is {name} doing today",
+                 "{symbol} price", "latest news about {name}", "{name} news"]
+    return [t.format(symbol=s, name=n) for s, n in _coins() for t in templates]
+
+def _configure_environment(stub):
+    """Points the project at the stand-in server. Must run before any project module is imported."""
+    os.environ.update({
+        "COINMARKETCAP_API_URL": stub.base_url,
+        "NEWSDATA_API_URL": stub.news_url,
+        "COINMARKETCAP_API_KEY": "benchmark",
+        "NEWSDATA_API_KEY": "benchmark",
+        "GEMINI_API_KEY": "benchmark",
+        "BOT_TOKEN": "123456:benchmark",
+        # No persistence and no side effects between runs
+        "NEWS_STORE_DB_PATH": "",
+        "WARM_SNAPSHOT_PATH": "",
+        "ANSWER_CACHE_DB_PATH": "",
+        "PRICE_HISTORY_ENABLED": "false",
+        # Measure our code, not the production rate limits
+        "CMC_RATE_PER_MINUTE": "1000000000",
+        "NEWSDATA_RATE_PER_MINUTE": "1000000000",
+        "GEMINI_RATE_PER_MINUTE": "1000000000",
+    })
+
+# --- Fake Telegram message for driving bot handlers directly ---
+
+class _Chat:
+    def __init__(self, chat_id):
+        self.id = chat_id
+
+class FakeMessage:
+    def __init__(self, text, chat_id=1):
+        self.text = text
+        self.chat = _Chat(chat_id)
+        self.replies = []
+
+    async def answer(self, text, **kwargs):
+        self.replies.append(text)
+        return FakeMessage(text, self.chat.id)
+
+    async def reply(self, text, **kwargs):
+        return await self.answer(text)
+
+    async def edit_text(self, text, **kwargs):
+        self.text = text
+        return self
+
+# --- Runners ---
+
+def _is_error_reply(result):
+    return isinstance(result, str) and result.startswith("Sorry")
+
+def _run_sync(call, items, total, concurrency):
+    """Runs call(item) `total` times over `concurrency` threads. Returns (latencies, failures, error replies)."""
+    counter = itertools.count()
+    latencies, failures, error_replies = [], [0], [0]
+
+    def worker():
+        while True:
+            i = next(counter)
+            if i >= total:
+                return
+            started_at = time.perf_counter()
+            try:
+                result = call(items[i % len(items)])
+                if _is_error_reply(result):
+                    error_replies[0] += 1
+            except Exception:
+                failures[0] += 1
+            latencies.append(time.perf_counter() - started_at)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return latencies, failures[0], error_replies[0]
+
+async def _run_async(call, items, total, concurrency):
+    """Async counterpart of _run_sync: `concurrency` worker tasks on one event loop."""
+    counter = itertools.count()
+    latencies, failures, error_replies = [], 0, 0
+
+    async def worker():
+        nonlocal failures, error_replies
+        while True:
+            i = next(counter)
+            if i >= total:
+                return
+            started_at = time.perf_counter()
+            try:
+                result = await call(items[i % len(items)])
+                if _is_error_reply(result):
+                    error_replies += 1
+            except Exception:
+                failures += 1
+            latencies.append(time.perf_counter() - started_at)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, failures, error_replies
+
+# --- Targets ---
+
+def _reset_caches(cold):
+    """In cold mode every request starts without cached quotes or answers."""
+    if not cold:
+        return
+    from services.market_data import quote_cache
+    from services.answer_cache import answer_cache
+    quote_cache.clear()
+    answer_cache.memory.clear()
+
+def _build_target(target, cold):
+    """Returns (call, items, is_async) for a target."""
+    from services import aggregator
+    import ai_processor
+
+    symbols = [s for s, _ in _coins()]
+    names = [n.lower() for _, n in _coins()]
+
+    if target in ('aggregate', 'aggregate_async'):
+        if target == 'aggregate':
+            def call(symbol):
+                _reset_caches(cold)
+                return aggregator.get_aggregated_coin_data(symbol)
+            return call, symbols, False
+        async def call_async(symbol):
+            _reset_caches(cold)
+            return await aggregator.get_aggregated_coin_data_async(symbol)
+        return call_async, symbols, True
+
+    if target in ('assistant', 'assistant_async'):
+        # Aggregated data is prepared once up front, so only prompt building and Gemini are measured
+        prepared = [(f"Tell me about {s}", aggregator.get_aggregated_coin_data(s)
+                     or {"query_identifier": s, "market_data": None, "news_articles": []}) for s in symbols]
+        if target == 'assistant':
+            def call(item):
+                _reset_caches(cold)
+                return ai_processor.generate_crypto_assistant_response(*item)
+            return call, prepared, False
+        async def call_async(item):
+            _reset_caches(cold)
+            return await ai_processor.generate_crypto_assistant_response_async(*item)
+        return call_async, prepared, True
+
+    if target in ('news', 'news_async'):
+        if target == 'news':
+            def call(name):
+                _reset_caches(cold)
+                return ai_processor.generate_news(name)
+            return call, names, False
+        async def call_async(name):
+            _reset_caches(cold)
+            return await ai_processor.generate_news_async(name)
+        return call_async, names, True
+
+    import bot
+    chat_ids = itertools.count(1)
+    async def call_bot(text):
+        _reset_caches(cold)
+        message = FakeMessage(text, chat_id=next(chat_ids))
+        await bot.request_bot(message)
+        return message.replies[-1] if message.replies else None
+    return call_bot, _queries(), True
+
+# --- Reporting ---
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(target, args, latencies, failures, error_replies, elapsed, stub):
+    ordered = sorted(latencies)
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    return {
+        'target': target,
+        'requests': len(latencies),
+        'concurrency': args.concurrency,
+        'cache': 'cold' if args.cold else 'warm',
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'p50_ms': ms(percentile(ordered, 50)),
+        'p95_ms': ms(percentile(ordered, 95)),
+        'p99_ms': ms(percentile(ordered, 99)),
+        'max_ms': ms(ordered[-1] if ordered else None),
+        'exceptions': failures,
+        'error_replies': error_replies,
+        'upstream_calls': {f"{provider}:{outcome}": n for (provider, outcome), n in sorted(stub.calls.items())},
+    }
+
+def print_report(result):
+    print(f"\n{result['target']}: {result['requests']} requests, concurrency {result['concurrency']}, {result['cache']} caches")
+    print(f"  throughput  {result['throughput_rps']} req/s over {result['elapsed_s']} s")
+    print(f"  latency     p50 {result['p50_ms']} ms | p95 {result['p95_ms']} ms | p99 {result['p99_ms']} ms | max {result['max_ms']} ms")
+    print(f"  failures    {result['exceptions']} exceptions, {result['error_replies']} error replies")
+    print("  upstream    " + ", ".join(f"{k}={v}" for k, v in result['upstream_calls'].items()))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', choices=TARGETS + ('all',), default='bot')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--warmup', type=int, default=10, help="requests run before measuring")
+    parser.add_argument('--cold', action='store_true', help="clear the quote and answer caches before every request")
+    parser.add_argument('--cmc-latency-ms', type=float, default=80)
+    parser.add_argument('--news-latency-ms', type=float, default=150)
+    parser.add_argument('--gemini-latency-ms', type=float, default=600)
+    parser.add_argument('--jitter', type=float, default=0.25, help="latency jitter as a fraction of the latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of upstream calls that fail")
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--json', dest='json_path', help="also write the results to this file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    faults = {provider: Fault(latency, latency * args.jitter, args.error_rate, args.error_status)
+              for provider, latency in (('cmc', args.cmc_latency_ms), ('newsdata', args.news_latency_ms),
+                                        ('gemini', args.gemini_latency_ms))}
+    stub = StubUpstream(port=args.port, faults=faults).start()
+    _configure_environment(stub)
+
+    from services.logging_config import setup_logging
+    from services.http_client import close_session
+    from benchmarks.gemini_stub import StubGeminiModel
+    import ai_processor
+
+    setup_logging(level=os.getenv("LOG_LEVEL", "CRITICAL"))
+    model = StubGeminiModel(stub.gemini_url)
+    ai_processor.set_gemini_model(model)
+
+    results = []
+    for target in (TARGETS if args.target == 'all' else (args.target,)):
+        call, items, is_async = _build_target(target, args.cold)
+
+        async def run_async(total):
+            try:
+                return await _run_async(call, items, total, args.concurrency)
+            finally:
+                await close_session()
+                await model.close()
+
+        def run(total):
+            if is_async:
+                return asyncio.run(run_async(total))
+            return _run_sync(call, items, total, args.concurrency)
+
+        if args.warmup:
+            run(args.warmup)
+        stub.calls.clear()
+        started_at = time.perf_counter()
+        latencies, failures, error_replies = run(args.requests)
+        result = summarize(target, args, latencies, failures, error_replies, time.perf_counter() - started_at, stub)
+        print_report(result)
+        results.append(result)
+
+    stub.stop()
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+# replay_updates.py
+"""
+Webhook load test: POSTs recorded Telegram updates (fixtures/telegram_updates.json) to the bot's
+webhook the way Telegram delivers them, and reports status codes and delivery latency.
+
+Without --url the bot runs in this process in webhook mode, against the stand-in upstream server
+(CMC, Newsdata.io, Gemini and the Bot API), so nothing leaves the machine:
+
+    python -m benchmarks.replay_updates --requests 2000 --concurrency 40 --chats 200
+
+With --url the updates go to a bot that is already running (BOT_MODE=webhook):
+
+    python -m benchmarks.replay_updates --url http://127.0.0.1:8080/telegram/webhook --secret s3cret
+
+A 503 means the bot had no room for the update and Telegram would deliver it again later.
+"""
+import argparse
+import asyncio
+import copy
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+import aiohttp
+
+from benchmarks.harness import percentile, _configure_environment
+from benchmarks.stub_servers import StubUpstream, Fault, load_fixture
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+def build_updates(count, chats):
+    """count updates cycled from the fixture, with fresh update ids and spread over `chats` chat ids."""
+    recorded = load_fixture("telegram_updates")
+    updates = []
+    for i in range(count):
+        update = copy.deepcopy(recorded[i % len(recorded)])
+        update['update_id'] = 1 + i
+        message = update['message']
+        message['chat']['id'] = message['from']['id'] = 1000 + i % chats
+        updates.append(update)
+    return updates
+
+async def replay(url, updates, concurrency, secret=""):
+    """Posts every update with at most `concurrency` in flight. Returns (status counts, latencies, elapsed)."""
+    statuses = Counter()
+    latencies = []
+    headers = {SECRET_HEADER: secret} if secret else None
+    slots = asyncio.Semaphore(concurrency)
+
+    async def deliver(session, update):
+        async with slots:
+            started = time.perf_counter()
+            try:
+                async with session.post(url, json=update, headers=headers) as response:
+                    await response.read()
+                    statuses[response.status] += 1
+            except aiohttp.ClientError:
+                statuses['error'] += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+        await asyncio.gather(*(deliver(session, u) for u in updates))
+    return statuses, latencies, time.perf_counter() - started
+
+def summarize(statuses, latencies, elapsed):
+    ordered = sorted(latencies)
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    return {
+        'deliveries': len(latencies),
+        'statuses': {str(k): v for k, v in sorted(statuses.items(), key=str)},
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': ms(percentile(ordered, 50)),
+        'p95_ms': ms(percentile(ordered, 95)),
+        'p99_ms': ms(percentile(ordered, 99)),
+    }
+
+async def _replay_in_process(args, updates):
+    """Runs bot.py's webhook mode here against StubUpstream, replays, then shuts down like on SIGTERM."""
+    stub = StubUpstream(port=args.stub_port, faults={
+        'cmc': Fault(args.cmc_latency_ms, args.cmc_latency_ms / 4),
+        'newsdata': Fault(args.news_latency_ms, args.news_latency_ms / 4),
+        'gemini': Fault(args.gemini_latency_ms, args.gemini_latency_ms / 4),
+    }).start()
+    _configure_environment(stub)
+    os.environ.update({
+        "TELEGRAM_API_URL": stub.telegram_url,
+        "BOT_MODE": "webhook",
+        "WEBHOOK_URL": "",
+        "WEBHOOK_SECRET": args.secret,
+        "WEBHOOK_PORT": str(args.port),
+        "NEWS_INGEST_ENABLED": "false",
+        "METRICS_ENABLED": "false",
+        # Replayed chats send much faster than people do
+        "CHAT_RATE_PER_MINUTE": "1000000",
+        "CHAT_BURST": "1000000",
+    })
+    import ai_processor
+    import bot
+    from benchmarks.gemini_stub import StubGeminiModel
+    from services.http_client import close_session
+    from services.telegram import WebhookServer
+    model = StubGeminiModel(stub.gemini_url)
+    ai_processor.set_gemini_model(model)
+
+    stop_services = await bot.start_services()
+    server = await WebhookServer(bot.accept_update, secret=args.secret).start(host="127.0.0.1", port=args.port)
+    try:
+        url = f"http://127.0.0.1:{args.port}{server.path}"
+        statuses, latencies, elapsed = await replay(url, updates, args.concurrency, args.secret)
+    finally:
+        await server.stop()
+        drain_started = time.perf_counter()
+        await stop_services()
+        drain_s = time.perf_counter() - drain_started
+        await close_session()
+        await model.close()
+        await bot.bot.session.close()
+        stub.stop()
+    result = summarize(statuses, latencies, elapsed)
+    result['drain_s'] = round(drain_s, 3)
+    result['replies_sent'] = sum(1 for method, _ in stub.telegram_calls if method == "sendMessage")
+    return result
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help="webhook URL of a running bot; by default the bot runs in this process")
+    parser.add_argument('--secret', default="", help="value of the secret token header")
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=40, help="deliveries in flight, like WEBHOOK_MAX_CONNECTIONS")
+    parser.add_argument('--chats', type=int, default=100, help="distinct chats the updates are spread over")
+    parser.add_argument('--port', type=int, default=8780, help="webhook port of the in-process bot")
+    parser.add_argument('--stub-port', type=int, default=8765)
+    parser.add_argument('--cmc-latency-ms', type=float, default=80)
+    parser.add_argument('--news-latency-ms', type=float, default=150)
+    parser.add_argument('--gemini-latency-ms', type=float, default=600)
+    parser.add_argument('--json', dest='json_path', help="also write the results to this file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    updates = build_updates(args.requests, max(1, args.chats))
+    if args.url:
+        result = summarize(*asyncio.run(replay(args.url, updates, args.concurrency, args.secret)))
+    else:
+        result = asyncio.run(_replay_in_process(args, updates))
+    print(json.dumps(result, indent=2))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,200 @@
+# stub_servers.py
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+from collections import Counter
+
+from aiohttp import web
+
+# --- Local stand-ins for CoinMarketCap, Newsdata.io, Gemini and the Telegram Bot API, replaying recorded fixtures ---
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, f"{name}.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+class Fault:
+    """Latency and error injection for one provider."""
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, error_status=503):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+    def delay(self):
+        return max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0
+
+    def should_fail(self):
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+class StubUpstream:
+    """
+    One aiohttp app serving the endpoints the bot calls, on its own thread and event loop
+    so its injected latency never competes with the code being measured.
+    Point the project at it with base_url (CMC), news_url (Newsdata.io), gemini_url and telegram_url.
+    """
+    def __init__(self, host="127.0.0.1", port=8765, faults=None):
+        self.host = host
+        self.port = port
+        self.faults = faults or {}
+        self.calls = Counter() # (provider, outcome) -> count
+        self._listings = load_fixture("cmc_listings_latest")
+        self._quotes = load_fixture("cmc_quotes_latest")
+        self._map = load_fixture("cmc_map")
+        self._news = load_fixture("newsdata_news")
+        self._gemini = load_fixture("gemini_generate_content")
+        self.telegram_calls = [] # (method, params) in the order the bot made them
+        self._message_id = 0
+        self._loop = None
+        self._runner = None
+        self._ready = threading.Event()
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def news_url(self):
+        return f"{self.base_url}/api/1/news"
+
+    @property
+    def gemini_url(self):
+        return f"{self.base_url}/v1beta"
+
+    @property
+    def telegram_url(self):
+        return self.base_url
+
+    # --- Fault handling ---
+
+    async def _inject(self, provider):
+        """
+        Sleeps for the provider's latency; returns an error response if one should be injected, else None.
+        Compare the result with None: aiohttp responses are mappings, so an empty one is falsy.
+        """
+        fault = self.faults.get(provider)
+        if fault is None:
+            self.calls[(provider, 'ok')] += 1
+            return None
+        await asyncio.sleep(fault.delay())
+        if fault.should_fail():
+            self.calls[(provider, 'error')] += 1
+            return web.json_response({"error": "injected failure"}, status=fault.error_status,
+                                     headers={"Retry-After": "0"} if fault.error_status == 429 else None)
+        self.calls[(provider, 'ok')] += 1
+        return None
+
+    # --- CoinMarketCap ---
+
+    async def _cmc_listings(self, request):
+        error = await self._inject('cmc')
+        if error is not None:
+            return error
+        limit = int(request.query.get('limit', 100))
+        return web.json_response(dict(self._listings, data=self._listings['data'][:limit]))
+
+    async def _cmc_map(self, request):
+        error = await self._inject('cmc')
+        return error if error is not None else web.json_response(self._map)
+
+    async def _cmc_quotes(self, request):
+        error = await self._inject('cmc')
+        if error is not None:
+            return error
+        symbols = [s.strip().upper() for s in request.query.get('symbol', '').split(',') if s.strip()]
+        data = {s: self._quotes['data'][s] for s in symbols if s in self._quotes['data']}
+        return web.json_response(dict(self._quotes, data=data))
+
+    # --- Newsdata.io ---
+
+    async def _newsdata(self, request):
+        error = await self._inject('newsdata')
+        if error is not None:
+            return error
+        # The query looks like '"Bitcoin" AND (...)'; return the recorded articles about that coin
+        match = re.search(r'"([^"]+)"', request.query.get('q', ''))
+        coin = match.group(1).lower() if match else ''
+        size = int(request.query.get('size', 10))
+        results = [a for a in self._news['results'] if coin and coin in a['title'].lower()][:size]
+        return web.json_response(dict(self._news, totalResults=len(results), results=results))
+
+    # --- Gemini (REST shape of generateContent / streamGenerateContent) ---
+
+    async def _gemini_generate(self, request):
+        error = await self._inject('gemini')
+        return error if error is not None else web.json_response(self._gemini)
+
+    async def _gemini_stream(self, request):
+        error = await self._inject('gemini')
+        if error is not None:
+            return error
+        # Split the recorded answer into a few chunks, like the streaming endpoint does
+        text = self._gemini['candidates'][0]['content']['parts'][0]['text']
+        pieces = [text[i:i + 80] for i in range(0, len(text), 80)]
+        chunks = [{"candidates": [{"content": {"parts": [{"text": p}], "role": "model"}, "index": 0}]} for p in pieces]
+        chunks[-1]["usageMetadata"] = self._gemini["usageMetadata"]
+        return web.json_response(chunks)
+
+    # --- Telegram Bot API ---
+
+    async def _telegram(self, request):
+        error = await self._inject('telegram')
+        if error is not None:
+            return error
+        method = request.match_info['method']
+        params = dict(request.query)
+        if request.can_read_body:
+            params.update(await request.post())
+        self.telegram_calls.append((method, params))
+        if method in ("sendMessage", "editMessageText"):
+            self._message_id += 1
+            chat_id = int(params.get('chat_id', 0))
+            result = {"message_id": self._message_id, "date": 0, "text": params.get('text', ''),
+                      "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group"}}
+        elif method == "getMe":
+            result = {"id": 123456, "is_bot": True, "first_name": "Benchmark", "username": "benchmark_bot"}
+        elif method == "getUpdates":
+            result = []
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    # --- Lifecycle ---
+
+    def _app(self):
+        app = web.Application()
+        app.router.add_get('/v1/cryptocurrency/listings/latest', self._cmc_listings)
+        app.router.add_get('/v1/cryptocurrency/map', self._cmc_map)
+        app.router.add_get('/v1/cryptocurrency/quotes/latest', self._cmc_quotes)
+        app.router.add_get('/v2/cryptocurrency/quotes/latest', self._cmc_quotes)
+        app.router.add_get('/api/1/news', self._newsdata)
+        app.router.add_post('/v1beta/models/{model}:generateContent', self._gemini_generate)
+        app.router.add_post('/v1beta/models/{model}:streamGenerateContent', self._gemini_stream)
+        app.router.add_post('/bot{token}/{method}', self._telegram)
+        return app
+
+    def start(self):
+        """Starts serving in a daemon thread; returns once the port is bound."""
+        thread = threading.Thread(target=self._serve, name="stub-upstream", daemon=True)
+        thread.start()
+        self._ready.wait()
+        return self
+
+    def _serve(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._runner = web.AppRunner(self._app(), access_log=None)
+        self._loop.run_until_complete(self._runner.setup())
+        self._loop.run_until_complete(web.TCPSite(self._runner, self.host, self.port, backlog=1024).start())
+        self._ready.set()
+        self._loop.run_forever()
+
+    def stop(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
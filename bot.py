@@ -1,55 +1,222 @@
 import asyncio  
 import os  
 import logging  
+import re
+import signal
   
-from aiogram import Bot, Dispatcher, F
+from aiogram import Dispatcher, F, BaseMiddleware
 from aiogram.types import Message  
 from aiogram.filters import CommandStart, Command, CommandObject
+from aiogram.exceptions import TelegramBadRequest
 from dotenv import load_dotenv
-from main import generate_crypto_assistant_response, extract_coin_identifier_from_query
-from services.aggregator import get_aggregated_coin_data
-from services.market_data import get_top_50_coins_cmc
-from ai_processor import generate_news
+from main import extract_coin_identifier_from_query
+from services.aggregator import get_aggregated_coin_data_async
+from services.coin_resolver import coin_resolver
+from services.listings import listings_service
+from services.alerts import alert_book, AlertPoller
+from services.http_client import close_session
+from services.admission import ChatLimiter, FairScheduler
+from services.metrics import request_scope, start_metrics_server
+from services.logging_config import setup_logging
+from services.telegram import create_bot, register_webhook, WebhookServer
+from report import select_report_coins_async, write_report_async
+from ai_processor import generate_crypto_assistant_response_async, generate_news_async, stream_news_async, warm_up_gemini
+from config import (STREAM_NEWS_REPLIES, STREAM_EDIT_INTERVAL_SECONDS, NEWS_INGEST_ENABLED, TOP_N_DEFAULT, METRICS_ENABLED,
+                    METRICS_PORT, BRIEF_ANSWERS, BOT_MODE, SHUTDOWN_DRAIN_SECONDS, REPORT_ALLOWED_CHATS)
+from services.news_ingestor import news_ingestor
+from services.snapshot import warm_snapshot
+
+logger = logging.getLogger(__name__)
 
   
 load_dotenv()
 TOKEN = os.getenv('BOT_TOKEN')
   
-bot = Bot(token=TOKEN)  
+bot = create_bot(TOKEN)
 dp = Dispatcher()  
+
+RATE_LIMITED_MESSAGE = "You're sending messages a bit too fast. Please wait a few seconds and try again."
+BUSY_MESSAGE = "I'm handling a lot of requests right now. Please try again in a minute."
+
+class AdmissionMiddleware(BaseMiddleware):
+    """
+    Runs before every message handler: drops messages over the chat's rate limit and queues the
+    rest on a bounded scheduler shared fairly between chats. When the queue is full the user
+    gets a polite "busy" reply instead of waiting behind work we can't get to.
+    """
+    def __init__(self):
+        self.limiter = ChatLimiter()
+        self.scheduler = FairScheduler()
+
+    async def __call__(self, handler, event, data):
+        chat_id = event.chat.id
+        if not self.limiter.allow(chat_id):
+            await event.answer(RATE_LIMITED_MESSAGE)
+            return None
+        async def job():
+            # Один запрос пользователя = одна трасса: время по этапам попадает в /metrics
+            with request_scope("telegram"):
+                await handler(event, data)
+        if not self.scheduler.submit(chat_id, job):
+            await event.answer(BUSY_MESSAGE)
+        return None
+
+admission = AdmissionMiddleware()
+dp.message.outer_middleware(admission)
   
 @dp.message(CommandStart())  
 async def start(message: Message):  
     # kb = InlineKeyboardMarkup(inline_keyboard=[
     #     InlineKeyboardButton(text='Top50', callback_data='top50'),
     # ])
-    await message.answer("Hello, I am Crypto Assistant Bot, You can ask me about top 50 coins, and about crypto symbols")  
+    await message.answer("Hello, I am Crypto Assistant Bot, You can ask me about top 50 coins, and about crypto symbols. "
+                         "Use /watch BTC 5% or /alert ETH > 4000 to get price notifications, "
+                         "and /report top30 (or /report BTC ETH SOL) for a digest of many coins.")  
 
 MAX_MESSAGE_LENGTH = 4096
 
 def split_message(text):
-    # Разбивает длинный текст по 4096 символов, стараясь не резать посреди слов
+    # Разбивает длинный текст по 4096 символов, стараясь не резать посреди слов.
+    # Идём по индексам, не копируя остаток текста на каждом шаге
     chunks = []
-    while len(text) > MAX_MESSAGE_LENGTH:
-        split_index = text.rfind('\n', 0, MAX_MESSAGE_LENGTH)
-        if split_index == -1:
-            split_index = MAX_MESSAGE_LENGTH
-        chunks.append(text[:split_index])
-        text = text[split_index:]
-    chunks.append(text)
+    start, end = 0, len(text)
+    while end - start > MAX_MESSAGE_LENGTH:
+        split_index = text.rfind('\n', start, start + MAX_MESSAGE_LENGTH)
+        if split_index <= start:
+            # Нет переноса строки (или он в самом начале куска) — режем по лимиту
+            split_index = start + MAX_MESSAGE_LENGTH
+        chunks.append(text[start:split_index])
+        start = split_index
+    chunks.append(text[start:])
     return chunks
 
-@dp.message(F.text.func(lambda text: text and text.replace(" ", "").lower() == 'top50'))
-async def top50_coins(message: Message):
-    top50 = get_top_50_coins_cmc()
-    if top50:
-            response_text = "\n".join(
-                f"{i+1}. {coin['name']} ({coin['symbol']}) - Price: ${coin['price_usd']:.2f}"
-                for i, coin in enumerate(top50)
-            )
-    else:
-            response_text = "Sorry, I couldn't fetch the top 50 coins right now."
-    await message.answer(response_text)
+async def reply_streaming(message, pieces):
+    """
+    Replies with text from the async iterator `pieces`, editing the reply in place as text arrives.
+    Edits are throttled to one per STREAM_EDIT_INTERVAL_SECONDS to stay within Telegram's limits;
+    when the text outgrows MAX_MESSAGE_LENGTH the full part is finalized and a new message is started.
+    """
+    loop = asyncio.get_running_loop()
+    sent = None       # сообщение, которое сейчас редактируем
+    shown = ""        # текст, который уже виден в нём
+    buffer = ""       # полный текст текущего сообщения
+    last_edit = 0.0
+
+    async def show(text):
+        nonlocal sent, shown, last_edit
+        if not text.strip() or text == shown:
+            return
+        if sent is None:
+            sent = await message.reply(text)
+        else:
+            try:
+                await sent.edit_text(text)
+            except TelegramBadRequest as e:
+                # "message is not modified" and similar are harmless here
+                logger.warning("Could not edit streamed message: %s", e)
+        shown = text
+        last_edit = loop.time()
+
+    async for piece in pieces:
+        buffer += piece
+        while len(buffer) > MAX_MESSAGE_LENGTH:
+            split_index = buffer.rfind('\n', 0, MAX_MESSAGE_LENGTH)
+            if split_index <= 0:
+                split_index = MAX_MESSAGE_LENGTH
+            await show(buffer[:split_index])
+            sent, shown, buffer = None, "", buffer[split_index:]
+        if loop.time() - last_edit >= STREAM_EDIT_INTERVAL_SECONDS:
+            await show(buffer)
+
+    await show(buffer)
+
+# "top50", "top 10", "top" (по умолчанию TOP_N_DEFAULT)
+TOP_COMMAND = re.compile(r"^top(\d*)$")
+
+def _match_top_command(text):
+    return TOP_COMMAND.match(text.replace(" ", "").lower()) if text else None
+
+@dp.message(F.text.func(_match_top_command))
+async def top_coins(message: Message):
+    top_n = int(_match_top_command(message.text).group(1) or TOP_N_DEFAULT)
+    # Список обновляется в фоне; к CMC идём только если снимка ещё нет
+    if not len(listings_service.snapshot):
+        await listings_service.refresh_async()
+    response_text = listings_service.top_text(top_n)
+    if not response_text:
+        response_text = f"Sorry, I couldn't fetch the top {top_n} coins right now."
+    for chunk in split_message(response_text):
+        await message.answer(chunk)
+
+WATCH_ARGS = re.compile(r"^\s*(\S+)\s+(\d+(?:\.\d+)?)\s*%?\s*$")
+ALERT_ARGS = re.compile(r"^\s*([^\s<>]+)\s*([<>])\s*\$?(\d[\d,]*(?:\.\d+)?)\s*$")
+
+def _alert_symbol(term):
+    coin = coin_resolver.lookup(term)
+    return coin['symbol'] if coin else term.upper()
+
+@dp.message(Command("watch"))
+async def watch_command(message: Message, command: CommandObject):
+    match = WATCH_ARGS.match(command.args or "")
+    if not match:
+        await message.answer("Usage: /watch BTC 5%")
+        return
+    symbol, percent = _alert_symbol(match.group(1)), float(match.group(2))
+    if percent <= 0:
+        await message.answer("The percentage must be greater than zero.")
+        return
+    if alert_book.add_watch(message.chat.id, symbol, percent) is None:
+        await message.answer("You have too many watches and alerts already. Remove some with /unwatch.")
+        return
+    await asyncio.to_thread(alert_book.save)
+    await message.answer(f"Watching {symbol}: I'll notify you on every move of {percent:g}% or more.")
+
+@dp.message(Command("alert"))
+async def alert_command(message: Message, command: CommandObject):
+    match = ALERT_ARGS.match(command.args or "")
+    if not match:
+        await message.answer("Usage: /alert ETH > 4000  or  /alert BTC < 50000")
+        return
+    symbol, direction, price = _alert_symbol(match.group(1)), match.group(2), float(match.group(3).replace(",", ""))
+    if alert_book.add_alert(message.chat.id, symbol, direction, price) is None:
+        await message.answer("You have too many watches and alerts already. Remove some with /unwatch.")
+        return
+    await asyncio.to_thread(alert_book.save)
+    await message.answer(f"OK, I'll tell you once {symbol} goes {'above' if direction == '>' else 'below'} ${price:,.2f}.")
+
+@dp.message(Command("alerts"))
+async def list_alerts_command(message: Message):
+    subs = alert_book.for_chat(message.chat.id)
+    if not subs:
+        await message.answer("You have no watches or alerts. Try /watch BTC 5% or /alert ETH > 4000.")
+        return
+    await message.answer("\n".join(sub.describe() for sub in subs))
+
+@dp.message(Command("unwatch"))
+async def unwatch_command(message: Message, command: CommandObject):
+    symbol = _alert_symbol(command.args.strip()) if command.args else None
+    removed = alert_book.remove(message.chat.id, symbol)
+    if removed:
+        await asyncio.to_thread(alert_book.save)
+    await message.answer(f"Removed {removed} subscription(s)." if removed else "Nothing to remove.")
+
+@dp.message(Command("report"))
+async def report_command(message: Message, command: CommandObject):
+    # Дайджест сразу по многим монетам; части приходят по мере готовности.
+    # Отчёт занимает слот очереди на минуты, поэтому он доступен только разрешённым чатам
+    if message.chat.id not in REPORT_ALLOWED_CHATS:
+        await message.answer("Reports are not available in this chat.")
+        return
+    coins = await select_report_coins_async(command.args)
+    if not coins:
+        await message.answer("Usage: /report BTC ETH SOL  or  /report top30")
+        return
+    await message.answer(f"Preparing a digest for {len(coins)} coins; it will arrive in parts.")
+
+    async def write(text):
+        for chunk in split_message(text):
+            await message.answer(chunk)
+    await write_report_async(coins, write)
 
 @dp.message()
 async def request_bot(message: Message):
@@ -62,9 +229,14 @@ async def request_bot(message: Message):
             await message.answer("Не удалось распознать название монеты для новостей.")
             return
         
-        coin_identifier = (coin_identifier or "").replace(" ", "").lower()
-        loop = asyncio.get_event_loop()
-        news_text = await loop.run_in_executor(None, generate_news, coin_identifier)
+        # Новости ищем по полному названию монеты, если резолвер её знает
+        coin = coin_resolver.lookup(coin_identifier)
+        coin_identifier = coin['name'].lower() if coin else coin_identifier.replace(" ", "").lower()
+        if STREAM_NEWS_REPLIES:
+            await reply_streaming(message, stream_news_async(coin_identifier, brief=BRIEF_ANSWERS))
+            return
+
+        news_text = await generate_news_async(coin_identifier, brief=BRIEF_ANSWERS)
 
         chunks = split_message(news_text)
         for chunk in chunks:
@@ -77,7 +249,7 @@ async def request_bot(message: Message):
         await message.answer("Я не смог определить криптовалюту в вашем запросе. Пожалуйста, попробуйте ещё раз.")
         return
 
-    aggregated_data = get_aggregated_coin_data(coin_identifier)
+    aggregated_data = await get_aggregated_coin_data_async(coin_identifier)
     if aggregated_data is None:
         aggregated_data = {
             "query_identifier": coin_identifier,
@@ -86,19 +258,101 @@ async def request_bot(message: Message):
             "news_articles": []
         }
 
-    response = generate_crypto_assistant_response(message.text, aggregated_data)
+    # В чате короткий ответ: предсказуемое время генерации и стоимость
+    response = await generate_crypto_assistant_response_async(message.text, aggregated_data, brief=BRIEF_ANSWERS)
     await message.answer(response)
 
     
+async def start_services(ingest_news=NEWS_INGEST_ENABLED, metrics_port=METRICS_PORT, write_snapshot=True):
+    """
+    Starts everything the handlers rely on, apart from receiving updates: the Gemini model, the coin map
+    and the background tasks. Used by main() and by each worker process in cluster.py.
+    :param write_snapshot: Whether this process saves the warm-start snapshot (one writer per machine).
+    :return: A coroutine function that stops what was started.
+    """
+    # Кэши из снимка прошлого запуска: отвечаем сразу, свежие данные догружаются в фоне
+    warm = await asyncio.to_thread(warm_snapshot.load)
+    # Поднимаем модель Gemini заранее, чтобы первый пользователь не ждал её инициализации
+    await asyncio.to_thread(warm_up_gemini)
+    # Полная карта монет CMC для распознавания названий в запросах
+    if warm and coin_resolver.coins is not None:
+        resolver_task = asyncio.create_task(coin_resolver.load_async())
+    else:
+        resolver_task = None
+        await coin_resolver.load_async()
+    # Снимок топа монет обновляется в фоне, запрос "top50" не ходит в CMC
+    listings_task = asyncio.create_task(listings_service.run_forever_async())
+    # Один общий опрос цен для всех /watch и /alert: одна пачка котировок на тик.
+    # Подписки хранятся в файле ALERTS_PATH и переживают перезапуск
+    await asyncio.to_thread(alert_book.load)
+    alerts_task = asyncio.create_task(AlertPoller(alert_book, bot.send_message).run_forever_async())
+    # Фоновая загрузка новостей в локальное хранилище: запросы пользователей не ждут Newsdata.io
+    if ingest_news:
+        ingestion_task = asyncio.create_task(news_ingestor.run_forever_async())
+    else:
+        ingestion_task = None
+    # Периодически сохраняем кэши для быстрого следующего запуска
+    snapshot_task = asyncio.create_task(warm_snapshot.run_forever_async()) if write_snapshot else None
+
+    # Метрики в формате Prometheus: GET /metrics (по умолчанию только на localhost)
+    metrics_runner = await start_metrics_server(port=metrics_port) if METRICS_ENABLED else None
+
+    async def stop_background_tasks():
+        for task in (listings_task, alerts_task, ingestion_task, resolver_task, snapshot_task):
+            if task is not None:
+                task.cancel()
+        # Даём уже принятым запросам завершиться, прежде чем останавливать обработчики
+        await admission.scheduler.drain(SHUTDOWN_DRAIN_SECONDS)
+        await admission.scheduler.stop()
+        if write_snapshot:
+            await asyncio.to_thread(warm_snapshot.save)
+        await asyncio.to_thread(alert_book.save)
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+    return stop_background_tasks
+
+async def accept_update(update):
+    # Очередь заполнена: отвечаем 503, и Telegram доставит обновление позже
+    if admission.scheduler.is_full():
+        return False
+    await dp.feed_raw_update(bot, update)
+    return True
+
+async def serve_webhook(stop_services):
+    """Serves updates pushed by Telegram until SIGINT/SIGTERM, then drains and stops."""
+    server = await WebhookServer(accept_update).start()
+    await register_webhook(bot)
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stopping.set)
+        except NotImplementedError:
+            pass # Windows: Ctrl+C cancels the wait below instead
+    try:
+        await stopping.wait()
+    finally:
+        # Сначала перестаём принимать обновления, затем дорабатываем очередь
+        await server.stop()
+        await stop_services()
+        await close_session()
+        await bot.session.close()
+
 async def main():  
+    if BOT_MODE == "webhook":
+        await serve_webhook(await start_services())
+        return
+    # Обработчики shutdown вызываются по порядку: сначала дорабатываем очередь, затем закрываем общую aiohttp-сессию
+    dp.shutdown.register(await start_services())
+    dp.shutdown.register(close_session)
     # Тем самым, сообщения, которые были отправлены боту, когда он был выключен, при включении будут игнорироваться
     await bot.delete_webhook(drop_pending_updates=True)  
     await dp.start_polling(bot)  
   
 if __name__ == '__main__':  
-    logging.basicConfig(level=logging.INFO)  
-    print("Running bot...")  
+    setup_logging()
+    logger.info("Running bot...")
     try:  
         asyncio.run(main())  
     except KeyboardInterrupt:  
-        print("Exit")
+        logger.info("Exit")
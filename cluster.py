@@ -0,0 +1,227 @@
+# cluster.py
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+
+from dotenv import load_dotenv
+
+from config import (BOT_WORKERS, WORKER_QUEUE_SIZE, NEWS_INGEST_ENABLED, METRICS_PORT, BOT_MODE, PRICE_HISTORY_DIR,
+                    NEWS_STORE_DB_PATH, ALERTS_PATH)
+from services.cache_backend import shared_backend
+from services.logging_config import setup_logging
+from services.telegram import create_bot, register_webhook, WebhookServer
+
+logger = logging.getLogger(__name__)
+
+# --- Scale-out: one process receives updates, BOT_WORKERS worker processes handle them ---
+# Updates are routed by chat id, so a chat is always served by the same worker: its messages stay
+# in order, and its rate limit and alerts live in one place. Workers share quotes, listings, news
+# and answers through the cache backend (CACHE_BACKEND_URL); without one each worker warms its own.
+# Files with a single writer, the price history, the news store database and the alerts file, are per worker.
+#
+#     CACHE_BACKEND_URL=redis://127.0.0.1:6379/0 python cluster.py --workers 4
+
+POLL_TIMEOUT_SECONDS = 30
+WORKER_STOP_SECONDS = 15
+
+# Update fields whose value carries the chat the update belongs to
+_CHAT_FIELDS = ("message", "edited_message", "channel_post", "edited_channel_post", "business_message",
+                "edited_business_message", "my_chat_member", "chat_member", "chat_join_request")
+
+def chat_id_of(update):
+    """The chat a raw update dict belongs to; the sender for updates without a chat (inline queries etc.); else 0."""
+    for field in _CHAT_FIELDS:
+        chat = (update.get(field) or {}).get("chat")
+        if chat:
+            return chat["id"]
+    for value in update.values():
+        if isinstance(value, dict):
+            chat = (value.get("message") or {}).get("chat")
+            if chat:
+                return chat["id"]
+            if value.get("from"):
+                return value["from"]["id"]
+    return 0
+
+def worker_for(chat_id, workers):
+    # Group chats have negative ids; Python's % still lands in [0, workers)
+    return chat_id % workers
+
+def worker_environment(index):
+    """
+    Environment overrides for worker `index`. The price history (memory-mapped columns), the
+    news store database and the alerts file (the alerts of the chats routed to the worker) each
+    have a single writer, so every worker but the first gets its own copy; the first keeps the
+    paths a single-process bot uses.
+    """
+    if index == 0:
+        return {}
+    overrides = {"PRICE_HISTORY_DIR": f"{PRICE_HISTORY_DIR}.worker{index}"}
+    for name, path in (("NEWS_STORE_DB_PATH", NEWS_STORE_DB_PATH), ("ALERTS_PATH", ALERTS_PATH)):
+        if path:
+            root, extension = os.path.splitext(path)
+            overrides[name] = f"{root}.worker{index}{extension}"
+    return overrides
+
+# --- Worker process ---
+
+def _run_worker(index, workers, updates):
+    """Entry point of a worker process: handles the updates routed to it until it receives None."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # the intake process decides when workers stop
+    setup_logging()
+    asyncio.run(serve_updates(index, workers, updates))
+
+async def serve_updates(index, workers, updates):
+    """Feeds raw update JSON strings from `updates` (a queue) to this process's dispatcher."""
+    import bot as worker_bot # every worker builds its own Bot, Dispatcher and local caches
+    from services.http_client import close_session
+
+    # With a shared backend one worker keeps the news store warm for all of them
+    ingest_news = NEWS_INGEST_ENABLED and (index == 0 or shared_backend is None)
+    # Workers restore the same snapshot; only the first one writes it
+    stop_services = await worker_bot.start_services(ingest_news=ingest_news, metrics_port=METRICS_PORT + index,
+                                                    write_snapshot=index == 0)
+    logger.info("Worker %s of %s ready (pid %s)", index + 1, workers, os.getpid())
+    try:
+        while True:
+            raw = await asyncio.to_thread(updates.get)
+            if raw is None:
+                break
+            await worker_bot.dp.feed_raw_update(worker_bot.bot, json.loads(raw))
+    finally:
+        await stop_services()
+        await close_session()
+        await worker_bot.bot.session.close()
+
+# --- Intake process ---
+
+class WorkerPool:
+    """N worker processes, each with a bounded queue of updates; dead workers are restarted."""
+    def __init__(self, workers=BOT_WORKERS, queue_size=WORKER_QUEUE_SIZE):
+        self._context = multiprocessing.get_context("spawn")
+        self.workers = workers
+        self.queues = [self._context.Queue(queue_size) for _ in range(workers)]
+        self.processes = [None] * workers
+
+    def _spawn(self, index):
+        process = self._context.Process(target=_run_worker, args=(index, self.workers, self.queues[index]),
+                                        name=f"bot-worker-{index}", daemon=True)
+        # A spawned worker reads config from the environment it starts with
+        overrides = worker_environment(index)
+        saved = {name: os.environ.get(name) for name in overrides}
+        os.environ.update(overrides)
+        try:
+            process.start()
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+        self.processes[index] = process
+
+    def start(self):
+        for index in range(self.workers):
+            self._spawn(index)
+        return self
+
+    def restart_dead(self):
+        for index, process in enumerate(self.processes):
+            if not process.is_alive():
+                logger.error("Worker %s exited with code %s; restarting it", index + 1, process.exitcode)
+                self._spawn(index)
+
+    async def route(self, update):
+        """Queues a raw update dict for its chat's worker; waits while that worker's queue is full."""
+        index = worker_for(chat_id_of(update), self.workers)
+        await asyncio.to_thread(self.queues[index].put, json.dumps(update))
+
+    def try_route(self, update):
+        """Like route, but returns False instead of waiting when the worker's queue is full."""
+        index = worker_for(chat_id_of(update), self.workers)
+        try:
+            self.queues[index].put_nowait(json.dumps(update))
+        except queue.Full:
+            return False
+        return True
+
+    def stop(self, timeout=WORKER_STOP_SECONDS):
+        for updates in self.queues:
+            updates.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+async def poll_updates(bot, pool):
+    """Long-polls Telegram and routes every update to the pool, acknowledging it once queued."""
+    # Тем самым, сообщения, которые были отправлены боту, когда он был выключен, при включении будут игнорироваться
+    await bot.delete_webhook(drop_pending_updates=True)
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=POLL_TIMEOUT_SECONDS)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Fetching updates failed: %s", e)
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            await pool.route(update.model_dump(mode="json", exclude_none=True))
+            offset = update.update_id + 1
+        pool.restart_dead()
+
+async def serve_webhook(bot, pool):
+    """Takes updates from Telegram's webhook deliveries; a full worker queue answers 503 so Telegram retries."""
+    async def accept(update):
+        accepted = pool.try_route(update)
+        pool.restart_dead()
+        return accepted
+
+    server = await WebhookServer(accept).start()
+    await register_webhook(bot)
+    try:
+        await asyncio.Event().wait() # until Ctrl+C or SIGTERM
+    finally:
+        await server.stop()
+
+async def _intake(token, pool):
+    bot = create_bot(token)
+    try:
+        if BOT_MODE == "webhook":
+            await serve_webhook(bot, pool)
+        else:
+            await poll_updates(bot, pool)
+    finally:
+        await bot.session.close()
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def run_cluster(workers=BOT_WORKERS):
+    load_dotenv()
+    if shared_backend is None and workers > 1:
+        logger.warning("CACHE_BACKEND_URL is not set: each of the %s workers keeps its own caches", workers)
+    pool = WorkerPool(workers).start()
+    # SIGTERM stops the workers the same way Ctrl+C does instead of orphaning them
+    signal.signal(signal.SIGTERM, _interrupt)
+    logger.info("Running bot with %s workers (%s)...", workers, BOT_MODE)
+    try:
+        asyncio.run(_intake(os.getenv('BOT_TOKEN'), pool))
+    except KeyboardInterrupt:
+        logger.info("Exit")
+    finally:
+        pool.stop()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Runs the Telegram bot as one update-intake process and N worker processes.")
+    parser.add_argument("--workers", type=int, default=BOT_WORKERS)
+    args = parser.parse_args()
+    setup_logging()
+    run_cluster(max(1, args.workers))
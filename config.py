@@ -17,7 +17,183 @@ if not GEMINI_API_KEY:
     print("Warning: GEMINI_API_KEY not found in .env file.")
 
 
-COINMARKETCAP_API_URL = "https://pro-api.coinmarketcap.com"
-NEWSDATA_API_URL = "https://newsdata.io/api/1/news"
+COINMARKETCAP_API_URL = os.getenv("COINMARKETCAP_API_URL", "https://pro-api.coinmarketcap.com")
+NEWSDATA_API_URL = os.getenv("NEWSDATA_API_URL", "https://newsdata.io/api/1/news")
 
 DEFAULT_NEWS_LANGUAGE = "en"
+
+# Quote cache (CoinMarketCap /quotes/latest)
+QUOTE_CACHE_TTL_SECONDS = int(os.getenv("QUOTE_CACHE_TTL_SECONDS", "60"))
+QUOTE_CACHE_MAX_ENTRIES = int(os.getenv("QUOTE_CACHE_MAX_ENTRIES", "1024"))
+
+# Micro-batching of concurrent quote lookups into one CMC request
+QUOTE_BATCH_WINDOW_MS = int(os.getenv("QUOTE_BATCH_WINDOW_MS", "50"))
+QUOTE_BATCH_MAX_SYMBOLS = int(os.getenv("QUOTE_BATCH_MAX_SYMBOLS", "100"))
+
+# Aggregation: fetch market data and news concurrently, each with its own deadline. A fetch that
+# misses its deadline keeps running in the background (provider timeouts and retries take longer)
+AGGREGATOR_PARALLEL = os.getenv("AGGREGATOR_PARALLEL", "true").lower() == "true"
+MARKET_DATA_DEADLINE_SECONDS = float(os.getenv("MARKET_DATA_DEADLINE_SECONDS", "4"))
+NEWS_DEADLINE_SECONDS = float(os.getenv("NEWS_DEADLINE_SECONDS", "6"))
+
+# Shared upstream HTTP client (services/http_client.py)
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_BASE_SECONDS = float(os.getenv("HTTP_BACKOFF_BASE_SECONDS", "0.5"))
+HTTP_BACKOFF_MAX_SECONDS = float(os.getenv("HTTP_BACKOFF_MAX_SECONDS", "8"))
+CMC_CONNECT_TIMEOUT_SECONDS = float(os.getenv("CMC_CONNECT_TIMEOUT_SECONDS", "3.05"))
+CMC_READ_TIMEOUT_SECONDS = float(os.getenv("CMC_READ_TIMEOUT_SECONDS", "10"))
+NEWSDATA_CONNECT_TIMEOUT_SECONDS = float(os.getenv("NEWSDATA_CONNECT_TIMEOUT_SECONDS", "3.05"))
+NEWSDATA_READ_TIMEOUT_SECONDS = float(os.getenv("NEWSDATA_READ_TIMEOUT_SECONDS", "15"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+# Gemini
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-2.0-flash")
+
+# Cache of generated Gemini answers; set ANSWER_CACHE_DB_PATH to persist them in SQLite
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "300"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2048"))
+ANSWER_CACHE_DB_PATH = os.getenv("ANSWER_CACHE_DB_PATH", "")
+
+# Telegram: stream Gemini news summaries into progressively edited messages
+STREAM_NEWS_REPLIES = os.getenv("STREAM_NEWS_REPLIES", "true").lower() == "true"
+STREAM_EDIT_INTERVAL_SECONDS = float(os.getenv("STREAM_EDIT_INTERVAL_SECONDS", "1.0"))
+
+# Background news ingestion into a local article store
+NEWS_STORE_DB_PATH = os.getenv("NEWS_STORE_DB_PATH", "news_store.db")
+NEWS_STORE_MAX_PER_COIN = int(os.getenv("NEWS_STORE_MAX_PER_COIN", "50"))
+# Past this many articles the oldest stored are dropped, from memory and from the database
+NEWS_STORE_MAX_ARTICLES = int(os.getenv("NEWS_STORE_MAX_ARTICLES", "5000"))
+NEWS_INGEST_INTERVAL_SECONDS = int(os.getenv("NEWS_INGEST_INTERVAL_SECONDS", "900"))
+# Stored news older than this is treated as missing and re-fetched upstream on demand
+NEWS_STORE_MAX_AGE_SECONDS = int(os.getenv("NEWS_STORE_MAX_AGE_SECONDS", str(3 * NEWS_INGEST_INTERVAL_SECONDS)))
+# Coins fetched on demand (outside the ingested top coins) are served from the store for this long
+NEWS_ON_DEMAND_MAX_AGE_SECONDS = int(os.getenv("NEWS_ON_DEMAND_MAX_AGE_SECONDS", "300"))
+NEWS_INGEST_TOP_N = int(os.getenv("NEWS_INGEST_TOP_N", "10"))
+NEWS_INGEST_PAGE_SIZE = int(os.getenv("NEWS_INGEST_PAGE_SIZE", "10"))
+NEWS_INGEST_ENABLED = os.getenv("NEWS_INGEST_ENABLED", "true").lower() == "true"
+
+# Coin resolver: how far down the CMC ranking coins are trusted in free text. Capitalised symbols ("SOL")
+# and names are trusted further than lowercase symbols ("sol") and typo matches
+RESOLVER_MAX_RANK = int(os.getenv("RESOLVER_MAX_RANK", "1000"))
+RESOLVER_LOWERCASE_SYMBOL_MAX_RANK = int(os.getenv("RESOLVER_LOWERCASE_SYMBOL_MAX_RANK", "300"))
+RESOLVER_FUZZY_MAX_RANK = int(os.getenv("RESOLVER_FUZZY_MAX_RANK", "500"))
+
+# Top-N listings snapshot, refreshed in the background
+LISTINGS_FETCH_LIMIT = int(os.getenv("LISTINGS_FETCH_LIMIT", "100"))
+LISTINGS_REFRESH_SECONDS = int(os.getenv("LISTINGS_REFRESH_SECONDS", "300"))
+TOP_N_DEFAULT = int(os.getenv("TOP_N_DEFAULT", "50"))
+
+# Price watches / alerts pushed to subscribed chats
+ALERT_POLL_SECONDS = int(os.getenv("ALERT_POLL_SECONDS", "60"))
+ALERTS_MAX_PER_CHAT = int(os.getenv("ALERTS_MAX_PER_CHAT", "20"))
+# Subscriptions are saved to this JSON file whenever they change and loaded at startup; "" = memory only
+ALERTS_PATH = os.getenv("ALERTS_PATH", "alerts.json")
+
+# Local price history (memory-mapped columns per symbol), fed by every quote we fetch
+PRICE_HISTORY_DIR = os.getenv("PRICE_HISTORY_DIR", "price_history")
+PRICE_HISTORY_INITIAL_CAPACITY = int(os.getenv("PRICE_HISTORY_INITIAL_CAPACITY", "4096"))
+PRICE_HISTORY_ENABLED = os.getenv("PRICE_HISTORY_ENABLED", "true").lower() == "true"
+
+# Admission control: per-chat rate limit, bounded fair work queue, global per-provider limits
+CHAT_RATE_PER_MINUTE = int(os.getenv("CHAT_RATE_PER_MINUTE", "10"))
+CHAT_BURST = int(os.getenv("CHAT_BURST", "3"))
+ADMISSION_CONCURRENCY = int(os.getenv("ADMISSION_CONCURRENCY", "8"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "100"))
+ADMISSION_MAX_PENDING_PER_CHAT = int(os.getenv("ADMISSION_MAX_PENDING_PER_CHAT", "3"))
+CMC_RATE_PER_MINUTE = int(os.getenv("CMC_RATE_PER_MINUTE", "30"))
+NEWSDATA_RATE_PER_MINUTE = int(os.getenv("NEWSDATA_RATE_PER_MINUTE", "30"))
+GEMINI_RATE_PER_MINUTE = int(os.getenv("GEMINI_RATE_PER_MINUTE", "15"))
+# How long a call may wait for its provider's rate limit before giving up
+PROVIDER_WAIT_SECONDS = float(os.getenv("PROVIDER_WAIT_SECONDS", "5"))
+
+# Metrics: Prometheus-style /metrics endpoint served by the bot, and slow-request tracing
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+# Requests slower than this log their per-stage breakdown as a warning (see LOG_FORMAT below)
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "5"))
+
+# Logging: root level, per-module overrides ("services.market_data=DEBUG,aiogram=WARNING") and format (json | text)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+
+# Bulk reports: one digest for many coins (CLI "report" subcommand, bot /report)
+# Chat ids allowed to run /report in the bot, comma-separated; empty = /report is off
+REPORT_ALLOWED_CHATS = frozenset(int(c) for c in os.getenv("REPORT_ALLOWED_CHATS", "").split(",") if c.strip())
+REPORT_MAX_COINS = int(os.getenv("REPORT_MAX_COINS", "100"))
+REPORT_NEWS_PER_COIN = int(os.getenv("REPORT_NEWS_PER_COIN", "3"))
+REPORT_NEWS_CONCURRENCY = int(os.getenv("REPORT_NEWS_CONCURRENCY", "8"))
+# Coins are packed into each Gemini prompt until its estimated size reaches the budget
+REPORT_PROMPT_TOKEN_BUDGET = int(os.getenv("REPORT_PROMPT_TOKEN_BUDGET", "4000"))
+REPORT_MAX_COINS_PER_PROMPT = int(os.getenv("REPORT_MAX_COINS_PER_PROMPT", "10"))
+REPORT_GEMINI_CONCURRENCY = int(os.getenv("REPORT_GEMINI_CONCURRENCY", "3"))
+# Share of each provider's rate limit set aside for reports; interactive requests get the rest, so a
+# long report never drains their buckets
+REPORT_RATE_SHARE = float(os.getenv("REPORT_RATE_SHARE", "0.25"))
+# A digest may wait this long for its turn at the reports' share of the Gemini rate limit, per prompt
+REPORT_GEMINI_WAIT_SECONDS = float(os.getenv("REPORT_GEMINI_WAIT_SECONDS", "120"))
+# Likewise for each coin's news fetch at the reports' share of the Newsdata.io rate limit
+REPORT_NEWS_WAIT_SECONDS = float(os.getenv("REPORT_NEWS_WAIT_SECONDS", "120"))
+
+# Prompt assembly: hard input-token budgets, news ranking, and output caps (brief mode for chat answers)
+ASSISTANT_PROMPT_TOKEN_BUDGET = int(os.getenv("ASSISTANT_PROMPT_TOKEN_BUDGET", "1200"))
+NEWS_PROMPT_TOKEN_BUDGET = int(os.getenv("NEWS_PROMPT_TOKEN_BUDGET", "2000"))
+# A news article's ranking weight halves every this many hours
+NEWS_RECENCY_HALF_LIFE_HOURS = float(os.getenv("NEWS_RECENCY_HALF_LIFE_HOURS", "24"))
+BRIEF_ANSWERS = os.getenv("BRIEF_ANSWERS", "true").lower() == "true"
+MAX_OUTPUT_TOKENS = int(os.getenv("MAX_OUTPUT_TOKENS", "1024"))
+BRIEF_MAX_OUTPUT_TOKENS = int(os.getenv("BRIEF_MAX_OUTPUT_TOKENS", "300"))
+# Output allowance per coin in a bulk report prompt
+REPORT_OUTPUT_TOKENS_PER_COIN = int(os.getenv("REPORT_OUTPUT_TOKENS_PER_COIN", "150"))
+
+# Scale-out: one update-intake process feeding BOT_WORKERS worker processes (cluster.py)
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", str(os.cpu_count() or 1)))
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "1000"))
+# Shared second-level cache for quotes, listings, news and answers: "" keeps caches per process,
+# "memory://" shares them within one process, "redis://host:6379/0" across processes and hosts
+CACHE_BACKEND_URL = os.getenv("CACHE_BACKEND_URL", "")
+CACHE_BACKEND_TIMEOUT_SECONDS = float(os.getenv("CACHE_BACKEND_TIMEOUT_SECONDS", "0.5"))
+# After a connection failure the backend is skipped (every lookup is a miss) for this long
+CACHE_BACKEND_RETRY_SECONDS = float(os.getenv("CACHE_BACKEND_RETRY_SECONDS", "10"))
+
+# Receiving updates: "polling" (getUpdates) or "webhook" (Telegram POSTs updates to our aiohttp server)
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+# Public HTTPS base URL Telegram should call (e.g. https://bot.example.com); empty = don't register the webhook
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+# Checked against the X-Telegram-Bot-Api-Secret-Token header of every delivery
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# Concurrent deliveries: Telegram's max_connections (1-100), and updates we take in at once
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+# On shutdown, in-flight deliveries and queued requests get this long to finish
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "20"))
+# Bot API server: a self-hosted telegram-bot-api, or a local stub when testing; empty = api.telegram.org
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+
+# Local news search: an in-memory BM25 index over every fetched article (title, description, keywords)
+NEWS_INDEX_MAX_ARTICLES = int(os.getenv("NEWS_INDEX_MAX_ARTICLES", "5000"))
+NEWS_INDEX_TITLE_WEIGHT = int(os.getenv("NEWS_INDEX_TITLE_WEIGHT", "2"))
+NEWS_INDEX_BM25_K1 = float(os.getenv("NEWS_INDEX_BM25_K1", "1.2"))
+NEWS_INDEX_BM25_B = float(os.getenv("NEWS_INDEX_BM25_B", "0.75"))
+# One upstream news call fetches a full page; the best NEWS_TOP_K articles from the index go into the prompt
+NEWS_FETCH_SIZE = int(os.getenv("NEWS_FETCH_SIZE", "10"))
+NEWS_TOP_K = int(os.getenv("NEWS_TOP_K", "5"))
+
+# Near-duplicate news (the same story syndicated by several sources): an article whose word shingles mostly
+# appear in one of the last NEWS_DEDUP_WINDOW articles is treated as a copy of it
+NEWS_DEDUP_WINDOW = int(os.getenv("NEWS_DEDUP_WINDOW", "2000"))
+NEWS_DEDUP_MIN_OVERLAP = float(os.getenv("NEWS_DEDUP_MIN_OVERLAP", "0.8"))
+# Texts with fewer three-word shingles than this are only matched exactly (by link or title)
+NEWS_DEDUP_MIN_SHINGLES = int(os.getenv("NEWS_DEDUP_MIN_SHINGLES", "5"))
+
+# Warm start: caches are saved to this file every WARM_SNAPSHOT_INTERVAL_SECONDS and on shutdown,
+# and restored at startup while upstream data is refreshed in the background ("" disables it)
+WARM_SNAPSHOT_PATH = os.getenv("WARM_SNAPSHOT_PATH", "warm_snapshot.bin")
+WARM_SNAPSHOT_INTERVAL_SECONDS = int(os.getenv("WARM_SNAPSHOT_INTERVAL_SECONDS", "300"))
+# An older snapshot is ignored rather than served
+WARM_SNAPSHOT_MAX_AGE_SECONDS = int(os.getenv("WARM_SNAPSHOT_MAX_AGE_SECONDS", str(24 * 3600)))
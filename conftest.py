@@ -0,0 +1,9 @@
+# conftest.py
+import os
+
+# Set before any project module reads config: no bot token needed, nothing written to the working directory
+os.environ.setdefault("BOT_TOKEN", "123456:test")
+os.environ.setdefault("NEWS_STORE_DB_PATH", "")
+os.environ.setdefault("ANSWER_CACHE_DB_PATH", "")
+os.environ.setdefault("WARM_SNAPSHOT_PATH", "")
+os.environ.setdefault("ALERTS_PATH", "")
@@ -1,173 +1,72 @@
 # main.py
-import string
+import argparse
+import asyncio
+import sys
+import threading
 
 from services.aggregator import get_aggregated_coin_data
-from services.market_data import get_top_50_coins_cmc
+from services.coin_resolver import coin_resolver
+from services.listings import listings_service
+from services.snapshot import warm_snapshot
+from config import TOP_N_DEFAULT
+from services.metrics import stage, request_scope
+from services.logging_config import setup_logging
+from services.http_client import close_session
 from ai_processor import generate_crypto_assistant_response
+from report import select_report_coins_async, write_report_async
 
 # --- Helper function to extract coin identifier ---
 def extract_coin_identifier_from_query(query):
     """
-    Simpler extraction of a potential coin identifier (word or symbol) from the user query.
-    Focuses on capitalized words or uppercase sequences.
+    Extracts the coin a user query is about and returns its symbol (e.g., "BTC"), or None.
+    Uses the shared coin resolver: symbols, names, multi-word names ("Shiba Inu"),
+    aliases and small typos ("bitcion") are all recognized.
     """
-    query_clean = query.lower().translate(str.maketrans('', '', string.punctuation))
-    words = query_clean.split()
-    
-    # Try to find a sequence of capitalized words (potential multi-word name)
-    # or a single capitalized word.
-    # Also look for all-caps words (potential symbols).
-    
-    
-    # First pass for explicit symbols (all caps, short)
-    for word in words:
-        if word.isupper() and 1 < len(word) < 7: # e.g., BTC, ETH, SOL, DOGE
-            return word # Return the first clear symbol found
-
-    # Second pass for capitalized words / potential names
-    # We try to reconstruct multi-word names like "Shiba Inu"
-    # This is still very basic.
-    current_name_parts = []
-    longest_potential_name = ""
-
-    for word in words:
-        # Ignore common lowercase words that might be part of a query but not a coin name
-        if word.islower() and word not in ['of', 'the', 'for', 'and', 'about', 'price', 'news', 'market', 'cap', 'tell', 'me', 'what', "what's", 'is', 'latest', 'current']:
-            if current_name_parts: # if we were building a name, stop
-                name_candidate = " ".join(current_name_parts)
-                if len(name_candidate) > len(longest_potential_name):
-                    longest_potential_name = name_candidate
-                current_name_parts = []
-            continue # Skip this lowercase word
-
-        if word.istitle() or word.isupper(): # istitle() checks for "Titlecase"
-            current_name_parts.append(word)
-        elif current_name_parts: # Word is not title/upper, and we were building a name
-            name_candidate = " ".join(current_name_parts)
-            if len(name_candidate) > len(longest_potential_name):
-                longest_potential_name = name_candidate
-            current_name_parts = [] # Reset
-
-    # Check after loop if current_name_parts still has something
-    if current_name_parts:
-        name_candidate = " ".join(current_name_parts)
-        if len(name_candidate) > len(longest_potential_name):
-            longest_potential_name = name_candidate
-            
-    if longest_potential_name:
-        return longest_potential_name
-
-    # Fallback for common lowercase names if no capitalized/uppercase found
-    query_lower = query.lower()
-    common_names_map = {
-    # Bitcoin
-    "bitcoin": "BTC",
-    "btc": "BTC",
-    "bitecoin": "BTC",
-    "bitcion": "BTC",
-    "bitcoinn": "BTC",
-    # Ethereum
-    "ethereum": "ETH",
-    "eth": "ETH",
-    # Solana
-    "solana": "SOL",
-    "sol": "SOL",
-    # Ripple
-    "ripple": "XRP",
-    "xrp": "XRP",
-    # Cardano
-    "cardano": "ADA",
-    "ada": "ADA",
-    # Dogecoin
-    "dogecoin": "DOGE",
-    "doge": "DOGE",
-    # Shiba Inu
-    "shiba inu": "SHIB",
-    "shib": "SHIB",
-    # Binance Coin
-    "binance coin": "BNB",
-    "bnb": "BNB",
-    # Avalanche
-    "avalanche": "AVAX",
-    "avax": "AVAX",
-    # Polkadot
-    "polkadot": "DOT",
-    "dot": "DOT",
-    # Tron
-    "tron": "TRX",
-    "trx": "TRX",
-    # Chainlink
-    "chainlink": "LINK",
-    "link": "LINK",
-    # Polygon
-    "polygon": "MATIC",
-    "matic": "MATIC",
-    # Litecoin
-    "litecoin": "LTC",
-    "ltc": "LTC",
-    # Uniswap
-    "uniswap": "UNI",
-    "uni": "UNI",
-    # Stellar
-    "stellar": "XLM",
-    "xlm": "XLM",
-    # Aptos
-    "aptos": "APT",
-    "apt": "APT",
-    # Arbitrum
-    "arbitrum": "ARB",
-    "arb": "ARB",
-    # Internet Computer
-    "internet computer": "ICP",
-    "icp": "ICP",
-    # VeChain
-    "vechain": "VET",
-    "vet": "VET",
-    # Toncoin
-    "ton": "TON",
-    "toncoin": "TON",
-}
-
-    
-    for word in words:
-       if word in common_names_map:
-           return common_names_map[word]
-       
-    query_lower = query_clean
-    for alias, symbol in common_names_map.items():
-        if alias in query_lower:
-            return symbol
-
-    for lc_name, canonical_form in common_names_map.items():
-        if lc_name in query_lower:
-            return canonical_form
-            
-    return None
+    with stage("resolution"):
+        coin = coin_resolver.resolve(query)
+    return coin['symbol'] if coin else None
+
+def resolve_coin_term(term):
+    """Returns (symbol to query CMC with, coin name) for a term, falling back to the term itself."""
+    coin = coin_resolver.lookup(term)
+    if coin:
+        return coin['symbol'], coin['name']
+    return term, term
+
+def _revalidate():
+    """Replaces the data restored from the warm-start snapshot with fresh upstream data."""
+    listings_service.refresh()
+    coin_resolver.load()
 
 def main():
     print("Welcome to the AI Crypto Assistant!")
     print("You can ask questions like: 'What's the latest news about Ethereum?' or 'Tell me about Bitcoin price.'")
-    print("Type 'top50' to see the list of top 50 coins by market cap.")
+    print(f"Type 'top{TOP_N_DEFAULT}' (or 'top<N>') to see the top coins by market cap.")
     print("Or use 'news <coin>' to get news about a specific coin quickly.")
     print("Type 'quit' or 'exit' to leave.")
 
-    print("\nFetching initial coin list...")
-    top_50_coins_list = get_top_50_coins_cmc()
-    if top_50_coins_list:
-        print(f"Fetched {len(top_50_coins_list)} coins for reference.")
-        known_coin_refs_for_resolution = [
-            {'name': c['name'], 'symbol': c['symbol'], 'id': c.get('id')}
-            for c in top_50_coins_list
-        ]
+    if warm_snapshot.load() and coin_resolver.coins is not None:
+        # Start from the previous run's data; fresh listings and coin map are fetched in the background
+        print(f"\nLoaded {len(listings_service.snapshot)} top coins and {len(coin_resolver)} known coins from the last run.")
+        threading.Thread(target=_revalidate, daemon=True).start()
     else:
-        print("Could not fetch the top 50 coins list. Coin identification might be less accurate.")
-        known_coin_refs_for_resolution = []
+        print("\nFetching initial coin list...")
+        if listings_service.refresh():
+            print(f"Fetched {len(listings_service.snapshot)} coins for reference.")
+        else:
+            print("Could not fetch the top coins list.")
+        if coin_resolver.load():
+            print(f"Loaded {len(coin_resolver)} coins for identification.")
+        else:
+            print("Could not fetch the CoinMarketCap coin map. Coin identification might be less accurate.")
+    listings_service.start_thread() # keeps the 'top' list fresh while the CLI runs
 
     while True:
         user_query = input("\nAsk me about crypto (or type 'quit'): ").strip()
         if not user_query:
             continue
         if user_query.lower() in ['quit', 'exit']:
+            warm_snapshot.save()
             print("Goodbye!")
             break
 
@@ -180,22 +79,7 @@ def main():
             extracted_term = arg
             print(f"Fetching news for '{extracted_term}'...")
 
-            target_symbol_for_api = None
-            resolved_coin_name = extracted_term
-
-            for coin_detail in known_coin_refs_for_resolution:
-                if extracted_term.upper() == coin_detail['symbol'].upper():
-                    target_symbol_for_api = coin_detail['symbol']
-                    resolved_coin_name = coin_detail['name']
-                    break
-                if extracted_term.lower() == coin_detail['name'].lower():
-                    target_symbol_for_api = coin_detail['symbol']
-                    resolved_coin_name = coin_detail['name']
-                    break
-
-            if not target_symbol_for_api:
-                target_symbol_for_api = extracted_term
-                resolved_coin_name = extracted_term
+            target_symbol_for_api, resolved_coin_name = resolve_coin_term(extracted_term)
 
             aggregated_data = get_aggregated_coin_data(target_symbol_for_api)
 
@@ -217,57 +101,80 @@ def main():
 
             continue
 
-        if user_query.lower() == 'top50':
-            if top_50_coins_list:
-                print("\n--- Top 50 Coins by Market Cap ---")
-                for i, coin in enumerate(top_50_coins_list):
-                    price_val = coin.get('price_usd')
-                    price_str = f"${price_val:.2f}" if isinstance(price_val, (int, float)) else str(price_val)
-                    print(f"{i+1}. {coin.get('name', 'N/A')} ({coin.get('symbol', 'N/A')}) - Price: {price_str}")
+        top_arg = user_query.lower().replace(" ", "")
+        if top_arg == 'top' or (top_arg.startswith('top') and top_arg[3:].isdigit()):
+            top_n = int(top_arg[3:] or TOP_N_DEFAULT)
+            top_text = listings_service.top_text(top_n)
+            if top_text:
+                print(f"\n--- Top {top_n} Coins by Market Cap ---")
+                print(top_text)
             else:
-                print("Sorry, I couldn't retrieve the top 50 coins list at this moment.")
+                print(f"Sorry, I couldn't retrieve the top {top_n} coins list at this moment.")
             continue
 
         # Остальная логика как в предыдущем примере — обработка запроса по конкретной крипте,
         # получение данных и генерация ответа ассистента.
-        extracted_term = extract_coin_identifier_from_query(user_query)
-        if not extracted_term:
-            print("I couldn't identify a specific cryptocurrency in your query. Please try rephrasing, e.g., 'Tell me about Bitcoin'.")
-            continue
-
-        print(f"\nExtracted term: '{extracted_term}'. Attempting to resolve...")
+        with request_scope("cli"):
+            extracted_term = extract_coin_identifier_from_query(user_query)
+            if not extracted_term:
+                print("I couldn't identify a specific cryptocurrency in your query. Please try rephrasing, e.g., 'Tell me about Bitcoin'.")
+                continue
 
-        target_symbol_for_api = None
-        resolved_coin_name = extracted_term
-        for coin_detail in known_coin_refs_for_resolution:
-            if extracted_term.upper() == coin_detail['symbol'].upper():
-                target_symbol_for_api = coin_detail['symbol']
-                resolved_coin_name = coin_detail['name']
-                break
-            if extracted_term.lower() == coin_detail['name'].lower():
-                target_symbol_for_api = coin_detail['symbol']
-                resolved_coin_name = coin_detail['name']
-                break
+            print(f"\nExtracted term: '{extracted_term}'. Attempting to resolve...")
 
-        if not target_symbol_for_api:
-            target_symbol_for_api = extracted_term
-            resolved_coin_name = extracted_term
+            target_symbol_for_api, resolved_coin_name = resolve_coin_term(extracted_term)
 
-        aggregated_data = get_aggregated_coin_data(target_symbol_for_api)
-        if not aggregated_data:
-            print(f"Sorry, I couldn't retrieve any information for '{target_symbol_for_api}'.")
-            ai_response = generate_crypto_assistant_response(user_query,
-                                                             {"query_identifier": target_symbol_for_api,
-                                                              "resolved_name_for_news": resolved_coin_name,
-                                                              "market_data": None,
-                                                              "news_articles": []})
-            print(f"\nAI Assistant: {ai_response}")
-            continue
+            aggregated_data = get_aggregated_coin_data(target_symbol_for_api)
+            if not aggregated_data:
+                print(f"Sorry, I couldn't retrieve any information for '{target_symbol_for_api}'.")
+                ai_response = generate_crypto_assistant_response(user_query,
+                                                                 {"query_identifier": target_symbol_for_api,
+                                                                  "resolved_name_for_news": resolved_coin_name,
+                                                                  "market_data": None,
+                                                                  "news_articles": []})
+                print(f"\nAI Assistant: {ai_response}")
+                continue
 
-        ai_response = generate_crypto_assistant_response(user_query, aggregated_data)
-        print(f"\nAI Assistant:")
-        print(ai_response)
+            ai_response = generate_crypto_assistant_response(user_query, aggregated_data)
+            print(f"\nAI Assistant:")
+            print(ai_response)
+
+
+# --- Bulk report subcommand: python main.py report BTC ETH SOL | python main.py report top50 --out digest.md ---
+def report_command(argv):
+    parser = argparse.ArgumentParser(prog="main.py report", description="Writes one AI digest for many coins at once.")
+    parser.add_argument("coins", nargs="+", help='coin symbols or names, or "top<N>" for the top N by market cap')
+    parser.add_argument("--out", help="file to write the report to (default: print it)")
+    args = parser.parse_args(argv)
+    return asyncio.run(_run_report(" ".join(args.coins), args.out))
+
+async def _run_report(coin_args, out_path):
+    try:
+        if not coin_args.lower().startswith("top") and not await coin_resolver.load_async():
+            print("Could not fetch the CoinMarketCap coin map. Coin identification might be less accurate.")
+        coins = await select_report_coins_async(coin_args)
+        if not coins:
+            print("No coins to report on.")
+            return 1
+
+        out = open(out_path, "w", encoding="utf-8") if out_path else sys.stdout
+        async def write(text):
+            out.write(text + "\n\n")
+            out.flush()
+        try:
+            await write_report_async(coins, write)
+        finally:
+            if out_path:
+                out.close()
+        if out_path:
+            print(f"Report for {len(coins)} coins written to {out_path}.")
+        return 0
+    finally:
+        await close_session()
 
 
 if __name__ == "__main__":
+    setup_logging()
+    if len(sys.argv) > 1 and sys.argv[1] == "report":
+        sys.exit(report_command(sys.argv[2:]))
     main()
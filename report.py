@@ -0,0 +1,182 @@
+# report.py
+import asyncio
+import logging
+import re
+import time
+from datetime import datetime, timezone
+
+from config import (TOP_N_DEFAULT, QUOTE_BATCH_MAX_SYMBOLS, REPORT_MAX_COINS, REPORT_NEWS_PER_COIN,
+                    REPORT_NEWS_CONCURRENCY, REPORT_PROMPT_TOKEN_BUDGET, REPORT_MAX_COINS_PER_PROMPT,
+                    REPORT_GEMINI_CONCURRENCY, REPORT_NEWS_WAIT_SECONDS)
+from services.admission import report_limits
+from services.coin_resolver import coin_resolver
+from services.listings import listings_service
+from services.market_data import get_coins_data_cmc_async
+from services.news_service import get_coin_news_async
+from services.news_store import news_store
+from services.metrics import stage
+from services.prompt_builder import estimate_tokens, compact_number, rank_articles
+from ai_processor import generate_digest_async
+
+logger = logging.getLogger(__name__)
+
+# --- Bulk report: one digest for many coins ---
+# Quotes come from one batched CMC call, news is fetched with bounded concurrency, and several
+# coins share each Gemini prompt. Sections are written out in order as soon as they are ready.
+
+_TOP_TERM = re.compile(r"^top(\d*)$")
+_TERM_SEPARATORS = re.compile(r"[\s,]+")
+
+# Length at which news descriptions are cut in a coin block
+DESCRIPTION_CHARS = 200
+
+# _fetch_news result for a coin whose fetch got no room at the Newsdata.io rate limit
+RATE_LIMITED = "rate_limited"
+
+async def select_report_coins_async(args):
+    """
+    Turns report arguments into a list of (symbol, name), at most REPORT_MAX_COINS.
+    :param args: "BTC ETH solana", "BTC,ETH" or "top30" / "top 30" / "top" (TOP_N_DEFAULT coins by market cap).
+    """
+    terms = [t for t in _TERM_SEPARATORS.split(args or "") if t]
+    top = _TOP_TERM.match("".join(terms).lower())
+    if top:
+        if not len(listings_service.snapshot):
+            await listings_service.refresh_async()
+        n = min(int(top.group(1) or TOP_N_DEFAULT), REPORT_MAX_COINS)
+        coins = [(c['symbol'], c['name']) for c in listings_service.top(n)]
+    else:
+        coins = []
+        for term in terms:
+            coin = coin_resolver.lookup(term)
+            coins.append((coin['symbol'], coin['name']) if coin else (term.upper(), term))
+    # Each coin once, in the order given
+    return list(dict.fromkeys(coins))[:REPORT_MAX_COINS]
+
+# --- Data ---
+
+async def _fetch_quotes(symbols):
+    """All quotes in as few /quotes/latest calls as CMC allows (one for up to QUOTE_BATCH_MAX_SYMBOLS coins)."""
+    batches = [symbols[i:i + QUOTE_BATCH_MAX_SYMBOLS] for i in range(0, len(symbols), QUOTE_BATCH_MAX_SYMBOLS)]
+    quotes = {}
+    for result in await asyncio.gather(*(get_coins_data_cmc_async(batch) for batch in batches)):
+        quotes.update(result)
+    return quotes
+
+async def _fetch_news(names):
+    """
+    News for every coin, at most REPORT_NEWS_CONCURRENCY requests at a time; None where a fetch failed
+    and RATE_LIMITED where the reports' share of the Newsdata.io rate limit (admission.report_limits) had no
+    room within REPORT_NEWS_WAIT_SECONDS. Upstream fetches wait for their turn at that share, so a big report
+    is paced rather than cut short.
+    """
+    semaphore = asyncio.Semaphore(REPORT_NEWS_CONCURRENCY)
+    newsdata_limit = report_limits['newsdata']
+
+    async def fetch(name):
+        async with semaphore:
+            try:
+                if news_store.is_fresh(name, REPORT_NEWS_PER_COIN):
+                    return await get_coin_news_async(name, size=REPORT_NEWS_PER_COIN)
+                if not await newsdata_limit.acquire_async(timeout=REPORT_NEWS_WAIT_SECONDS):
+                    logger.warning("Newsdata.io rate limit had no room for '%s' within %.0fs", name, REPORT_NEWS_WAIT_SECONDS)
+                    return RATE_LIMITED
+                # The token is taken above; the fetch must not wait for another one
+                return await get_coin_news_async(name, size=REPORT_NEWS_PER_COIN, rate_limit_wait=None)
+            except Exception as e:
+                logger.warning("News fetch for '%s' failed during report: %s", name, e)
+                return None
+
+    return await asyncio.gather(*(fetch(name) for name in names))
+
+def _market_line(market):
+    if not market:
+        return "market: no data"
+    change = market.get('percent_change_24h')
+    change_str = f"{change:+.2f}%" if isinstance(change, (int, float)) else "n/a"
+    return (f"price {compact_number(market.get('price_usd'), money=True)} | 24h {change_str} | "
+            f"mcap {compact_number(market.get('market_cap_usd'), money=True)} | "
+            f"vol {compact_number(market.get('volume_24h_usd'), money=True)} | "
+            f"rank {market.get('rank') or 'n/a'}")
+
+def build_coin_block(symbol, name, market, news):
+    """Compact description of one coin for a digest prompt: one market line and its most relevant, recent headlines."""
+    lines = [f"## {name} ({symbol})", _market_line(market)]
+    if news == RATE_LIMITED:
+        lines.append("- news skipped: news provider rate limit reached")
+        return "\n".join(lines)
+    for article in rank_articles(news, [name, symbol])[:REPORT_NEWS_PER_COIN]:
+        title = article.get('title') or "No title"
+        desc = (article.get('description') or "").strip()
+        if len(desc) > DESCRIPTION_CHARS:
+            desc = desc[:DESCRIPTION_CHARS].rsplit(" ", 1)[0] + "..."
+        lines.append(f"- {title} ({article.get('source_id') or 'unknown source'})" + (f": {desc}" if desc else ""))
+    if len(lines) == 2:
+        lines.append("- no recent news")
+    return "\n".join(lines)
+
+def pack_blocks(blocks, budget=REPORT_PROMPT_TOKEN_BUDGET, max_per_prompt=REPORT_MAX_COINS_PER_PROMPT):
+    """
+    Groups coin blocks, in order, into as few prompts as the token budget allows.
+    A block bigger than the whole budget still gets a prompt of its own.
+    :return: A list of lists of blocks.
+    """
+    groups, current, used = [], [], 0
+    for block in blocks:
+        tokens = estimate_tokens(block)
+        if current and (used + tokens > budget or len(current) >= max_per_prompt):
+            groups.append(current)
+            current, used = [], 0
+        current.append(block)
+        used += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+# --- Report ---
+
+async def _timed(stage_name, coro):
+    with stage(stage_name):
+        return await coro
+
+async def _write_section(group, semaphore):
+    async with semaphore:
+        text = await generate_digest_async(group)
+    if text:
+        return text.strip()
+    # Gemini unavailable: the data itself is still worth sending
+    return "\n\n".join(group)
+
+async def write_report_async(coins, write):
+    """
+    Builds the digest for `coins` and passes it to `write` piece by piece, in order, as it is generated.
+
+    :param coins: List of (symbol, name), e.g. from select_report_coins_async.
+    :param write: Async callable taking one piece of text (a header or one group of coin sections).
+    :return: The number of Gemini prompts the report was split into.
+    """
+    started_at = time.perf_counter()
+    quotes, news = await asyncio.gather(
+        _timed("cmc_fetch", _fetch_quotes([symbol for symbol, _ in coins])),
+        _timed("news_fetch", _fetch_news([name for _, name in coins])),
+    )
+
+    blocks = []
+    for (symbol, name), articles in zip(coins, news):
+        market = quotes.get(symbol.upper())
+        blocks.append(build_coin_block(symbol, (market or {}).get('name') or name, market, articles))
+    groups = pack_blocks(blocks)
+
+    await write(f"Crypto digest, {datetime.now(timezone.utc):%Y-%m-%d %H:%M} UTC: {len(coins)} coins")
+    # Gemini calls run concurrently; sections are written in coin order as each one completes
+    semaphore = asyncio.Semaphore(REPORT_GEMINI_CONCURRENCY)
+    tasks = [asyncio.ensure_future(_write_section(group, semaphore)) for group in groups]
+    try:
+        for task in tasks:
+            await write(await task)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    logger.info("Report for %s coins in %s prompts took %.1fs", len(coins), len(groups), time.perf_counter() - started_at)
+    return len(groups)
@@ -0,0 +1,178 @@
+# admission.py
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+from config import (CHAT_RATE_PER_MINUTE, CHAT_BURST, ADMISSION_CONCURRENCY, ADMISSION_QUEUE_SIZE,
+                    ADMISSION_MAX_PENDING_PER_CHAT, CMC_RATE_PER_MINUTE, NEWSDATA_RATE_PER_MINUTE,
+                    GEMINI_RATE_PER_MINUTE, PROVIDER_WAIT_SECONDS, REPORT_RATE_SHARE)
+
+logger = logging.getLogger(__name__)
+
+# --- Admission control: rate limits, bounded fair work queue, load shedding ---
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity`. Thread-safe."""
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self):
+        """Takes a token if one is available; otherwise returns seconds until the next one."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate if self.rate > 0 else float('inf')
+
+    def try_acquire(self):
+        return self._take() == 0.0
+
+    def acquire(self, timeout=PROVIDER_WAIT_SECONDS):
+        """Blocks until a token is available or timeout passes. Returns True if a token was taken."""
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if wait == 0.0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    async def acquire_async(self, timeout=PROVIDER_WAIT_SECONDS):
+        """Async version of acquire; waits without blocking the event loop."""
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if wait == 0.0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+def _per_minute(limit):
+    return TokenBucket(rate=limit / 60.0, capacity=max(1, int(limit) // 4))
+
+def _provider_buckets(share):
+    """One bucket per upstream provider holding `share` of its rate limit."""
+    return {
+        'cmc': _per_minute(CMC_RATE_PER_MINUTE * share),
+        'newsdata': _per_minute(NEWSDATA_RATE_PER_MINUTE * share),
+        'gemini': _per_minute(GEMINI_RATE_PER_MINUTE * share),
+    }
+
+# Global limits per upstream provider, shared by every chat's interactive requests
+provider_limits = _provider_buckets(1.0 - REPORT_RATE_SHARE)
+# Bulk reports wait minutes for their tokens, so they draw from their own share instead
+report_limits = _provider_buckets(REPORT_RATE_SHARE)
+
+class ChatLimiter:
+    """One token bucket per chat; idle buckets are dropped once there are too many."""
+    def __init__(self, per_minute=CHAT_RATE_PER_MINUTE, burst=CHAT_BURST, max_chats=10000):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.max_chats = max_chats
+        self._buckets = OrderedDict()
+
+    def allow(self, chat_id):
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.max_chats:
+                self._buckets.popitem(last=False)
+        self._buckets.move_to_end(chat_id)
+        return bucket.try_acquire()
+
+class FairScheduler:
+    """
+    A bounded work queue drained by `concurrency` workers, round-robin across chats:
+    a chat with ten queued requests can't delay another chat's first one.
+    submit() sheds load (returns False) instead of queueing without bound.
+    """
+    def __init__(self, concurrency=ADMISSION_CONCURRENCY, max_queue=ADMISSION_QUEUE_SIZE,
+                 max_pending_per_chat=ADMISSION_MAX_PENDING_PER_CHAT):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_pending_per_chat = max_pending_per_chat
+        self._queues = OrderedDict() # chat_id -> deque of jobs, in round-robin order
+        self._size = 0
+        self._ready = None
+        self._workers = []
+        self._running = 0
+        self.shed = 0
+
+    def _start(self):
+        self._ready = asyncio.Semaphore(0)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    def is_full(self):
+        return self._size >= self.max_queue
+
+    def submit(self, chat_id, job):
+        """
+        Queues job (a zero-argument coroutine function) for chat_id.
+        :return: False if the queue or the chat's share of it is full (the caller should say it's busy).
+        """
+        if self._ready is None:
+            self._start()
+        queue = self._queues.get(chat_id)
+        if self._size >= self.max_queue or (queue is not None and len(queue) >= self.max_pending_per_chat):
+            self.shed += 1
+            return False
+        if queue is None:
+            queue = self._queues[chat_id] = deque()
+        queue.append(job)
+        self._size += 1
+        self._ready.release()
+        return True
+
+    def _next_job(self):
+        chat_id, queue = next(iter(self._queues.items()))
+        job = queue.popleft()
+        self._size -= 1
+        if queue:
+            self._queues.move_to_end(chat_id) # back of the line for its next job
+        else:
+            del self._queues[chat_id]
+        return job
+
+    async def _worker(self):
+        while True:
+            await self._ready.acquire()
+            job = self._next_job()
+            self._running += 1
+            try:
+                await job()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Queued request failed")
+            finally:
+                self._running -= 1
+
+    def pending(self):
+        return self._size
+
+    async def drain(self, timeout):
+        """Waits up to timeout seconds for queued and running jobs to finish. Returns True if they all did."""
+        deadline = time.monotonic() + timeout
+        while (self._size or self._running) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self._size or self._running:
+            logger.warning("Shutdown drain timed out: %s queued and %s running requests dropped", self._size, self._running)
+            return False
+        return True
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        self._ready = None
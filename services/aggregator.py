@@ -1,54 +1,180 @@
 # aggregator.py
-from services.news_service import get_newsdata_io_news
-from services.market_data import get_coin_data_cmc
+import asyncio
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from config import AGGREGATOR_PARALLEL, MARKET_DATA_DEADLINE_SECONDS, NEWS_DEADLINE_SECONDS
+from services.news_service import get_coin_news, get_coin_news_async
+from services.market_data import get_coin_data_cmc, get_coin_data_cmc_async, lookup_coin_name
+from services.coin_resolver import coin_resolver
+from services.price_history import price_history
+from services.metrics import stage
+
+logger = logging.getLogger(__name__)
+
+# Used by the synchronous parallel path (CLI); the bot uses asyncio instead
+_fetch_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="aggregator")
 
 # --- Data Aggregation Function ---
-def get_aggregated_coin_data(coin_identifier):
+def resolve_news_name_locally(coin_identifier):
     """
-    Aggregates market data and news for a given coin.
-    :param coin_identifier: Can be a coin symbol (e.g., "BTC") or a coin name (e.g., "Bitcoin").
-    :return: A dictionary containing aggregated data, or None if essential data can't be fetched.
+    Names the coin for the news query without a CMC round trip: the name from the coin
+    resolver or the local symbol index if the identifier is known, else the identifier itself.
     """
-    print(f"\nAttempting to aggregate data for: {coin_identifier}")
-    
-    market_data = None
-    news_articles = [] # Default to empty list
-    
-    # Try to get market data using the identifier as a symbol
-    potential_symbol = coin_identifier.upper() # Assume it could be a symbol
-    market_data = get_coin_data_cmc(coin_symbol=potential_symbol)
-    
+    coin = coin_resolver.lookup(coin_identifier)
+    if coin and coin.get('name'):
+        return coin['name']
+    return lookup_coin_name(coin_identifier) or coin_identifier
+
+def _news_name_from_market_data(coin_identifier, market_data, potential_symbol):
+    """Picks the name to query news with: the CMC name if we have market data, else the raw identifier."""
     coin_name_for_news = coin_identifier # Default to using the raw identifier for news
-    
+
     if market_data:
-        print(f"Successfully fetched market data for {market_data.get('name', potential_symbol)} from CMC.")
+        logger.debug("Successfully fetched market data for %s from CMC.", market_data.get('name', potential_symbol))
         coin_name_for_news = market_data.get('name', coin_identifier) # Use name from CMC for news query
     else:
-        print(f"Could not fetch market data for '{potential_symbol}' using it as a symbol from CMC. Market data will be missing.")
+        logger.warning("Could not fetch market data for '%s' using it as a symbol from CMC. Market data will be missing.", potential_symbol)
         # If coin_identifier was "Bitcoin", coin_name_for_news remains "Bitcoin" for the news query
 
-    # Get news from Newsdata.io using the determined/original coin name
-    print(f"Fetching news for '{coin_name_for_news}' using Newsdata.io...")
-    fetched_news = get_newsdata_io_news(coin_name=coin_name_for_news, size=3) # Fetch 3 news articles for brevity
+    logger.debug("Fetching news for '%s' using Newsdata.io...", coin_name_for_news)
+    return coin_name_for_news
+
+def _assemble_aggregated_data(coin_identifier, coin_name_for_news, market_data, fetched_news):
+    """Builds the aggregated dict, or returns None if neither source produced anything."""
+    news_articles = [] # Default to empty list
 
     if fetched_news is not None: # Check if fetch was successful (returned a list)
         news_articles = fetched_news
-        print(f"Fetched {len(news_articles)} news articles for {coin_name_for_news}.")
+        logger.debug("Fetched %s news articles for %s.", len(news_articles), coin_name_for_news)
     else:
-        # get_newsdata_io_news prints its own errors
-        print(f"News fetching for '{coin_name_for_news}' resulted in no articles or an error. News data will be empty.")
+        # get_coin_news / get_newsdata_io_news print their own errors
+        logger.warning("News fetching for '%s' resulted in no articles or an error. News data will be empty.", coin_name_for_news)
         # news_articles remains an empty list
 
     # Only return something if we have at least some data
     if not market_data and not news_articles:
-        print(f"Could not retrieve any meaningful data for {coin_identifier}.")
+        logger.warning("Could not retrieve any meaningful data for %s.", coin_identifier)
         return None
 
     aggregated_data = {
         "query_identifier": coin_identifier,
         "resolved_name_for_news": coin_name_for_news, # The name used for the news query
         "market_data": market_data, # This will be None if CMC fetch failed
-        "news_articles": news_articles # This will be an empty list if news fetch failed or no news
+        "news_articles": news_articles, # This will be an empty list if news fetch failed or no news
+        # Precomputed 1h/24h/7d stats from the local price history (None if we have none yet)
+        "price_stats": price_history.get_stats(market_data.get('symbol')) if market_data else None,
     }
-    
-    return aggregated_data
\ No newline at end of file
+
+    return aggregated_data
+
+def get_aggregated_coin_data(coin_identifier, parallel=AGGREGATOR_PARALLEL):
+    """
+    Aggregates market data and news for a given coin.
+    :param coin_identifier: Can be a coin symbol (e.g., "BTC") or a coin name (e.g., "Bitcoin").
+    :param parallel: Fetch market data and news at the same time, each bounded by its own
+                     deadline, instead of waiting for CMC to learn the coin name first.
+    :return: A dictionary containing aggregated data, or None if essential data can't be fetched.
+    """
+    logger.debug("Attempting to aggregate data for: %s", coin_identifier)
+    if parallel:
+        return _get_aggregated_coin_data_parallel(coin_identifier)
+
+    # Try to get market data using the identifier as a symbol
+    potential_symbol = coin_identifier.upper() # Assume it could be a symbol
+    with stage("cmc_fetch"):
+        market_data = get_coin_data_cmc(coin_symbol=potential_symbol)
+
+    coin_name_for_news = _news_name_from_market_data(coin_identifier, market_data, potential_symbol)
+
+    # Get news (local store first, then Newsdata.io) using the determined/original coin name
+    with stage("news_fetch"):
+        fetched_news = get_coin_news(coin_name=coin_name_for_news, size=3) # Fetch 3 news articles for brevity
+
+    return _assemble_aggregated_data(coin_identifier, coin_name_for_news, market_data, fetched_news)
+
+def _get_aggregated_coin_data_parallel(coin_identifier):
+    potential_symbol = coin_identifier.upper()
+    coin_name_for_news = resolve_news_name_locally(coin_identifier)
+    logger.debug("Fetching market data for '%s' and news for '%s' in parallel...", potential_symbol, coin_name_for_news)
+
+    started_at = time.monotonic()
+    market_future = _submit_timed("cmc_fetch", get_coin_data_cmc, coin_symbol=potential_symbol)
+    news_future = _submit_timed("news_fetch", get_coin_news, coin_name=coin_name_for_news, size=3)
+
+    # Both deadlines count from the moment the fetches started
+    market_data = _result_within(market_future, started_at + MARKET_DATA_DEADLINE_SECONDS, "Market data")
+    fetched_news = _result_within(news_future, started_at + NEWS_DEADLINE_SECONDS, "News")
+
+    return _assemble_aggregated_data(coin_identifier, coin_name_for_news, market_data, fetched_news)
+
+def _submit_timed(stage_name, fn, **kwargs):
+    """Runs fn on the fetch pool as a timed stage of the calling request (its context is carried over)."""
+    def timed():
+        with stage(stage_name):
+            return fn(**kwargs)
+    return _fetch_pool.submit(contextvars.copy_context().run, timed)
+
+def _result_within(future, deadline, source_name):
+    """Returns the future's result, or None if it isn't ready by the monotonic deadline."""
+    try:
+        return future.result(timeout=max(0, deadline - time.monotonic()))
+    except FutureTimeoutError:
+        logger.warning("%s fetch missed its deadline; continuing with partial data.", source_name)
+        return None
+
+async def get_aggregated_coin_data_async(coin_identifier, parallel=AGGREGATOR_PARALLEL):
+    """Async version of get_aggregated_coin_data, built on the async CMC and Newsdata.io clients."""
+    logger.debug("Attempting to aggregate data for: %s", coin_identifier)
+    if parallel:
+        return await _get_aggregated_coin_data_parallel_async(coin_identifier)
+
+    potential_symbol = coin_identifier.upper()
+    with stage("cmc_fetch"):
+        market_data = await get_coin_data_cmc_async(coin_symbol=potential_symbol)
+
+    coin_name_for_news = _news_name_from_market_data(coin_identifier, market_data, potential_symbol)
+
+    with stage("news_fetch"):
+        fetched_news = await get_coin_news_async(coin_name=coin_name_for_news, size=3)
+
+    return _assemble_aggregated_data(coin_identifier, coin_name_for_news, market_data, fetched_news)
+
+async def _get_aggregated_coin_data_parallel_async(coin_identifier):
+    potential_symbol = coin_identifier.upper()
+    coin_name_for_news = resolve_news_name_locally(coin_identifier)
+    logger.debug("Fetching market data for '%s' and news for '%s' in parallel...", potential_symbol, coin_name_for_news)
+
+    market_data, fetched_news = await asyncio.gather(
+        _await_within(get_coin_data_cmc_async(coin_symbol=potential_symbol), MARKET_DATA_DEADLINE_SECONDS, "Market data", "cmc_fetch"),
+        _await_within(get_coin_news_async(coin_name=coin_name_for_news, size=3), NEWS_DEADLINE_SECONDS, "News", "news_fetch"),
+    )
+
+    return _assemble_aggregated_data(coin_identifier, coin_name_for_news, market_data, fetched_news)
+
+# Fetches that missed their deadline but are still running (the loop keeps only weak references)
+_late_fetches = set()
+
+def _forget_late_fetch(task):
+    _late_fetches.discard(task)
+    if not task.cancelled():
+        task.exception() # retrieved: already logged by the fetch itself
+
+async def _await_within(coro, timeout, source_name, stage_name):
+    """
+    Awaits coro as a timed stage, degrading to None if it takes longer than timeout seconds.
+    The fetch itself isn't cancelled: it finishes in the background, so its result still fills the
+    caches and the circuit breaker sees how the upstream call really ended (the deadlines are shorter
+    than the providers' timeouts and retries).
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        with stage(stage_name):
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+    except asyncio.TimeoutError:
+        _late_fetches.add(task)
+        task.add_done_callback(_forget_late_fetch)
+        logger.warning("%s fetch missed its deadline; continuing with partial data.", source_name)
+        return None
@@ -0,0 +1,230 @@
+# alerts.py
+import asyncio
+import itertools
+import json
+import logging
+import math
+import os
+import threading
+
+import numpy as np
+
+from config import ALERT_POLL_SECONDS, ALERTS_MAX_PER_CHAT, ALERTS_PATH
+from services.market_data import get_coins_data_cmc_async
+
+logger = logging.getLogger(__name__)
+
+# --- Price watch / alert subscriptions evaluated by one shared poller ---
+
+WATCH = 0 # notify on a move of at least `threshold` percent from the reference price (repeats)
+ABOVE = 1 # notify once when price >= threshold
+BELOW = 2 # notify once when price <= threshold
+
+class Subscription:
+    __slots__ = ('id', 'chat_id', 'symbol', 'kind', 'threshold', 'ref_price')
+
+    def __init__(self, sub_id, chat_id, symbol, kind, threshold):
+        self.id = sub_id
+        self.chat_id = chat_id
+        self.symbol = symbol
+        self.kind = kind
+        self.threshold = threshold
+        self.ref_price = float('nan') # WATCH only: set from the first price seen
+
+    def describe(self):
+        if self.kind == WATCH:
+            return f"watch {self.symbol} ±{self.threshold:g}%"
+        return f"alert {self.symbol} {'>' if self.kind == ABOVE else '<'} {self.threshold:g}"
+
+class _Arrays:
+    """Column view of all subscriptions, rebuilt only when subscriptions change."""
+    def __init__(self, subs):
+        self.subs = subs
+        self.symbols = sorted({s.symbol for s in subs})
+        position = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.symbol_idx = np.fromiter((position[s.symbol] for s in subs), dtype=np.int32, count=len(subs))
+        self.kind = np.fromiter((s.kind for s in subs), dtype=np.int8, count=len(subs))
+        self.threshold = np.fromiter((s.threshold for s in subs), dtype=np.float64, count=len(subs))
+        self.ref = np.fromiter((s.ref_price for s in subs), dtype=np.float64, count=len(subs))
+
+class AlertBook:
+    """
+    All subscriptions of all chats. evaluate() checks every subscription against a tick of
+    prices in one vectorized pass over NumPy columns.
+
+    With a `path`, save() writes the subscriptions to a JSON file and load() reads them back,
+    so they survive restarts; the caller saves after every change (see bot.py and AlertPoller).
+    """
+    def __init__(self, max_per_chat=ALERTS_MAX_PER_CHAT, path=ALERTS_PATH):
+        self.max_per_chat = max_per_chat
+        self.path = path
+        self._subs = {} # id -> Subscription
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock() # one writer of the file at a time
+        self._arrays = None
+
+    def _add(self, chat_id, symbol, kind, threshold):
+        with self._lock:
+            if sum(1 for s in self._subs.values() if s.chat_id == chat_id) >= self.max_per_chat:
+                return None
+            sub = Subscription(next(self._ids), chat_id, symbol.upper(), kind, float(threshold))
+            self._subs[sub.id] = sub
+            self._arrays = None
+            return sub
+
+    def add_watch(self, chat_id, symbol, percent):
+        """Subscribes chat to moves of `percent`% in symbol. Returns the Subscription, or None if the chat is at its limit."""
+        return self._add(chat_id, symbol, WATCH, percent)
+
+    def add_alert(self, chat_id, symbol, direction, price):
+        """Subscribes chat to a one-shot alert when symbol goes above ('>') or below ('<') price."""
+        return self._add(chat_id, symbol, ABOVE if direction == '>' else BELOW, price)
+
+    def remove(self, chat_id, symbol=None):
+        """Removes the chat's subscriptions (only for symbol, if given). Returns how many were removed."""
+        with self._lock:
+            doomed = [s.id for s in self._subs.values()
+                      if s.chat_id == chat_id and (symbol is None or s.symbol == symbol.upper())]
+            for sub_id in doomed:
+                del self._subs[sub_id]
+            if doomed:
+                self._arrays = None
+            return len(doomed)
+
+    def for_chat(self, chat_id):
+        return [s for s in self._subs.values() if s.chat_id == chat_id]
+
+    def symbols(self):
+        """Distinct watched symbols: what the poller needs to quote each tick."""
+        with self._lock:
+            return sorted({s.symbol for s in self._subs.values()})
+
+    def __len__(self):
+        return len(self._subs)
+
+    def save(self):
+        """Writes all subscriptions to `path` (atomically). Returns True on success."""
+        if not self.path:
+            return False
+        with self._lock:
+            rows = [[s.chat_id, s.symbol, s.kind, s.threshold, None if math.isnan(s.ref_price) else s.ref_price]
+                    for s in self._subs.values()]
+        with self._save_lock:
+            try:
+                temporary = self.path + ".tmp"
+                with open(temporary, "w", encoding="utf-8") as f:
+                    json.dump({'subscriptions': rows}, f)
+                os.replace(temporary, self.path)
+                return True
+            except (OSError, TypeError, ValueError) as e:
+                logger.warning("Could not save alerts to '%s': %s", self.path, e)
+                return False
+
+    def load(self):
+        """Adds the subscriptions saved in `path`, if there are any. Returns how many were loaded."""
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                rows = json.load(f)['subscriptions']
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Could not load alerts from '%s': %s", self.path, e)
+            return 0
+        with self._lock:
+            for chat_id, symbol, kind, threshold, ref_price in rows:
+                sub = Subscription(next(self._ids), chat_id, symbol, kind, threshold)
+                if ref_price is not None:
+                    sub.ref_price = float(ref_price)
+                self._subs[sub.id] = sub
+            self._arrays = None
+        return len(rows)
+
+    def evaluate(self, prices):
+        """
+        Checks every subscription against `prices` (SYMBOL -> USD price).
+        :return: List of (subscription, price, reference price) for each triggered subscription.
+                 One-shot alerts that fired are removed; watches re-anchor on the new price.
+        """
+        with self._lock:
+            if self._arrays is None:
+                self._arrays = _Arrays(list(self._subs.values()))
+            arrays = self._arrays
+            if not arrays.subs:
+                return []
+
+            tick = np.array([prices.get(symbol, np.nan) for symbol in arrays.symbols], dtype=np.float64)
+            price = tick[arrays.symbol_idx]
+            known = ~np.isnan(price)
+            watch = (arrays.kind == WATCH) & known
+
+            # First price seen for a watch becomes its reference; it can't trigger yet
+            anchor = watch & np.isnan(arrays.ref)
+            arrays.ref[anchor] = price[anchor]
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                move_pct = np.abs(price / arrays.ref - 1.0) * 100.0
+            moved = watch & ~anchor & (move_pct >= arrays.threshold)
+            above = (arrays.kind == ABOVE) & known & (price >= arrays.threshold)
+            below = (arrays.kind == BELOW) & known & (price <= arrays.threshold)
+            fired = np.flatnonzero(moved | above | below)
+
+            triggered = []
+            for i in fired:
+                sub = arrays.subs[i]
+                triggered.append((sub, float(price[i]), float(arrays.ref[i])))
+                if sub.kind == WATCH:
+                    arrays.ref[i] = price[i]
+                else:
+                    self._subs.pop(sub.id, None)
+                    self._arrays = None
+            for i in np.flatnonzero(anchor | moved):
+                arrays.subs[i].ref_price = float(arrays.ref[i])
+            return triggered
+
+def format_notification(sub, price, ref_price):
+    if sub.kind == WATCH:
+        change = (price / ref_price - 1.0) * 100.0
+        return f"{sub.symbol} moved {change:+.2f}% to ${price:,.4f} (from ${ref_price:,.4f})."
+    sign = '>=' if sub.kind == ABOVE else '<='
+    return f"Alert: {sub.symbol} is ${price:,.4f} ({sign} {sub.threshold:g}). This alert is now removed."
+
+class AlertPoller:
+    """
+    One poller for all chats: each tick quotes every watched symbol in a single batched
+    CMC request and pushes notifications through `notify(chat_id, text)`.
+    Upstream load grows with the number of distinct symbols, not subscribers.
+    """
+    def __init__(self, book, notify, interval=ALERT_POLL_SECONDS):
+        self.book = book
+        self.notify = notify
+        self.interval = interval
+
+    async def tick(self):
+        symbols = self.book.symbols()
+        if not symbols:
+            return 0
+        quotes = await get_coins_data_cmc_async(symbols)
+        prices = {symbol: q['price_usd'] for symbol, q in quotes.items() if isinstance(q.get('price_usd'), (int, float))}
+        triggered = self.book.evaluate(prices)
+        if triggered:
+            # Fired alerts are gone and fired watches have new reference prices
+            await asyncio.to_thread(self.book.save)
+        for sub, price, ref_price in triggered:
+            try:
+                await self.notify(sub.chat_id, format_notification(sub, price, ref_price))
+            except Exception as e:
+                logger.warning("Could not deliver alert to chat %s: %s", sub.chat_id, e)
+        return len(triggered)
+
+    async def run_forever_async(self):
+        while True:
+            try:
+                await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Alert poll failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+alert_book = AlertBook()
@@ -0,0 +1,120 @@
+# answer_cache.py
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+from config import ANSWER_CACHE_TTL_SECONDS, ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_DB_PATH
+from services.cache import TTLCache
+from services.cache_backend import shared_backend
+from services.metrics import register_cache
+
+logger = logging.getLogger(__name__)
+
+# --- Cache of Gemini answers keyed on normalized query + coin + data fingerprint ---
+
+_NON_WORD = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+
+def normalize_query(query):
+    """Lowercases, drops punctuation and collapses whitespace: 'BTC price?' -> 'btc price'."""
+    return _SPACES.sub(" ", _NON_WORD.sub(" ", (query or "").lower())).strip()
+
+def fingerprint_payload(payload):
+    """Stable short hash of the data that goes into a prompt."""
+    encoded = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:32]
+
+def make_answer_key(kind, query, coin, payload):
+    """
+    :param kind: Which prompt produced the answer ('assistant', 'news', ...).
+    :param query: The user's question (normalized here); None for prompts that don't include one.
+    :param coin: The coin the answer is about.
+    :param payload: The market/news data the prompt was built from.
+    """
+    return "|".join([kind, normalize_query(query), (coin or "").lower(), fingerprint_payload(payload)])
+
+class AnswerCache:
+    """
+    An in-memory TTL/LRU cache of generated answers, optionally backed by SQLite
+    so answers survive restarts. A SQLite hit is promoted into memory.
+    With a shared cache backend, answers are also shared between worker processes.
+    """
+    def __init__(self, ttl=ANSWER_CACHE_TTL_SECONDS, max_entries=ANSWER_CACHE_MAX_ENTRIES, db_path=ANSWER_CACHE_DB_PATH,
+                 backend=shared_backend):
+        self.ttl = ttl
+        self.memory = TTLCache(ttl=ttl, max_entries=max_entries, backend=backend, namespace="answer:")
+        self._db = None
+        self._db_lock = threading.Lock()
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path):
+        try:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, answer TEXT NOT NULL, created_at REAL NOT NULL)")
+            self._db.execute("DELETE FROM answers WHERE created_at < ?", (time.time() - self.ttl,))
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning("Could not open answer cache database '%s', using memory only: %s", db_path, e)
+            self._db = None
+
+    def get(self, key):
+        """Returns the cached answer for key, or None."""
+        answer = self.memory.get(key)
+        if answer is not None or self._db is None:
+            return answer
+        return self._db_get(key)
+
+    async def get_async(self, key):
+        """Async version of get; the shared backend and SQLite are read from a worker thread."""
+        answer = await self.memory.get_async(key)
+        if answer is not None or self._db is None:
+            return answer
+        return await asyncio.to_thread(self._db_get, key)
+
+    def _db_get(self, key):
+        with self._db_lock:
+            try:
+                row = self._db.execute("SELECT answer, created_at FROM answers WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as e:
+                logger.warning("Answer cache read failed: %s", e)
+                return None
+        if row is None:
+            return None
+        answer, created_at = row
+        remaining = created_at + self.ttl - time.time()
+        if remaining <= 0:
+            return None
+        self.memory.set(key, answer, ttl=remaining)
+        return answer
+
+    def put(self, key, answer):
+        self.memory.set(key, answer)
+        if self._db is not None:
+            self._db_put(key, answer)
+
+    async def put_async(self, key, answer):
+        """Async version of put."""
+        await self.memory.set_async(key, answer)
+        if self._db is not None:
+            await asyncio.to_thread(self._db_put, key, answer)
+
+    def _db_put(self, key, answer):
+        with self._db_lock:
+            try:
+                self._db.execute("INSERT OR REPLACE INTO answers (key, answer, created_at) VALUES (?, ?, ?)",
+                                 (key, answer, time.time()))
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning("Answer cache write failed: %s", e)
+
+    def stats(self):
+        return self.memory.stats()
+
+answer_cache = AnswerCache()
+register_cache("answer", answer_cache.stats)
@@ -0,0 +1,249 @@
+# cache.py
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+# --- In-process TTL/LRU cache with single-flight loading ---
+
+_MISSING = object()
+
+class _InflightCall:
+    """A synchronous load in progress; followers wait on the event and read the value."""
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+class TTLCache:
+    """
+    A thread-safe LRU cache whose entries expire after `ttl` seconds.
+
+    get_or_load / get_or_load_async coalesce concurrent misses for the same key,
+    so only one caller runs the loader while the others wait for its result.
+    Loader results of None are returned but not cached (treated as a failed lookup).
+
+    With a `backend` (see services/cache_backend.py) the cache is the first level in front of a
+    shared second level: local misses are looked up there under `namespace` + key before loading,
+    and every set() is written through, so other processes don't load the same value again.
+    """
+    def __init__(self, ttl, max_entries=1024, backend=None, namespace=""):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.backend = backend
+        self.namespace = namespace
+        self._data = OrderedDict() # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._inflight = {} # key -> _InflightCall
+        self._inflight_async = {} # key -> asyncio.Task
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.remote_hits = 0
+
+    def _lookup(self, key):
+        """Returns the live value for key or _MISSING. Caller must hold the lock."""
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def get(self, key, default=None):
+        """Returns the cached value for key, or default if it's missing or expired."""
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+        value = self._remote_get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    async def get_async(self, key, default=None):
+        """Async version of get: local hits are returned directly, the shared backend is asked from a worker thread."""
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+        value = await self._remote_get_async(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    async def _remote_get_async(self, key):
+        # The backend does blocking socket I/O; keep it off the event loop
+        if self.backend is None:
+            return None
+        return await asyncio.to_thread(self._remote_get, key)
+
+    def _remote_get(self, key):
+        """Looks key up in the shared backend and keeps a local copy on a hit; None if absent."""
+        if self.backend is None:
+            return None
+        # Stored as [wall-clock expiry, value] so a copy never outlives the original
+        entry = self.backend.get(self.namespace + key)
+        if not entry:
+            return None
+        expires_at, value = entry
+        remaining = expires_at - time.time()
+        if remaining <= 0 or value is None:
+            return None
+        self._set_local(key, value, remaining)
+        with self._lock:
+            self.remote_hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        """Stores value under key (and in the shared backend, if any), evicting the least recently used entries if full."""
+        ttl = self.ttl if ttl is None else ttl
+        self._set_local(key, value, ttl)
+        if self.backend is not None:
+            self.backend.set(self.namespace + key, [time.time() + ttl, value], ttl)
+
+    async def set_async(self, key, value, ttl=None):
+        """Async version of set; the write-through to the shared backend runs in a worker thread."""
+        ttl = self.ttl if ttl is None else ttl
+        self._set_local(key, value, ttl)
+        if self.backend is not None:
+            await asyncio.to_thread(self.backend.set, self.namespace + key, [time.time() + ttl, value], ttl)
+
+    def _set_local(self, key, value, ttl):
+        expires_at = time.monotonic() + ttl
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+        if self.backend is not None:
+            self.backend.delete(self.namespace + key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get_or_load(self, key, loader):
+        """
+        Returns the cached value for key, calling loader() on a miss.
+        Concurrent callers missing on the same key share a single loader() call.
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+            call = self._inflight.get(key)
+            if call is None:
+                call = _InflightCall()
+                self._inflight[key] = call
+                is_leader = True
+                self.misses += 1
+            else:
+                is_leader = False
+                self.coalesced += 1
+
+        if not is_leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = self._remote_get(key)
+            if call.value is not None:
+                return call.value
+            call.value = loader()
+            if call.value is not None:
+                self.set(key, call.value)
+            return call.value
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.event.set()
+
+    async def get_or_load_async(self, key, loader):
+        """
+        Async counterpart of get_or_load: loader is a zero-argument coroutine function.
+        Concurrent misses on the same key await one shared task.
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+            task = self._inflight_async.get(key)
+            if task is None:
+                self.misses += 1
+                task = asyncio.ensure_future(self._load_async(key, loader))
+                self._inflight_async[key] = task
+            else:
+                self.coalesced += 1
+        # shield() so one cancelled caller doesn't cancel the load for everyone else
+        return await asyncio.shield(task)
+
+    async def _load_async(self, key, loader):
+        try:
+            value = await self._remote_get_async(key)
+            if value is not None:
+                return value
+            value = await loader()
+            if value is not None:
+                await self.set_async(key, value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight_async.pop(key, None)
+
+    def export(self):
+        """Live entries as [key, value, wall-clock expiry] lists, for saving across restarts (services/snapshot.py)."""
+        offset = time.time() - time.monotonic()
+        with self._lock:
+            now = time.monotonic()
+            return [[key, value, expires_at + offset] for key, (expires_at, value) in self._data.items() if expires_at > now]
+
+    def restore(self, entries):
+        """Adds exported entries that haven't expired yet (locally only). Returns how many were added."""
+        restored = 0
+        for key, value, expires_at in entries:
+            remaining = expires_at - time.time()
+            if remaining > 0 and value is not None:
+                self._set_local(key, value, remaining)
+                restored += 1
+        return restored
+
+    def stats(self):
+        """Returns hit/miss counters and the current size."""
+        total = self.hits + self.misses + self.coalesced
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self.evictions,
+            'remote_hits': self.remote_hits,
+            'size': len(self._data),
+            'hit_ratio': (self.hits / total) if total else 0.0,
+        }
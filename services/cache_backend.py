@@ -0,0 +1,176 @@
+# cache_backend.py
+import abc
+import json
+import logging
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+from config import CACHE_BACKEND_URL, CACHE_BACKEND_TIMEOUT_SECONDS, CACHE_BACKEND_RETRY_SECONDS
+from services.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# --- Shared cache backends: what replicas and worker processes use to share quotes, listings, news and answers ---
+# The in-process TTLCaches stay in front as the first level; a backend is the shared second level.
+# Values are anything json.dumps can encode. Backends never raise: a failing backend is just a miss.
+
+class CacheBackend(abc.ABC):
+    """
+    Interface: get(key) -> value or None, set(key, value, ttl seconds), delete(key).
+    Calls may block on the network: async code calls them through asyncio.to_thread.
+    """
+    @abc.abstractmethod
+    def get(self, key):
+        pass
+
+    @abc.abstractmethod
+    def set(self, key, value, ttl):
+        pass
+
+    @abc.abstractmethod
+    def delete(self, key):
+        pass
+
+class MemoryBackend(CacheBackend):
+    """Process-local backend; lets several caches in one process share entries (e.g. in tests)."""
+    def __init__(self, max_entries=100000):
+        self._cache = TTLCache(ttl=60, max_entries=max_entries)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value, ttl):
+        self._cache.set(key, value, ttl=ttl)
+
+    def delete(self, key):
+        self._cache.delete(key)
+
+class RedisError(Exception):
+    """An error reply from the server."""
+
+class RedisBackend(CacheBackend):
+    """
+    Minimal client for the Redis protocol (RESP): GET, SET with PX, DEL over one socket.
+    Works with Redis, Valkey, KeyDB and the like. Calls are short and synchronous; after a
+    connection failure the backend reports misses for `retry_after` seconds instead of reconnecting per call.
+    """
+    def __init__(self, host="127.0.0.1", port=6379, db=0, password=None, prefix="crypto:",
+                 timeout=CACHE_BACKEND_TIMEOUT_SECONDS, retry_after=CACHE_BACKEND_RETRY_SECONDS):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.prefix = prefix
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._sock = None
+        self._reader = None
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+
+    # --- RESP ---
+
+    @staticmethod
+    def _encode(*args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("connection closed by the cache server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode("utf-8")
+        if kind == b"-":
+            raise RedisError(payload.decode("utf-8", "replace"))
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(payload)
+            return None if length < 0 else [self._read_reply() for _ in range(length)]
+        raise ConnectionError(f"unexpected reply from the cache server: {line[:20]!r}")
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._sock.makefile("rb")
+        if self.password:
+            self._call("AUTH", self.password)
+        if self.db:
+            self._call("SELECT", self.db)
+
+    def _call(self, *args):
+        self._sock.sendall(self._encode(*args))
+        return self._read_reply()
+
+    def _close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = self._reader = None
+
+    def command(self, *args):
+        """Runs one command and returns its reply; None if the server is unreachable."""
+        with self._lock:
+            if time.monotonic() < self._down_until:
+                return None
+            try:
+                if self._sock is None:
+                    self._connect()
+                return self._call(*args)
+            except (OSError, ConnectionError) as e:
+                self._close()
+                self._down_until = time.monotonic() + self.retry_after
+                logger.warning("Cache backend %s:%s unreachable, retrying in %.0fs: %s", self.host, self.port, self.retry_after, e)
+            except RedisError as e:
+                logger.warning("Cache backend error for %s: %s", args[0], e)
+            return None
+
+    # --- CacheBackend ---
+
+    def get(self, key):
+        raw = self.command("GET", self.prefix + key)
+        if raw is None:
+            return None
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+    def set(self, key, value, ttl):
+        self.command("SET", self.prefix + key, json.dumps(value, separators=(",", ":"), default=str),
+                     "PX", max(1, int(ttl * 1000)))
+
+    def delete(self, key):
+        self.command("DEL", self.prefix + key)
+
+def create_backend(url):
+    """
+    Builds a backend from a URL: "" -> None (each process keeps its own caches),
+    "memory://" -> MemoryBackend, "redis://[:password@]host[:port][/db]" -> RedisBackend.
+    """
+    if not url:
+        return None
+    parsed = urlparse(url)
+    if parsed.scheme == "memory":
+        return MemoryBackend()
+    if parsed.scheme == "redis":
+        db = int(parsed.path.lstrip("/") or 0)
+        return RedisBackend(parsed.hostname or "127.0.0.1", parsed.port or 6379, db=db, password=parsed.password)
+    raise ValueError(f"Unsupported CACHE_BACKEND_URL scheme: {parsed.scheme!r}")
+
+shared_backend = create_backend(CACHE_BACKEND_URL)
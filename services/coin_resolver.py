@@ -0,0 +1,197 @@
+# coin_resolver.py
+import re
+
+from config import RESOLVER_MAX_RANK, RESOLVER_LOWERCASE_SYMBOL_MAX_RANK, RESOLVER_FUZZY_MAX_RANK
+from services.market_data import get_coin_map_cmc, get_coin_map_cmc_async
+
+# --- Coin resolution index: free-text query / term -> CMC coin ---
+
+# Seed coins so resolution works before (or without) the CMC map
+DEFAULT_COINS = [
+    ("BTC", "Bitcoin"), ("ETH", "Ethereum"), ("SOL", "Solana"), ("XRP", "Ripple"),
+    ("ADA", "Cardano"), ("DOGE", "Dogecoin"), ("SHIB", "Shiba Inu"), ("BNB", "Binance Coin"),
+    ("AVAX", "Avalanche"), ("DOT", "Polkadot"), ("TRX", "Tron"), ("LINK", "Chainlink"),
+    ("MATIC", "Polygon"), ("LTC", "Litecoin"), ("UNI", "Uniswap"), ("XLM", "Stellar"),
+    ("APT", "Aptos"), ("ARB", "Arbitrum"), ("ICP", "Internet Computer"), ("VET", "VeChain"),
+    ("TON", "Toncoin"),
+]
+
+# Extra spellings that aren't a coin's symbol, name or slug
+DEFAULT_ALIASES = {
+    "bitecoin": "BTC", "bitcion": "BTC", "bitcoinn": "BTC",
+    "ripple": "XRP", "binance coin": "BNB", "polygon": "MATIC", "ton": "TON",
+}
+
+# Words that never name a coin on their own, even though some tiny coins use them as symbols/names
+STOPWORDS = frozenset([
+    'of', 'the', 'for', 'and', 'about', 'price', 'news', 'market', 'cap', 'tell', 'me', 'what', "what's",
+    'whats', 'is', 'latest', 'current', 'a', 'an', 'in', 'on', 'to', 'it', 'i', 'you', 'how', 'much',
+    'today', 'now', 'coin', 'token', 'crypto', 'show', 'give', 'get', 'please', 'vs', 'or', 'with', 'by',
+    'new', 'top', 'why', 'will', 'can', 'do', 'does', 'my', 'this', 'that', 'week', 'day', 'up', 'down',
+])
+
+_TOKEN = re.compile(r"[\w$']+")
+_END = object() # marks a complete phrase in the trie
+
+def _deletes(term):
+    """All strings obtained by deleting one character (SymSpell edit distance 1)."""
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+class _Index:
+    """Immutable lookup tables; CoinResolver swaps in a whole new one on rebuild."""
+    def __init__(self, coins, aliases):
+        self.by_symbol = {} # SYMBOL -> coin
+        self.by_term = {} # lowercased name / slug / alias -> coin
+        self.phrases = {} # token trie for multi-word names and aliases
+        self.fuzzy = {} # delete-variant -> list of terms (for typo matching)
+
+        # coins are in rank order, so setdefault keeps the best-ranked coin on collisions
+        for coin in coins:
+            if coin.get('symbol'):
+                self.by_symbol.setdefault(coin['symbol'].upper(), coin)
+            for term in (coin.get('name'), coin.get('slug')):
+                if term:
+                    self._add_term(term.lower(), coin)
+        for alias, symbol in aliases.items():
+            coin = self.by_symbol.get(symbol.upper())
+            if coin:
+                self._add_term(alias.lower(), coin)
+
+        for term, coin in self.by_term.items():
+            if ' ' not in term and len(term) >= 5 and _rank(coin) <= RESOLVER_FUZZY_MAX_RANK:
+                for variant in _deletes(term) | {term}:
+                    self.fuzzy.setdefault(variant, []).append(term)
+
+    def _add_term(self, term, coin):
+        if term in self.by_term:
+            return
+        self.by_term[term] = coin
+        words = term.split()
+        if len(words) > 1:
+            node = self.phrases
+            for word in words:
+                node = node.setdefault(word, {})
+            node.setdefault(_END, coin)
+
+def _rank(coin):
+    return coin.get('rank') or float('inf')
+
+class CoinResolver:
+    """
+    Resolves coin symbols, names, slugs and aliases with O(1) hash lookups, finds
+    multi-word names in free text with a token-trie scan, and falls back to
+    bounded (one-edit) fuzzy matching for typos.
+    """
+    def __init__(self, coins=None, aliases=DEFAULT_ALIASES):
+        self.aliases = aliases
+        self.coins = None # the coin list of the last rebuild (None while only the seed coins are known)
+        self._index = _Index(coins or _default_coins(), aliases)
+
+    def __len__(self):
+        return len(self._index.by_symbol)
+
+    def rebuild(self, coins):
+        """Rebuilds the index from a CMC coin list (best rank first) and swaps it in atomically."""
+        coins = sorted(coins, key=_rank)
+        self._index = _Index(coins, self.aliases)
+        self.coins = coins
+
+    def load(self):
+        """Builds the index from the full CMC coin map. Returns True on success."""
+        coins = get_coin_map_cmc()
+        if coins:
+            self.rebuild(coins)
+            return True
+        return False
+
+    async def load_async(self):
+        """Async version of load."""
+        coins = await get_coin_map_cmc_async()
+        if coins:
+            self.rebuild(coins)
+            return True
+        return False
+
+    def lookup(self, term):
+        """Exact lookup of a single term (symbol, name, slug or alias); returns the coin dict or None."""
+        if not term:
+            return None
+        index = self._index
+        term = term.strip()
+        return index.by_symbol.get(term.upper()) or index.by_term.get(term.lower())
+
+    def resolve(self, query):
+        """
+        Finds the coin a free-text query is about, or None.
+        Preference: multi-word names, then symbols written in capitals, then names/aliases,
+        then lowercase symbols of well-ranked coins, then one-edit typos of names. Stopwords and
+        single letters never match on their own, only coins ranked within RESOLVER_MAX_RANK are
+        picked out of free text (use lookup() for an exact term), and on a tie the best-ranked coin wins.
+        """
+        index = self._index # one consistent snapshot for the whole scan
+        raw_tokens = _TOKEN.findall(query or "")
+        tokens = [t.lower().strip("'$") for t in raw_tokens]
+        best = None # (priority, rank, position, coin)
+
+        for i, token in enumerate(tokens):
+            if not token:
+                continue
+            phrase_coin = self._match_phrase(index, tokens, i)
+            if phrase_coin:
+                candidate = (0, _rank(phrase_coin), i, phrase_coin)
+            elif token in STOPWORDS or len(token) < 2:
+                continue
+            else:
+                match = self._match_token(index, raw_tokens[i], token)
+                if not match:
+                    continue
+                priority, coin = match
+                candidate = (priority, _rank(coin), i, coin)
+            if best is None or candidate[:3] < best[:3]:
+                best = candidate
+        return best[3] if best else None
+
+    def _match_token(self, index, raw_token, token):
+        """(priority, coin) for a single word of a query, or None."""
+        symbol_coin = index.by_symbol.get(token.upper())
+        if raw_token.isupper() and symbol_coin and _rank(symbol_coin) <= RESOLVER_MAX_RANK:
+            return 1, symbol_coin
+        term_coin = index.by_term.get(token)
+        if term_coin and _rank(term_coin) <= RESOLVER_MAX_RANK:
+            return 2, term_coin
+        if symbol_coin and _rank(symbol_coin) <= RESOLVER_LOWERCASE_SYMBOL_MAX_RANK:
+            return 3, symbol_coin
+        fuzzy_coin = self._match_fuzzy(index, token)
+        if fuzzy_coin:
+            return 4, fuzzy_coin
+        return None
+
+    @staticmethod
+    def _match_phrase(index, tokens, start):
+        """Longest multi-word name starting at tokens[start], walking the token trie."""
+        node = index.phrases
+        found = None
+        for token in tokens[start:]:
+            node = node.get(token)
+            if node is None:
+                break
+            found = node.get(_END, found)
+        return found
+
+    @staticmethod
+    def _match_fuzzy(index, token):
+        if len(token) < 5:
+            return None
+        terms = set()
+        for variant in _deletes(token) | {token}:
+            terms.update(index.fuzzy.get(variant, ()))
+        if not terms:
+            return None
+        return min((index.by_term[t] for t in terms), key=_rank)
+
+def _default_coins():
+    return [{'id': None, 'name': name, 'symbol': symbol, 'slug': name.lower().replace(' ', '-'), 'rank': rank}
+            for rank, (symbol, name) in enumerate(DEFAULT_COINS, start=1)]
+
+# Shared by main.py and bot.py; call coin_resolver.load() / load_async() at startup
+coin_resolver = CoinResolver()
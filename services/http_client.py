@@ -0,0 +1,290 @@
+# http_client.py
+import asyncio
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import (HTTP_POOL_SIZE, HTTP_MAX_RETRIES, HTTP_BACKOFF_BASE_SECONDS, HTTP_BACKOFF_MAX_SECONDS,
+                    CMC_CONNECT_TIMEOUT_SECONDS, CMC_READ_TIMEOUT_SECONDS,
+                    NEWSDATA_CONNECT_TIMEOUT_SECONDS, NEWSDATA_READ_TIMEOUT_SECONDS,
+                    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS, PROVIDER_WAIT_SECONDS)
+from services.admission import provider_limits
+from services.metrics import upstream_errors
+
+logger = logging.getLogger(__name__)
+
+# --- Shared upstream HTTP client: pooling, timeouts, retries, circuit breaking ---
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# (connect, read) timeouts in seconds per upstream provider
+PROVIDER_TIMEOUTS = {
+    'cmc': (CMC_CONNECT_TIMEOUT_SECONDS, CMC_READ_TIMEOUT_SECONDS),
+    'newsdata': (NEWSDATA_CONNECT_TIMEOUT_SECONDS, NEWSDATA_READ_TIMEOUT_SECONDS),
+}
+
+class CircuitOpenError(requests.exceptions.RequestException, aiohttp.ClientError):
+    """
+    Raised instead of calling a provider whose circuit is open.
+    Subclasses both requests' and aiohttp's base errors so existing handlers catch it.
+    """
+
+class RateLimitedError(requests.exceptions.RequestException, aiohttp.ClientError):
+    """Raised when a provider's shared rate limit has no room for another call within PROVIDER_WAIT_SECONDS."""
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failed calls, fails fast for
+    `reset_timeout` seconds, then lets a single trial call through (half-open).
+    """
+    def __init__(self, name, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def before_call(self):
+        """Raises CircuitOpenError if the call should not go upstream."""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return
+            if state == 'half-open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+        raise CircuitOpenError(f"Circuit for '{self.name}' is open; skipping upstream call.")
+
+    def release_trial(self):
+        """Frees the half-open trial slot of a call that ended without an outcome (cancelled, unexpected error)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning("Circuit for '%s' opened after %s consecutive failures.", self.name, self.failures)
+                self.opened_at = time.monotonic()
+
+breakers = {name: CircuitBreaker(name) for name in PROVIDER_TIMEOUTS}
+
+def _breaker(provider):
+    if provider not in breakers:
+        breakers[provider] = CircuitBreaker(provider)
+    return breakers[provider]
+
+def _retry_after_seconds(value):
+    """Parses a Retry-After header (delta-seconds or HTTP-date); None if absent or unparseable."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _backoff_delay(attempt, retry_after=None):
+    """Seconds to wait before retry number `attempt` (0-based): Retry-After if given, else full-jitter backoff."""
+    if retry_after is not None:
+        return retry_after
+    return random.uniform(0, min(HTTP_BACKOFF_MAX_SECONDS, HTTP_BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+def _should_retry(attempt, retry_after):
+    # A server asking us to wait longer than our backoff cap gets no retry; we fail instead
+    return attempt < HTTP_MAX_RETRIES and (retry_after is None or retry_after <= HTTP_BACKOFF_MAX_SECONDS)
+
+def _error_reason(error):
+    """Short label for a failed upstream call, for the upstream error counter."""
+    if isinstance(error, RateLimitedError):
+        return 'rate_limited'
+    if isinstance(error, CircuitOpenError):
+        return 'circuit_open'
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None) or getattr(error, 'status', None)
+    if status:
+        return f'http_{status}'
+    if isinstance(error, (requests.exceptions.Timeout, asyncio.TimeoutError)):
+        return 'timeout'
+    if isinstance(error, (requests.exceptions.ConnectionError, aiohttp.ClientConnectionError)):
+        return 'connection'
+    return 'invalid_response'
+
+# --- Synchronous client (requests) ---
+
+_requests_session = None
+_requests_session_lock = threading.Lock()
+
+def get_requests_session():
+    """Returns the process-wide requests session with a keep-alive connection pool."""
+    global _requests_session
+    with _requests_session_lock:
+        if _requests_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=len(PROVIDER_TIMEOUTS), pool_maxsize=HTTP_POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _requests_session = session
+    return _requests_session
+
+def get_json(provider, url, params=None, headers=None, timeout=None):
+    """
+    GETs url and returns the decoded JSON body.
+    Retries 429/5xx and connection errors with jittered exponential backoff (honouring Retry-After)
+    and fails fast with CircuitOpenError while the provider's circuit is open.
+    :param provider: Key into PROVIDER_TIMEOUTS / the circuit breakers, e.g. 'cmc' or 'newsdata'.
+    :param timeout: Optional (connect, read) override for this endpoint.
+    :raises requests.exceptions.RequestException: On HTTP errors, exhausted retries, an open circuit
+                                                  or the provider's rate limit (RateLimitedError).
+    """
+    try:
+        return _get_json(provider, url, params, headers, timeout)
+    except Exception as e:
+        upstream_errors.inc(provider, _error_reason(e))
+        raise
+
+def _get_json(provider, url, params, headers, timeout):
+    breaker = _breaker(provider)
+    limit = provider_limits.get(provider)
+    if limit is not None and not limit.acquire():
+        raise RateLimitedError(f"Rate limit for '{provider}' reached; skipping upstream call.")
+    breaker.before_call()
+    try:
+        return _call_with_retries(breaker, url, params, headers, timeout or PROVIDER_TIMEOUTS.get(provider, (5, 15)))
+    except BaseException:
+        # HTTP and connection failures are recorded inside; anything else must not keep the half-open trial taken
+        breaker.release_trial()
+        raise
+
+def _call_with_retries(breaker, url, params, headers, timeout):
+    session = get_requests_session()
+
+    attempt = 0
+    while True:
+        try:
+            response = session.get(url, params=params, headers=headers, timeout=timeout)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if not _should_retry(attempt, None):
+                breaker.record_failure()
+                raise
+            time.sleep(_backoff_delay(attempt))
+            attempt += 1
+            continue
+
+        if response.status_code in RETRY_STATUSES:
+            retry_after = _retry_after_seconds(response.headers.get('Retry-After'))
+            if _should_retry(attempt, retry_after):
+                time.sleep(_backoff_delay(attempt, retry_after))
+                attempt += 1
+                continue
+            breaker.record_failure()
+            response.raise_for_status()
+
+        # Other 4xx mean the provider is up and rejected this request; don't trip the breaker
+        breaker.record_success()
+        response.raise_for_status()
+        return response.json()
+
+# --- Async client (aiohttp), used by the Telegram bot ---
+
+_session = None
+
+def get_session():
+    """
+    Returns the process-wide aiohttp session, creating it on first use.
+    Must be called from inside a running event loop.
+    """
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=HTTP_POOL_SIZE, keepalive_timeout=30)
+        _session = aiohttp.ClientSession(connector=connector)
+    return _session
+
+async def get_json_async(provider, url, params=None, headers=None, timeout=None, rate_limit_wait=PROVIDER_WAIT_SECONDS):
+    """
+    Async counterpart of get_json, on the shared aiohttp session.
+    :param rate_limit_wait: How long to wait for the provider's rate limit; None if the caller already took a token.
+    :raises aiohttp.ClientError, asyncio.TimeoutError: On HTTP errors, exhausted retries, an open circuit
+                                                       or the provider's rate limit (RateLimitedError).
+    """
+    try:
+        return await _get_json_async(provider, url, params, headers, timeout, rate_limit_wait)
+    except Exception as e:
+        upstream_errors.inc(provider, _error_reason(e))
+        raise
+
+async def _get_json_async(provider, url, params, headers, timeout, rate_limit_wait):
+    breaker = _breaker(provider)
+    limit = provider_limits.get(provider) if rate_limit_wait is not None else None
+    if limit is not None and not await limit.acquire_async(timeout=rate_limit_wait):
+        raise RateLimitedError(f"Rate limit for '{provider}' reached; skipping upstream call.")
+    breaker.before_call()
+    try:
+        return await _call_with_retries_async(breaker, url, params, headers, timeout or PROVIDER_TIMEOUTS.get(provider, (5, 15)))
+    except BaseException:
+        # Includes cancellation, e.g. a caller's deadline: the half-open trial must not stay taken
+        breaker.release_trial()
+        raise
+
+async def _call_with_retries_async(breaker, url, params, headers, timeout):
+    connect_timeout, read_timeout = timeout
+    client_timeout = aiohttp.ClientTimeout(connect=connect_timeout, sock_read=read_timeout)
+    session = get_session()
+
+    attempt = 0
+    while True:
+        try:
+            async with session.get(url, params=params, headers=headers, timeout=client_timeout) as response:
+                if response.status in RETRY_STATUSES:
+                    retry_after = _retry_after_seconds(response.headers.get('Retry-After'))
+                    if _should_retry(attempt, retry_after):
+                        delay = _backoff_delay(attempt, retry_after)
+                    else:
+                        breaker.record_failure()
+                        response.raise_for_status()
+                else:
+                    breaker.record_success()
+                    response.raise_for_status()
+                    return await response.json(content_type=None)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if not _should_retry(attempt, None):
+                breaker.record_failure()
+                raise
+            delay = _backoff_delay(attempt)
+
+        await asyncio.sleep(delay)
+        attempt += 1
+
+async def close_session():
+    """Closes the shared aiohttp session (call on bot shutdown)."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
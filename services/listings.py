@@ -0,0 +1,141 @@
+# listings.py
+import asyncio
+import logging
+import threading
+import time
+
+from config import LISTINGS_FETCH_LIMIT, LISTINGS_REFRESH_SECONDS
+from services.market_data import get_top_coins_cmc, get_top_coins_cmc_async
+from services.cache_backend import shared_backend
+
+logger = logging.getLogger(__name__)
+
+# --- Shared top-N listings snapshot, refreshed in the background ---
+
+def format_listing_line(position, coin):
+    price_val = coin.get('price_usd')
+    price_str = f"${price_val:.2f}" if isinstance(price_val, (int, float)) else str(price_val)
+    return f"{position}. {coin.get('name', 'N/A')} ({coin.get('symbol', 'N/A')}) - Price: {price_str}"
+
+class ListingsSnapshot:
+    """
+    One immutable /listings/latest result with its rendered text precomputed.
+    text(n) is a slice of the prerendered text, so top-N replies cost no formatting.
+    """
+    __slots__ = ('coins', 'fetched_at', '_text', '_line_ends')
+
+    def __init__(self, coins, fetched_at=None):
+        self.coins = tuple(coins)
+        self.fetched_at = fetched_at if fetched_at is not None else time.time()
+        lines = [format_listing_line(i + 1, coin) for i, coin in enumerate(self.coins)]
+        self._text = "\n".join(lines)
+        self._line_ends = []
+        end = -1
+        for line in lines:
+            end += len(line) + 1
+            self._line_ends.append(end)
+
+    def __len__(self):
+        return len(self.coins)
+
+    def top(self, n):
+        return self.coins[:n]
+
+    def text(self, n):
+        """Rendered 'N. Name (SYM) - Price: $x' lines for the top n coins ('' if empty)."""
+        if not self.coins or n <= 0:
+            return ""
+        return self._text[:self._line_ends[min(n, len(self.coins)) - 1]]
+
+EMPTY_SNAPSHOT = ListingsSnapshot([], fetched_at=0)
+
+class ListingsService:
+    """
+    Holds the current ListingsSnapshot. refresh() fetches a new one and swaps it in with a single
+    reference assignment, so readers always see a complete snapshot without locking.
+    With a shared cache backend, fetched listings are published there and other processes
+    adopt them instead of calling CMC themselves.
+    """
+    BACKEND_KEY = "listings"
+
+    def __init__(self, limit=LISTINGS_FETCH_LIMIT, interval=LISTINGS_REFRESH_SECONDS, backend=shared_backend):
+        self.limit = limit
+        self.interval = interval
+        self.backend = backend
+        self.snapshot = EMPTY_SNAPSHOT
+
+    def _swap(self, coins):
+        if coins:
+            self.snapshot = ListingsSnapshot(coins)
+            if self.backend is not None:
+                self.backend.set(self.BACKEND_KEY, {'fetched_at': self.snapshot.fetched_at, 'coins': list(coins)},
+                                 self.interval * 2)
+            return True
+        return False
+
+    def _adopt_shared(self):
+        """Uses a snapshot another process fetched less than half an interval ago. Returns True if there is one."""
+        if self.backend is None:
+            return False
+        shared = self.backend.get(self.BACKEND_KEY)
+        if not shared or time.time() - shared['fetched_at'] >= self.interval / 2:
+            return False
+        if shared['fetched_at'] > self.snapshot.fetched_at:
+            self.snapshot = ListingsSnapshot(shared['coins'], fetched_at=shared['fetched_at'])
+        return True
+
+    def restore(self, coins, fetched_at):
+        """Serves listings saved by an earlier run until the next refresh, unless newer ones are already in."""
+        if coins and fetched_at > self.snapshot.fetched_at:
+            self.snapshot = ListingsSnapshot(coins, fetched_at=fetched_at)
+            return True
+        return False
+
+    def refresh(self):
+        """Fetches fresh listings; keeps the old snapshot if the fetch fails. Returns True on success."""
+        return self._adopt_shared() or self._swap(get_top_coins_cmc(limit=self.limit))
+
+    async def refresh_async(self):
+        """Async version of refresh; the shared backend is used from a worker thread."""
+        if self.backend is None:
+            return self._swap(await get_top_coins_cmc_async(limit=self.limit))
+        if await asyncio.to_thread(self._adopt_shared):
+            return True
+        coins = await get_top_coins_cmc_async(limit=self.limit)
+        return await asyncio.to_thread(self._swap, coins)
+
+    def top(self, n):
+        return self.snapshot.top(n)
+
+    def top_text(self, n):
+        return self.snapshot.text(n)
+
+    def is_stale(self):
+        return time.time() - self.snapshot.fetched_at > self.interval
+
+    async def run_forever_async(self):
+        """Refreshes every `interval` seconds until cancelled (run as a task next to the bot)."""
+        while True:
+            try:
+                if not await self.refresh_async():
+                    logger.warning("Listings refresh failed; serving the previous snapshot.")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Listings refresh failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start_thread(self):
+        """Runs the refresh loop in a daemon thread (for the CLI). Does not refresh immediately."""
+        def loop():
+            while True:
+                time.sleep(self.interval)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.warning("Listings refresh failed: %s", e)
+        thread = threading.Thread(target=loop, name="listings-refresh", daemon=True)
+        thread.start()
+        return thread
+
+listings_service = ListingsService()
@@ -0,0 +1,102 @@
+# logging_config.py
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+
+from config import LOG_LEVEL, LOG_LEVELS, LOG_FORMAT
+from services.metrics import current_request_id
+
+# --- Non-blocking structured logging: callers enqueue records, one thread formats and writes them ---
+
+# Attributes every LogRecord has; anything else on a record came from `extra=` and is logged as a field
+_STANDARD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+class RequestIdFilter(logging.Filter):
+    """Stamps each record with the id of the request it was logged under (None outside a request)."""
+    def filter(self, record):
+        record.request_id = current_request_id()
+        return True
+
+class _ThreadQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueues records as they are. The stock QueueHandler formats the message in the calling
+    thread so records can be pickled; ours only cross threads, so formatting is left to the listener.
+    """
+    def prepare(self, record):
+        return record
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, request_id, msg, any `extra=` fields and exc."""
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', None),
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def formatTime(self, record, datefmt=None):
+        return time.strftime("%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}"
+
+def parse_module_levels(spec):
+    """'services.market_data=DEBUG,aiogram=WARNING' -> {'services.market_data': 'DEBUG', 'aiogram': 'WARNING'}"""
+    levels = {}
+    for item in (spec or "").split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+_listener = None
+
+def setup_logging(level=LOG_LEVEL, module_levels=LOG_LEVELS, fmt=LOG_FORMAT, stream=None):
+    """
+    Routes all logging through a queue to a background writer thread, so logging on the request
+    path never blocks on stdout/stderr. Safe to call more than once; later calls reconfigure.
+    :param level: Root level name, e.g. 'INFO'.
+    :param module_levels: Per-logger overrides, 'name=LEVEL,...' (see parse_module_levels).
+    :param fmt: 'json' or 'text'.
+    """
+    global _listener
+    stop_logging()
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+
+    records = queue.SimpleQueue()
+    handler = _ThreadQueueHandler(records)
+    # The request id lives in a contextvar, so it must be read in the logging thread, not the writer's
+    handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper())
+    for name, module_level in parse_module_levels(module_levels).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+
+def stop_logging():
+    """Flushes queued records and stops the writer thread (registered to run at exit)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+atexit.register(stop_logging)
@@ -1,26 +1,165 @@
 # market_data.py
+import asyncio
+import logging
 import requests
 import json
 
-from config import COINMARKETCAP_API_KEY, COINMARKETCAP_API_URL
+import aiohttp
+
+from config import (COINMARKETCAP_API_KEY, COINMARKETCAP_API_URL,
+                    QUOTE_CACHE_TTL_SECONDS, QUOTE_CACHE_MAX_ENTRIES,
+                    QUOTE_BATCH_WINDOW_MS, QUOTE_BATCH_MAX_SYMBOLS)
+from services.cache import TTLCache
+from services.cache_backend import shared_backend
+from services.http_client import get_json, get_json_async
+from services.quote_batcher import QuoteBatcher
+from services.metrics import register_cache
+
+logger = logging.getLogger(__name__)
+
+# Shared by the CLI and the bot (and by all workers through the cache backend): keyed by "symbol:BTC" / "id:1"
+quote_cache = TTLCache(ttl=QUOTE_CACHE_TTL_SECONDS, max_entries=QUOTE_CACHE_MAX_ENTRIES,
+                       backend=shared_backend, namespace="quote:")
+register_cache("quote", quote_cache.stats)
+
+# SYMBOL -> coin name, filled from every listing/quote we see; lets callers
+# name a coin without waiting on CMC (names don't change, so no expiry)
+coin_names_by_symbol = {}
+
+# Callables(coin_data) notified of every quote/listing entry we parse (e.g. the price history store)
+quote_listeners = []
+
+def _notify_quote_listeners(coin_data):
+    for listener in quote_listeners:
+        try:
+            listener(coin_data)
+        except Exception as e:
+            logger.warning("Quote listener failed: %s", e)
+
+def lookup_coin_name(symbol):
+    """Returns the known coin name for a symbol, or None if we've never seen it."""
+    return coin_names_by_symbol.get(symbol.upper()) if symbol else None
+
+def _remember_coin_name(coin_data):
+    if coin_data.get('symbol') and coin_data.get('name'):
+        coin_names_by_symbol.setdefault(coin_data['symbol'].upper(), coin_data['name'])
 
 # --- CoinMarketCap API Functions ---
 
 def get_cmc_headers():
     """Returns the headers required for CoinMarketCap API calls."""
     if not COINMARKETCAP_API_KEY:
-        print("Error: COINMARKETCAP_API_KEY not set.")
+        logger.error("Error: COINMARKETCAP_API_KEY not set.")
         return None
     return {
         'Accepts': 'application/json',
         'X-CMC_PRO_API_KEY': COINMARKETCAP_API_KEY,
     }
 
+def _parse_listings_response(data):
+    """Turns a /listings/latest payload into a list of coin dicts, or None on API error."""
+    if data.get('status', {}).get('error_code') == 0:
+        coins = []
+        for coin_data in data.get('data', []):
+            coins.append({
+                'id': coin_data.get('id'),
+                'name': coin_data.get('name'),
+                'symbol': coin_data.get('symbol'),
+                'rank': coin_data.get('cmc_rank'),
+                'price_usd': coin_data.get('quote', {}).get('USD', {}).get('price'),
+                'market_cap_usd': coin_data.get('quote', {}).get('USD', {}).get('market_cap'),
+                'volume_24h_usd': coin_data.get('quote', {}).get('USD', {}).get('volume_24h'),
+                'last_updated': coin_data.get('quote', {}).get('USD', {}).get('last_updated'),
+            })
+            _remember_coin_name(coins[-1])
+            _notify_quote_listeners(coins[-1])
+        return coins
+    else:
+        logger.error("CoinMarketCap API Error: %s", data.get('status', {}).get('error_message'))
+        return None
+
+def _build_quote_params(coin_symbol=None, coin_id=None):
+    """Returns the query parameters for /quotes/latest for a symbol or CMC ID."""
+    parameters = {'convert': 'USD'}
+    if coin_symbol:
+        parameters['symbol'] = coin_symbol.upper()
+    elif coin_id:
+        parameters['id'] = str(coin_id)
+    return parameters
+
+def _parse_quote(coin_data_raw):
+    """Turns a single raw CMC quote entry into our flat coin dict."""
+    return {
+        'id': coin_data_raw.get('id'),
+        'name': coin_data_raw.get('name'),
+        'symbol': coin_data_raw.get('symbol'),
+        'rank': coin_data_raw.get('cmc_rank'),
+        'price_usd': coin_data_raw.get('quote', {}).get('USD', {}).get('price'),
+        'market_cap_usd': coin_data_raw.get('quote', {}).get('USD', {}).get('market_cap'),
+        'volume_24h_usd': coin_data_raw.get('quote', {}).get('USD', {}).get('volume_24h'),
+        'percent_change_24h': coin_data_raw.get('quote', {}).get('USD', {}).get('percent_change_24h'),
+        'circulating_supply': coin_data_raw.get('circulating_supply'),
+        'total_supply': coin_data_raw.get('total_supply'),
+        'max_supply': coin_data_raw.get('max_supply'),
+        'last_updated': coin_data_raw.get('quote', {}).get('USD', {}).get('last_updated'),
+    }
+
+def _parse_quotes_response(data):
+    """Extracts every coin from a multi-symbol /quotes/latest payload as a dict of SYMBOL -> coin data."""
+    if data.get('status', {}).get('error_code') == 0:
+        coins = {}
+        for key, coin_data_raw in data.get('data', {}).items():
+            # Same rule as the single lookup: first entry wins when a symbol is shared
+            if isinstance(coin_data_raw, list):
+                if not coin_data_raw: continue
+                coin_data_raw = coin_data_raw[0]
+            coins[key.upper()] = _parse_quote(coin_data_raw)
+        return coins
+    else:
+        logger.error("CoinMarketCap API Error for batch quote: %s", data.get('status', {}).get('error_message'))
+        return None
+
+def _build_batch_quote_params(symbols):
+    """Query parameters for a multi-symbol /quotes/latest request; unknown symbols are skipped, not fatal."""
+    return {
+        'convert': 'USD',
+        'symbol': ",".join(symbols),
+        'skip_invalid': 'true',
+    }
+
+def _parse_quote_response(data, coin_symbol=None, coin_id=None):
+    """Extracts a single coin from a /quotes/latest payload, or None if missing / API error."""
+    if data.get('status', {}).get('error_code') == 0:
+        key_to_check = coin_symbol.upper() if coin_symbol else str(coin_id)
+
+        if key_to_check in data.get('data', {}):
+            coin_data_raw = data['data'][key_to_check]
+            # If queried by symbol, CMC might return a list if multiple coins share the symbol
+            # We'll take the first one, which is usually the most prominent.
+            if isinstance(coin_data_raw, list):
+                if not coin_data_raw: return None # Empty list
+                coin_data_raw = coin_data_raw[0]
+
+            return _parse_quote(coin_data_raw)
+        else:
+            logger.warning("Coin '%s' not found in CoinMarketCap response.", key_to_check)
+            return None
+    else:
+        logger.error("CoinMarketCap API Error for '%s': %s", coin_symbol or coin_id, data.get('status', {}).get('error_message'))
+        return None
+
 def get_top_50_coins_cmc():
     """
     Fetches the top 50 cryptocurrencies by market cap from CoinMarketCap.
     Returns a list of dictionaries, each containing coin data, or None if an error occurs.
     """
+    return get_top_coins_cmc(limit=50)
+
+def get_top_coins_cmc(limit=50):
+    """
+    Fetches the top `limit` cryptocurrencies by market cap from CoinMarketCap.
+    Returns a list of dictionaries, each containing coin data, or None if an error occurs.
+    """
     headers = get_cmc_headers()
     if not headers:
         return None
@@ -28,97 +167,265 @@ def get_top_50_coins_cmc():
     url = f"{COINMARKETCAP_API_URL}/v1/cryptocurrency/listings/latest"
     parameters = {
         'start': '1',
-        'limit': '50',
+        'limit': str(limit),
         'convert': 'USD'
     }
 
     try:
-        response = requests.get(url, params=parameters, headers=headers)
-        response.raise_for_status()  # Raises an HTTPError for bad responses (4XX or 5XX)
-        data = response.json()
-
-        if data.get('status', {}).get('error_code') == 0:
-            coins = []
-            for coin_data in data.get('data', []):
-                coins.append({
-                    'id': coin_data.get('id'),
-                    'name': coin_data.get('name'),
-                    'symbol': coin_data.get('symbol'),
-                    'rank': coin_data.get('cmc_rank'),
-                    'price_usd': coin_data.get('quote', {}).get('USD', {}).get('price'),
-                    'market_cap_usd': coin_data.get('quote', {}).get('USD', {}).get('market_cap'),
-                    'volume_24h_usd': coin_data.get('quote', {}).get('USD', {}).get('volume_24h')
-                })
-            return coins
-        else:
-            print(f"CoinMarketCap API Error: {data.get('status', {}).get('error_message')}")
-            return None
+        data = get_json('cmc', url, params=parameters, headers=headers)
+        return _parse_listings_response(data)
+    except requests.exceptions.RequestException as e:
+        logger.error("Error fetching top %s coins from CoinMarketCap: %s", limit, e)
+        return None
+    except json.JSONDecodeError:
+        logger.error("Error decoding JSON response from CoinMarketCap for top %s coins.", limit)
+        return None
+
+def _parse_map_response(data):
+    """Turns a /cryptocurrency/map payload into a list of {id, name, symbol, slug, rank}, or None on API error."""
+    if data.get('status', {}).get('error_code') == 0:
+        return [{
+            'id': coin_data.get('id'),
+            'name': coin_data.get('name'),
+            'symbol': coin_data.get('symbol'),
+            'slug': coin_data.get('slug'),
+            'rank': coin_data.get('rank'),
+        } for coin_data in data.get('data', [])]
+    else:
+        logger.error("CoinMarketCap API Error for coin map: %s", data.get('status', {}).get('error_message'))
+        return None
+
+_MAP_PARAMS = {'listing_status': 'active', 'sort': 'cmc_rank'}
+
+def get_coin_map_cmc():
+    """
+    Fetches the full map of active coins (thousands of entries: id, name, symbol, slug, rank)
+    from CoinMarketCap. Used to build the coin resolver. Returns a list, or None if an error occurs.
+    """
+    headers = get_cmc_headers()
+    if not headers:
+        return None
+    url = f"{COINMARKETCAP_API_URL}/v1/cryptocurrency/map"
+    try:
+        return _parse_map_response(get_json('cmc', url, params=_MAP_PARAMS, headers=headers))
     except requests.exceptions.RequestException as e:
-        print(f"Error fetching top 50 coins from CoinMarketCap: {e}")
+        logger.error("Error fetching the coin map from CoinMarketCap: %s", e)
         return None
     except json.JSONDecodeError:
-        print("Error decoding JSON response from CoinMarketCap for top 50 coins.")
+        logger.error("Error decoding JSON response from CoinMarketCap for the coin map.")
         return None
 
+def _quote_cache_key(coin_symbol=None, coin_id=None):
+    return f"symbol:{coin_symbol.upper()}" if coin_symbol else f"id:{coin_id}"
+
+def _remember_quote(coin_data):
+    """Stores a fetched quote under both its symbol and id keys."""
+    if coin_data:
+        _remember_coin_name(coin_data)
+        _notify_quote_listeners(coin_data)
+        if coin_data.get('symbol'):
+            quote_cache.set(_quote_cache_key(coin_symbol=coin_data['symbol']), coin_data)
+        if coin_data.get('id') is not None:
+            quote_cache.set(_quote_cache_key(coin_id=coin_data['id']), coin_data)
+    return coin_data
+
+async def _off_loop(func, *args):
+    """Runs func (which reads or writes quote_cache) in a worker thread if the cache has a shared backend to talk to."""
+    if quote_cache.backend is None:
+        return func(*args)
+    return await asyncio.to_thread(func, *args)
+
+def get_quote_cache_stats():
+    """Returns hit/miss counters for the quote cache."""
+    return quote_cache.stats()
+
 def get_coin_data_cmc(coin_symbol=None, coin_id=None):
     """
     Fetches market data for a specific cryptocurrency from CoinMarketCap
     using its symbol (e.g., "BTC") or CMC ID (e.g., 1).
+    Results are served from the quote cache for QUOTE_CACHE_TTL_SECONDS, and
+    concurrent misses for the same coin share a single upstream request.
     Returns a dictionary with coin data, or None if an error occurs or coin not found.
     """
+    if not coin_symbol and not coin_id:
+        logger.error("Error: You must provide either coin_symbol or coin_id for get_coin_data_cmc.")
+        return None
+    return quote_cache.get_or_load(
+        _quote_cache_key(coin_symbol, coin_id),
+        lambda: _remember_quote(_fetch_coin_data_cmc(coin_symbol, coin_id)),
+    )
+
+def get_coins_data_cmc(symbols):
+    """
+    Fetches market data for several cryptocurrencies at once.
+    Cached symbols are served from the quote cache; the rest are requested
+    from CoinMarketCap in a single /quotes/latest call.
+    :param symbols: Iterable of coin symbols (e.g., ["BTC", "ETH"]).
+    :return: A dict of SYMBOL -> coin data; symbols CMC doesn't know are absent.
+    """
+    results, missing = _split_cached_symbols(symbols)
+    if missing:
+        fetched = _fetch_coins_data_cmc(missing)
+        for coin_data in fetched.values():
+            _remember_quote(coin_data)
+        results.update(fetched)
+    return results
+
+def _split_cached_symbols(symbols):
+    """Returns (cached results, list of symbols that still need fetching)."""
+    results = {}
+    missing = []
+    for symbol in dict.fromkeys(s.upper() for s in symbols if s):
+        cached = quote_cache.get(_quote_cache_key(coin_symbol=symbol))
+        if cached is not None:
+            results[symbol] = cached
+        else:
+            missing.append(symbol)
+    return results, missing
+
+def _fetch_coins_data_cmc(symbols):
+    """Uncached multi-symbol /quotes/latest request; returns {} on error."""
     headers = get_cmc_headers()
     if not headers:
+        return {}
+
+    url = f"{COINMARKETCAP_API_URL}/v1/cryptocurrency/quotes/latest"
+    try:
+        data = get_json('cmc', url, params=_build_batch_quote_params(symbols), headers=headers)
+        return _parse_quotes_response(data) or {}
+    except requests.exceptions.RequestException as e:
+        logger.error("Error fetching batch quotes for %s symbols from CoinMarketCap: %s", len(symbols), e)
+        return {}
+    except json.JSONDecodeError:
+        logger.error("Error decoding JSON response from CoinMarketCap for batch quotes.")
+        return {}
+
+def _fetch_coin_data_cmc(coin_symbol=None, coin_id=None):
+    """Uncached /quotes/latest request behind get_coin_data_cmc."""
+    headers = get_cmc_headers()
+    if not headers:
+        return None
+
+    url = f"{COINMARKETCAP_API_URL}/v1/cryptocurrency/quotes/latest"
+    parameters = _build_quote_params(coin_symbol, coin_id)
+
+    try:
+        data = get_json('cmc', url, params=parameters, headers=headers)
+        return _parse_quote_response(data, coin_symbol, coin_id)
+    except requests.exceptions.RequestException as e:
+        logger.error("Error fetching data for '%s' from CoinMarketCap: %s", coin_symbol or coin_id, e)
+        return None
+    except json.JSONDecodeError:
+        logger.error("Error decoding JSON response from CoinMarketCap for '%s'.", coin_symbol or coin_id)
+        return None
+
+# --- Async variants (used by the Telegram bot) ---
+
+async def get_top_50_coins_cmc_async():
+    """Async version of get_top_50_coins_cmc; never blocks the event loop."""
+    return await get_top_coins_cmc_async(limit=50)
+
+async def get_top_coins_cmc_async(limit=50):
+    """Async version of get_top_coins_cmc; never blocks the event loop."""
+    headers = get_cmc_headers()
+    if not headers:
+        return None
+
+    url = f"{COINMARKETCAP_API_URL}/v1/cryptocurrency/listings/latest"
+    parameters = {
+        'start': '1',
+        'limit': str(limit),
+        'convert': 'USD'
+    }
+
+    try:
+        data = await get_json_async('cmc', url, params=parameters, headers=headers)
+        return _parse_listings_response(data)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.error("Error fetching top %s coins from CoinMarketCap: %s", limit, e)
+        return None
+    except json.JSONDecodeError:
+        logger.error("Error decoding JSON response from CoinMarketCap for top %s coins.", limit)
         return None
+
+async def get_coin_map_cmc_async():
+    """Async version of get_coin_map_cmc."""
+    headers = get_cmc_headers()
+    if not headers:
+        return None
+    url = f"{COINMARKETCAP_API_URL}/v1/cryptocurrency/map"
+    try:
+        return _parse_map_response(await get_json_async('cmc', url, params=_MAP_PARAMS, headers=headers))
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.error("Error fetching the coin map from CoinMarketCap: %s", e)
+        return None
+    except json.JSONDecodeError:
+        logger.error("Error decoding JSON response from CoinMarketCap for the coin map.")
+        return None
+
+async def get_coin_data_cmc_async(coin_symbol=None, coin_id=None):
+    """Async version of get_coin_data_cmc (same cache); never blocks the event loop."""
     if not coin_symbol and not coin_id:
-        print("Error: You must provide either coin_symbol or coin_id for get_coin_data_cmc.")
+        logger.error("Error: You must provide either coin_symbol or coin_id for get_coin_data_cmc_async.")
+        return None
+
+    async def load():
+        if coin_symbol:
+            # Symbol lookups from concurrent chats are merged into one batched request
+            return await _off_loop(_remember_quote, await quote_batcher.get(coin_symbol))
+        return await _off_loop(_remember_quote, await _fetch_coin_data_cmc_async(coin_symbol, coin_id))
+
+    return await quote_cache.get_or_load_async(_quote_cache_key(coin_symbol, coin_id), load)
+
+async def _fetch_coin_data_cmc_async(coin_symbol=None, coin_id=None):
+    """Uncached async /quotes/latest request behind get_coin_data_cmc_async."""
+    headers = get_cmc_headers()
+    if not headers:
         return None
 
     url = f"{COINMARKETCAP_API_URL}/v1/cryptocurrency/quotes/latest"
-    parameters = {'convert': 'USD'}
-    if coin_symbol:
-        parameters['symbol'] = coin_symbol.upper()
-    elif coin_id:
-        parameters['id'] = str(coin_id)
+    parameters = _build_quote_params(coin_symbol, coin_id)
 
     try:
-        response = requests.get(url, params=parameters, headers=headers)
-        response.raise_for_status()
-        data = response.json()
-
-        if data.get('status', {}).get('error_code') == 0:
-            key_to_check = coin_symbol.upper() if coin_symbol else str(coin_id)
-            
-            if key_to_check in data.get('data', {}):
-                coin_data_raw = data['data'][key_to_check]
-                # If queried by symbol, CMC might return a list if multiple coins share the symbol
-                # We'll take the first one, which is usually the most prominent.
-                if isinstance(coin_data_raw, list):
-                    if not coin_data_raw: return None # Empty list
-                    coin_data_raw = coin_data_raw[0]
-                
-                return {
-                    'id': coin_data_raw.get('id'),
-                    'name': coin_data_raw.get('name'),
-                    'symbol': coin_data_raw.get('symbol'),
-                    'rank': coin_data_raw.get('cmc_rank'),
-                    'price_usd': coin_data_raw.get('quote', {}).get('USD', {}).get('price'),
-                    'market_cap_usd': coin_data_raw.get('quote', {}).get('USD', {}).get('market_cap'),
-                    'volume_24h_usd': coin_data_raw.get('quote', {}).get('USD', {}).get('volume_24h'),
-                    'percent_change_24h': coin_data_raw.get('quote', {}).get('USD', {}).get('percent_change_24h'),
-                    'circulating_supply': coin_data_raw.get('circulating_supply'),
-                    'total_supply': coin_data_raw.get('total_supply'),
-                    'max_supply': coin_data_raw.get('max_supply'),
-                    'last_updated': coin_data_raw.get('quote', {}).get('USD', {}).get('last_updated'),
-                }
-            else:
-                print(f"Coin '{key_to_check}' not found in CoinMarketCap response.")
-                return None
-        else:
-            print(f"CoinMarketCap API Error for '{coin_symbol or coin_id}': {data.get('status', {}).get('error_message')}")
-            return None
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching data for '{coin_symbol or coin_id}' from CoinMarketCap: {e}")
+        data = await get_json_async('cmc', url, params=parameters, headers=headers)
+        return _parse_quote_response(data, coin_symbol, coin_id)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.error("Error fetching data for '%s' from CoinMarketCap: %s", coin_symbol or coin_id, e)
         return None
     except json.JSONDecodeError:
-        print(f"Error decoding JSON response from CoinMarketCap for '{coin_symbol or coin_id}'.")
+        logger.error("Error decoding JSON response from CoinMarketCap for '%s'.", coin_symbol or coin_id)
         return None
+
+async def get_coins_data_cmc_async(symbols):
+    """Async version of get_coins_data_cmc; never blocks the event loop."""
+    results, missing = await _off_loop(_split_cached_symbols, symbols)
+    if missing:
+        fetched = await _fetch_coins_data_cmc_async(missing)
+        for coin_data in fetched.values():
+            await _off_loop(_remember_quote, coin_data)
+        results.update(fetched)
+    return results
+
+async def _fetch_coins_data_cmc_async(symbols):
+    """Uncached async multi-symbol /quotes/latest request; returns {} on error."""
+    headers = get_cmc_headers()
+    if not headers:
+        return {}
+
+    url = f"{COINMARKETCAP_API_URL}/v1/cryptocurrency/quotes/latest"
+    try:
+        data = await get_json_async('cmc', url, params=_build_batch_quote_params(symbols), headers=headers)
+        return _parse_quotes_response(data) or {}
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.error("Error fetching batch quotes for %s symbols from CoinMarketCap: %s", len(symbols), e)
+        return {}
+    except json.JSONDecodeError:
+        logger.error("Error decoding JSON response from CoinMarketCap for batch quotes.")
+        return {}
+
+# Collects single-symbol lookups from concurrent bot requests into one upstream call
+quote_batcher = QuoteBatcher(
+    _fetch_coins_data_cmc_async,
+    window=QUOTE_BATCH_WINDOW_MS / 1000,
+    max_batch=QUOTE_BATCH_MAX_SYMBOLS,
+)
@@ -0,0 +1,211 @@
+# metrics.py
+import contextvars
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from aiohttp import web
+
+from config import METRICS_HOST, METRICS_PORT, SLOW_REQUEST_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# --- In-process metrics (Prometheus text format) and request-scoped stage tracing ---
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label combination."""
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {} # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def quantile(self, q, *label_values):
+        """Upper bucket bound below which a fraction q of observations fall (inf past the last bucket)."""
+        series = self._series.get(label_values)
+        if not series or not series[-1]:
+            return None
+        rank = q * series[-1]
+        for i, bound in enumerate(self.buckets):
+            if series[i] >= rank:
+                return bound
+        return math.inf
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for label_values, series in items:
+            for i, bound in enumerate(self.buckets):
+                labels = _format_labels(self.labels + ('le',), label_values + (repr(bound),))
+                lines.append(f"{self.name}_bucket{labels} {series[i]}")
+            labels = _format_labels(self.labels + ('le',), label_values + ('+Inf',))
+            lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {series[-2]}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+stage_latency = Histogram("crypto_stage_latency_seconds", "Latency of one request stage.", labels=("stage",))
+request_latency = Histogram("crypto_request_latency_seconds", "End-to-end latency of a user request.", labels=("kind",))
+upstream_errors = Counter("crypto_upstream_errors_total", "Failed upstream calls by provider and reason.", labels=("provider", "reason"))
+gemini_tokens = Counter("crypto_gemini_tokens_total", "Gemini tokens used.", labels=("kind",))
+news_store_lookups = Counter("crypto_news_store_lookups_total", "Local news store lookups.", labels=("result",))
+
+_metrics = [stage_latency, request_latency, upstream_errors, gemini_tokens, news_store_lookups]
+
+# name -> callable returning a TTLCache-style stats() dict
+_caches = {}
+
+def register_cache(name, stats):
+    """Exports hit/miss counters and the hit ratio of a cache whose stats() is `stats`."""
+    _caches[name] = stats
+
+def _render_caches():
+    lines = []
+    snapshots = sorted((name, stats()) for name, stats in _caches.items())
+    for metric, key, kind, help_text in (
+        ("crypto_cache_hits_total", 'hits', 'counter', "Cache hits."),
+        ("crypto_cache_misses_total", 'misses', 'counter', "Cache misses (loads from upstream)."),
+        ("crypto_cache_coalesced_total", 'coalesced', 'counter', "Lookups that joined an in-flight load."),
+        ("crypto_cache_remote_hits_total", 'remote_hits', 'counter', "Local misses served by the shared cache backend."),
+        ("crypto_cache_hit_ratio", 'hit_ratio', 'gauge', "hits / (hits + misses + coalesced)."),
+        ("crypto_cache_entries", 'size', 'gauge', "Entries currently cached."),
+    ):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+        lines += [f'{metric}{{cache="{name}"}} {snapshot.get(key, 0)}' for name, snapshot in snapshots]
+    return lines
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _metrics:
+        lines += metric.render()
+    lines += _render_caches()
+    return "\n".join(lines) + "\n"
+
+def record_gemini_usage(response):
+    """Counts prompt/completion tokens from a Gemini response's usage_metadata, if present."""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return
+    for kind, attr in (('prompt', 'prompt_token_count'), ('completion', 'candidates_token_count')):
+        count = getattr(usage, attr, 0)
+        if count:
+            gemini_tokens.inc(kind, amount=count)
+
+# --- Request scope ---
+
+_request_ids = itertools.count(1)
+_pid = os.getpid()
+
+class RequestTrace:
+    __slots__ = ('request_id', 'kind', 'started_at', 'stages')
+
+    def __init__(self, kind):
+        self.request_id = f"{_pid}-{next(_request_ids)}"
+        self.kind = kind
+        self.started_at = time.perf_counter()
+        self.stages = [] # (stage, seconds) in completion order
+
+current_trace = contextvars.ContextVar('current_trace', default=None)
+
+def current_request_id():
+    trace = current_trace.get()
+    return trace.request_id if trace else None
+
+@contextmanager
+def request_scope(kind):
+    """
+    Traces one user request: stages timed inside it are attributed to it, its total latency
+    is recorded, and requests slower than SLOW_REQUEST_SECONDS log their stage breakdown.
+    """
+    trace = RequestTrace(kind)
+    token = current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        current_trace.reset(token)
+        elapsed = time.perf_counter() - trace.started_at
+        request_latency.observe(elapsed, kind)
+        if elapsed >= SLOW_REQUEST_SECONDS:
+            breakdown = ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in trace.stages)
+            logger.warning("Slow %s request %s: %.0fms (%s)", kind, trace.request_id, elapsed * 1000, breakdown)
+
+@contextmanager
+def stage(name):
+    """Times a block as one stage of the current request (or standalone, outside a request)."""
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started_at)
+
+def record_stage(name, seconds):
+    """Records a stage duration measured by the caller (for spans a with-block can't wrap)."""
+    stage_latency.observe(seconds, name)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.stages.append((name, seconds))
+
+# --- /metrics endpoint ---
+
+async def _metrics_handler(request):
+    return web.Response(body=render().encode(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+async def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Serves GET /metrics on host:port from the running event loop. Returns the runner (call .cleanup() to stop)."""
+    app = web.Application()
+    app.router.add_get("/metrics", _metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
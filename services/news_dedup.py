@@ -0,0 +1,122 @@
+# news_dedup.py
+import hashlib
+import heapq
+import re
+import threading
+from collections import OrderedDict
+
+from config import NEWS_DEDUP_WINDOW, NEWS_DEDUP_MIN_OVERLAP, NEWS_DEDUP_MIN_SHINGLES
+
+# --- Near-duplicate detection for syndicated news: MinHash / LSH over word shingles, in a rolling window ---
+
+_TOKEN = re.compile(r"\w+")
+_SHINGLE_WORDS = 3
+# Bottom-k MinHash: an article's k smallest shingle hashes are its LSH keys. Texts sharing most
+# of their shingles very likely share one of these, and any shared key makes them candidates.
+_SKETCH_SIZE = 6
+# A key shared by this many articles is boilerplate ("read more on ...") and no longer used for lookups
+_MAX_BUCKET = 32
+
+def _hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+def _words(text):
+    return _TOKEN.findall(text.lower()) if isinstance(text, str) else []
+
+class Fingerprint:
+    """An article's shingle set (runs of three words of title + description), words and LSH keys."""
+    __slots__ = ('shingles', 'keys', 'title_words', 'body_words')
+
+    def __init__(self, title_words, body_words):
+        words = title_words + body_words
+        self.shingles = frozenset(_hash64(" ".join(words[i:i + _SHINGLE_WORDS]))
+                                  for i in range(max(1, len(words) - _SHINGLE_WORDS + 1)))
+        self.keys = heapq.nsmallest(_SKETCH_SIZE, self.shingles)
+        self.title_words = frozenset(title_words)
+        self.body_words = frozenset(body_words)
+
+    def overlap(self, other):
+        """Share of the shorter text's shingles found in the other text (1.0 for a truncated copy)."""
+        return len(self.shingles & other.shingles) / min(len(self.shingles), len(other.shingles))
+
+    def _subject_missing_from(self, other):
+        # A title word the other article never uses, yet repeated in this one's description
+        for word in self.title_words - other.title_words - other.body_words:
+            if word in self.body_words:
+                return True
+        return False
+
+    def same_subject(self, other):
+        """
+        False when the two texts are the same template about different things, typically coins:
+        "BNB price climbs ..." vs "XRP price climbs ...", each naming its coin again in the description.
+        """
+        return not (self._subject_missing_from(other) or other._subject_missing_from(self))
+
+def fingerprint_article(article, min_shingles=NEWS_DEDUP_MIN_SHINGLES):
+    """The article's Fingerprint, or None if its text is too short to compare reliably."""
+    fingerprint = Fingerprint(_words(article.get('title')), _words(article.get('description')))
+    if len(fingerprint.shingles) < min_shingles:
+        return None
+    return fingerprint
+
+class NearDuplicateIndex:
+    """
+    Fingerprints of the last `window` articles, searchable for a copy of a new one.
+
+    Candidates are the fingerprints sharing an LSH key: a few hash-bucket lookups of bounded
+    size, however large the window. A candidate is a copy when at least min_overlap of the
+    shorter text's shingles appear in the other (syndicated copies keep the wording, with an
+    edit or a truncated description) and it is about the same subject.
+    Adding past `window` forgets the oldest fingerprint.
+    """
+    def __init__(self, window=NEWS_DEDUP_WINDOW, min_overlap=NEWS_DEDUP_MIN_OVERLAP):
+        self.window = window
+        self.min_overlap = min_overlap
+        self._lock = threading.Lock()
+        self._fingerprints = OrderedDict() # key -> Fingerprint, oldest first
+        self._buckets = {} # LSH key -> set of keys (at most _MAX_BUCKET)
+
+    def __len__(self):
+        return len(self._fingerprints)
+
+    def find(self, fingerprint):
+        """Key of the stored fingerprint most like this one, if it is a copy; else None."""
+        best_key, best_overlap = None, self.min_overlap
+        with self._lock:
+            candidates = set()
+            for lsh_key in fingerprint.keys:
+                bucket = self._buckets.get(lsh_key, ())
+                if len(bucket) < _MAX_BUCKET:
+                    candidates.update(bucket)
+            for key in candidates:
+                other = self._fingerprints[key]
+                overlap = fingerprint.overlap(other)
+                if overlap >= best_overlap and fingerprint.same_subject(other):
+                    best_key, best_overlap = key, overlap
+        return best_key
+
+    def add(self, key, fingerprint):
+        with self._lock:
+            if key in self._fingerprints:
+                return
+            self._fingerprints[key] = fingerprint
+            for lsh_key in fingerprint.keys:
+                bucket = self._buckets.setdefault(lsh_key, set())
+                if len(bucket) < _MAX_BUCKET:
+                    bucket.add(key)
+            while len(self._fingerprints) > self.window:
+                old_key, old_fingerprint = self._fingerprints.popitem(last=False)
+                for lsh_key in old_fingerprint.keys:
+                    # Not there if the bucket was full when this key was added (and may be gone since)
+                    bucket = self._buckets.get(lsh_key)
+                    if bucket is None or old_key not in bucket:
+                        continue
+                    bucket.discard(old_key)
+                    if not bucket:
+                        del self._buckets[lsh_key]
+
+    def clear(self):
+        with self._lock:
+            self._fingerprints.clear()
+            self._buckets.clear()
@@ -0,0 +1,169 @@
+# news_index.py
+import heapq
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from config import (NEWS_INDEX_MAX_ARTICLES, NEWS_RECENCY_HALF_LIFE_HOURS, NEWS_INDEX_TITLE_WEIGHT,
+                    NEWS_INDEX_BM25_K1, NEWS_INDEX_BM25_B)
+from services.coin_resolver import coin_resolver
+from services.prompt_builder import published_timestamp
+
+# --- In-memory inverted index over news articles: BM25 relevance, coin alias expansion, recency decay ---
+
+_TOKEN = re.compile(r"\w+")
+
+def tokenize(text):
+    return _TOKEN.findall(text.lower()) if isinstance(text, str) else []
+
+class _Doc:
+    __slots__ = ('article', 'terms', 'length', 'boost')
+
+    def __init__(self, article, terms, length, boost):
+        self.article = article
+        self.terms = terms # term -> weighted frequency
+        self.length = length
+        self.boost = boost # log-space recency weight, see NewsIndex._boost
+
+class NewsIndex:
+    """
+    Articles searchable by coin or phrase. Title, description and keywords are indexed
+    (title terms count `title_weight` times); queries are scored with BM25 and the score
+    halves every half_life_hours of article age. Query words that name a coin are expanded
+    to its name and symbol, so "bitcoin" also finds articles that only say "BTC".
+
+    Articles are added one by one as they are fetched; past max_articles the oldest added
+    are dropped. Queries only touch the postings of their own terms.
+    """
+    def __init__(self, max_articles=NEWS_INDEX_MAX_ARTICLES, half_life_hours=NEWS_RECENCY_HALF_LIFE_HOURS,
+                 title_weight=NEWS_INDEX_TITLE_WEIGHT, k1=NEWS_INDEX_BM25_K1, b=NEWS_INDEX_BM25_B, resolver=coin_resolver):
+        self.max_articles = max_articles
+        self.half_life = half_life_hours * 3600.0
+        self.title_weight = title_weight
+        self.k1 = k1
+        self.b = b
+        self.resolver = resolver
+        self._lock = threading.Lock()
+        self._docs = OrderedDict() # doc id -> _Doc, oldest added first
+        self._postings = {} # term -> {doc id: weighted frequency}
+        self._lengths = {} # doc id -> weighted length (kept apart from _docs for the scoring loop)
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._docs
+
+    def _terms(self, article):
+        terms = {}
+        for term in tokenize(article.get('title')):
+            terms[term] = terms.get(term, 0) + self.title_weight
+        keywords = " ".join(k for k in article.get('keywords') or [] if isinstance(k, str))
+        for term in tokenize(article.get('description')) + tokenize(keywords):
+            terms[term] = terms.get(term, 0) + 1
+        return terms
+
+    def _boost(self, article):
+        """
+        score * 0.5 ** (age / half_life) ranks like log(score) + published * ln 2 / half_life, and the
+        second term doesn't depend on the query time, so it's computed once here. Undated articles count
+        as one half-life old when they are indexed, as in prompt_builder.rank_articles.
+        """
+        published = published_timestamp(article)
+        if published is None:
+            published = time.time() - self.half_life
+        return published * math.log(2.0) / self.half_life
+
+    def add(self, doc_id, article):
+        """Indexes an article under doc_id (see news_store.article_id); re-adding a known id does nothing."""
+        if doc_id in self._docs:
+            return False
+        terms = self._terms(article)
+        doc = _Doc(article, terms, sum(terms.values()), self._boost(article))
+        with self._lock:
+            if doc_id in self._docs:
+                return False
+            self._docs[doc_id] = doc
+            self._lengths[doc_id] = doc.length
+            self._total_length += doc.length
+            for term, frequency in terms.items():
+                self._postings.setdefault(term, {})[doc_id] = frequency
+            while len(self._docs) > self.max_articles:
+                self._remove_oldest()
+        return True
+
+    def remove(self, doc_id):
+        """Drops an article from the index (no-op for unknown ids)."""
+        with self._lock:
+            doc = self._docs.pop(doc_id, None)
+            if doc is not None:
+                self._drop(doc_id, doc)
+
+    def _remove_oldest(self):
+        """Caller must hold the lock."""
+        self._drop(*self._docs.popitem(last=False))
+
+    def _drop(self, doc_id, doc):
+        """Removes a document already taken out of _docs from the other structures. Caller must hold the lock."""
+        del self._lengths[doc_id]
+        self._total_length -= doc.length
+        for term in doc.terms:
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+
+    def expand(self, query):
+        """Query terms plus, for every word or the whole query that names a coin, that coin's name and symbol."""
+        terms = tokenize(query)
+        expanded = set(terms)
+        for phrase in [query] + terms:
+            coin = self.resolver.lookup(phrase) if isinstance(phrase, str) else None
+            if coin:
+                expanded.update(tokenize(coin.get('name')))
+                expanded.update(tokenize(coin.get('symbol')))
+        return expanded
+
+    def search(self, query, limit=5, doc_ids=None):
+        """
+        Returns up to `limit` articles matching query (a coin name, symbol or phrase), best first.
+        Articles sharing no term with the expanded query are never returned.
+        :param doc_ids: Only rank these documents (a set), e.g. the articles stored for one coin.
+        """
+        terms = self.expand(query)
+        k1 = self.k1
+        with self._lock:
+            docs = self._docs
+            count = len(docs)
+            if not count or not terms:
+                return []
+            # Per-document BM25 length normalization, k1 * (1 - b + b * length / average length)
+            scale = k1 * self.b * count / (self._total_length or 1)
+            base = k1 * (1.0 - self.b)
+            lengths = self._lengths
+            scores = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1.0 + (count - len(postings) + 0.5) / (len(postings) + 0.5)) * (k1 + 1.0)
+                for doc_id, frequency in postings.items():
+                    if doc_ids is not None and doc_id not in doc_ids:
+                        continue
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency / (frequency + base + scale * lengths[doc_id])
+
+            log = math.log
+            best = heapq.nlargest(limit, ((log(score) + docs[doc_id].boost, doc_id) for doc_id, score in scores.items()))
+            return [dict(docs[doc_id].article) for _, doc_id in best]
+
+    def clear(self):
+        with self._lock:
+            self._docs.clear()
+            self._postings.clear()
+            self._lengths.clear()
+            self._total_length = 0
+
+news_index = NewsIndex()
@@ -0,0 +1,88 @@
+# news_ingestor.py
+import asyncio
+import logging
+import threading
+import time
+
+from config import NEWS_INGEST_INTERVAL_SECONDS, NEWS_INGEST_TOP_N, NEWS_INGEST_PAGE_SIZE
+from services.listings import listings_service
+from services.news_service import get_newsdata_io_news, get_newsdata_io_news_async, share_news
+from services.news_store import news_store
+
+logger = logging.getLogger(__name__)
+
+# --- Background worker that keeps the local news store warm ---
+
+class NewsIngestor:
+    """
+    Periodically pulls the latest news for the top-N coins (from the shared listings snapshot) into the news store,
+    indexed under both the coin's name and symbol, so user requests never wait on Newsdata.io.
+    """
+    def __init__(self, store=news_store, interval=NEWS_INGEST_INTERVAL_SECONDS,
+                 top_n=NEWS_INGEST_TOP_N, page_size=NEWS_INGEST_PAGE_SIZE):
+        self.store = store
+        self.interval = interval
+        self.top_n = top_n
+        self.page_size = page_size
+        self._coins = [] # last known (name, symbol) universe, reused if a listing refresh fails
+
+    def _update_universe(self):
+        listings = listings_service.top(self.top_n)
+        if listings:
+            self._coins = [(c['name'], c['symbol']) for c in listings if c.get('name')]
+        return self._coins
+
+    def _store(self, name, symbol, articles):
+        if articles is None:
+            return 0
+        # Other worker processes read these through the shared cache backend
+        share_news(name, articles)
+        share_news(symbol, articles)
+        return self.store.add_articles([name, symbol], articles)
+
+    def ingest_once(self):
+        """Runs one ingestion pass; returns the number of new articles stored."""
+        new_articles = 0
+        if not len(listings_service.snapshot):
+            listings_service.refresh()
+        for name, symbol in self._update_universe():
+            new_articles += self._store(name, symbol, get_newsdata_io_news(name, size=self.page_size))
+        return new_articles
+
+    async def ingest_once_async(self):
+        """Async version of ingest_once. Coins are fetched one after another to spare the Newsdata.io quota."""
+        new_articles = 0
+        if not len(listings_service.snapshot):
+            await listings_service.refresh_async()
+        for name, symbol in self._update_universe():
+            articles = await get_newsdata_io_news_async(name, size=self.page_size)
+            # Storing writes to SQLite and the shared backend
+            new_articles += await asyncio.to_thread(self._store, name, symbol, articles)
+        return new_articles
+
+    async def run_forever_async(self):
+        """Ingests every `interval` seconds until cancelled (run as a task next to the bot)."""
+        while True:
+            try:
+                new_articles = await self.ingest_once_async()
+                logger.info("News ingestion: %s new articles for %s coins.", new_articles, len(self._coins))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("News ingestion pass failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start_thread(self):
+        """Runs the synchronous ingestion loop in a daemon thread (for non-async callers)."""
+        def loop():
+            while True:
+                try:
+                    self.ingest_once()
+                except Exception as e:
+                    logger.warning("News ingestion pass failed: %s", e)
+                time.sleep(self.interval)
+        thread = threading.Thread(target=loop, name="news-ingestor", daemon=True)
+        thread.start()
+        return thread
+
+news_ingestor = NewsIngestor()
@@ -1,11 +1,60 @@
 # news_service.py
+import asyncio
+import logging
 import requests
 import json
 
-from config import DEFAULT_NEWS_LANGUAGE, NEWSDATA_API_KEY, NEWSDATA_API_URL
+import aiohttp
+
+from config import (DEFAULT_NEWS_LANGUAGE, NEWSDATA_API_KEY, NEWSDATA_API_URL, NEWS_STORE_MAX_AGE_SECONDS,
+                    PROVIDER_WAIT_SECONDS, NEWS_FETCH_SIZE)
+from services.http_client import get_json, get_json_async
+from services.news_store import news_store
+from services.cache_backend import shared_backend
+from services.metrics import news_store_lookups
+
+logger = logging.getLogger(__name__)
 
 # --- Newsdata.io API Functions ---
 
+def _build_news_params(coin_name, language, size):
+    """Returns the Newsdata.io query parameters for a coin."""
+    query = f'"{coin_name}" AND ("crypto" OR "cryptocurrency" OR "blockchain" OR "token" OR "digital currency")'
+    return {
+        'apikey': NEWSDATA_API_KEY,
+        'q': query,
+        'language': language,
+        'size': size
+    }
+
+def _parse_news_response(data):
+    """Turns a Newsdata.io payload into a list of article dicts, or None on API error."""
+    if data.get("status") == "success":
+        articles_raw = data.get("results", [])
+        articles = []
+        for article_data in articles_raw:
+            articles.append({
+                'title': article_data.get('title'),
+                'link': article_data.get('link'),
+                'description': article_data.get('description'),
+                'source_id': article_data.get('source_id'),
+                'published_at': article_data.get('pubDate'),
+                'keywords': article_data.get('keywords', [])
+            })
+        return articles
+    else:
+        # Handle API-specific errors from Newsdata.io
+        error_info = data.get('results', {})
+        if isinstance(error_info, list) and error_info: # sometimes error is a list
+             error_message = error_info[0]
+        elif isinstance(error_info, dict):
+             error_message = error_info.get('message', 'Unknown Newsdata.io API error')
+        else:
+             error_message = 'Unknown Newsdata.io API error'
+
+        logger.error("Newsdata.io API Error: %s", error_message)
+        return None
+
 def get_newsdata_io_news(coin_name, language=DEFAULT_NEWS_LANGUAGE, size=3):
     """
     Fetches news for a specific coin name from Newsdata.io.
@@ -15,48 +64,119 @@ def get_newsdata_io_news(coin_name, language=DEFAULT_NEWS_LANGUAGE, size=3):
     :return: List of news articles or None if an error occurs.
     """
     if not NEWSDATA_API_KEY:
-        print("Error: NEWSDATA_API_KEY not set in config.")
+        logger.error("Error: NEWSDATA_API_KEY not set in config.")
         return None
 
-    query = f'"{coin_name}" AND ("crypto" OR "cryptocurrency" OR "blockchain" OR "token" OR "digital currency")'
-    params = {
-        'apikey': NEWSDATA_API_KEY,
-        'q': query,
-        'language': language,
-        'size': size
-    }
+    params = _build_news_params(coin_name, language, size)
 
     try:
-        response = requests.get(NEWSDATA_API_URL, params=params)
-        response.raise_for_status()
-        data = response.json()
-
-        if data.get("status") == "success":
-            articles_raw = data.get("results", [])
-            articles = []
-            for article_data in articles_raw:
-                articles.append({
-                    'title': article_data.get('title'),
-                    'link': article_data.get('link'),
-                    'description': article_data.get('description'),
-                    'source_id': article_data.get('source_id'),
-                    'published_at': article_data.get('pubDate'),
-                    'keywords': article_data.get('keywords', [])
-                })
-            return articles
-        else:
-            # Handle API-specific errors from Newsdata.io
-            error_info = data.get('results', {})
-            error_message = error_info.get('message', 'Unknown Newsdata.io API error')
-            if isinstance(error_info, list) and error_info: # sometimes error is a list
-                 error_message = error_info[0]
-
-            print(f"Newsdata.io API Error: {error_message}")
-            return None
+        data = get_json('newsdata', NEWSDATA_API_URL, params=params)
+        return _parse_news_response(data)
 
     except requests.exceptions.RequestException as e:
-        print(f"Error fetching news from Newsdata.io: {e}")
+        logger.error("Error fetching news from Newsdata.io: %s", e)
         return None
     except json.JSONDecodeError:
-        print("Error decoding JSON response from Newsdata.io.")
+        logger.error("Error decoding JSON response from Newsdata.io.")
+        return None
+
+async def get_newsdata_io_news_async(coin_name, language=DEFAULT_NEWS_LANGUAGE, size=3, rate_limit_wait=PROVIDER_WAIT_SECONDS):
+    """
+    Async version of get_newsdata_io_news; never blocks the event loop.
+    :param rate_limit_wait: See http_client.get_json_async.
+    """
+    if not NEWSDATA_API_KEY:
+        logger.error("Error: NEWSDATA_API_KEY not set in config.")
         return None
+
+    params = _build_news_params(coin_name, language, size)
+
+    try:
+        data = await get_json_async('newsdata', NEWSDATA_API_URL, params=params, rate_limit_wait=rate_limit_wait)
+        return _parse_news_response(data)
+
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.error("Error fetching news from Newsdata.io: %s", e)
+        return None
+    except json.JSONDecodeError:
+        logger.error("Error decoding JSON response from Newsdata.io.")
+        return None
+
+# --- Shared news (cache backend), so worker processes don't each fetch the same coin ---
+
+def _shared_news_key(coin_name):
+    return "news:" + news_store.coin_key(coin_name)
+
+def share_news(coin_name, articles):
+    """Publishes freshly fetched articles for a coin to the shared cache backend, if there is one."""
+    if shared_backend is not None and articles:
+        shared_backend.set(_shared_news_key(coin_name), articles, NEWS_STORE_MAX_AGE_SECONDS)
+
+def _get_shared_news(coin_name, size):
+    """Articles another process fetched for the coin (also kept in the local store), or None."""
+    if shared_backend is None:
+        return None
+    articles = shared_backend.get(_shared_news_key(coin_name))
+    if not articles:
+        return None
+    news_store.add_articles([coin_name], articles, refreshed=False)
+    news_store.mark_fetched(coin_name, len(articles))
+    return news_store.unique(articles)[:size]
+
+def _fetch_size(size):
+    # One upstream call returns a full page anyway; keep it all, so a later request for more articles
+    # (e.g. generate_news after the aggregator) is served from the store too
+    return max(size, NEWS_FETCH_SIZE)
+
+def _remember_fetched(coin_name, fetched, requested, size):
+    """
+    Stores freshly fetched articles (a fetch of `requested`), so repeat requests for the coin are served from
+    the store for a while (an empty result too); returns the first `size` with copies of the same story
+    collapsed (None stays None).
+    """
+    if fetched is None:
+        return None
+    news_store.add_articles([coin_name], fetched, refreshed=False)
+    news_store.mark_fetched(coin_name, requested)
+    share_news(coin_name, fetched)
+    return news_store.unique(fetched)[:size]
+
+# --- Store-first lookups (hot path for the bot and the aggregator) ---
+
+def get_coin_news(coin_name, size=3):
+    """
+    Returns news for a coin from the local article store when the background ingestor
+    has it fresh, then from the shared cache backend, otherwise fetches from Newsdata.io
+    and remembers the result. Same return contract as get_newsdata_io_news, except that
+    syndicated copies of one story come back once.
+    """
+    articles = news_store.get_articles(coin_name, limit=size)
+    if articles is not None:
+        news_store_lookups.inc('hit')
+        return articles
+    articles = _get_shared_news(coin_name, size)
+    if articles is not None:
+        news_store_lookups.inc('shared')
+        return articles
+    news_store_lookups.inc('miss')
+    requested = _fetch_size(size)
+    fetched = get_newsdata_io_news(coin_name, size=requested)
+    return _remember_fetched(coin_name, fetched, requested, size)
+
+async def get_coin_news_async(coin_name, size=3, rate_limit_wait=PROVIDER_WAIT_SECONDS):
+    """
+    Async version of get_coin_news; rate_limit_wait as in http_client.get_json_async.
+    The shared backend and the store's database are used from worker threads.
+    """
+    articles = news_store.get_articles(coin_name, limit=size)
+    if articles is not None:
+        news_store_lookups.inc('hit')
+        return articles
+    articles = await asyncio.to_thread(_get_shared_news, coin_name, size) if shared_backend is not None else None
+    if articles is not None:
+        news_store_lookups.inc('shared')
+        return articles
+    news_store_lookups.inc('miss')
+    requested = _fetch_size(size)
+    fetched = await get_newsdata_io_news_async(coin_name, size=requested, rate_limit_wait=rate_limit_wait)
+    return await asyncio.to_thread(_remember_fetched, coin_name, fetched, requested, size)
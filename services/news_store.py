@@ -0,0 +1,317 @@
+# news_store.py
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from config import (NEWS_STORE_DB_PATH, NEWS_STORE_MAX_AGE_SECONDS, NEWS_STORE_MAX_PER_COIN, NEWS_ON_DEMAND_MAX_AGE_SECONDS,
+                    NEWS_STORE_MAX_ARTICLES)
+from services.news_dedup import NearDuplicateIndex, fingerprint_article
+from services.news_index import news_index
+
+logger = logging.getLogger(__name__)
+
+# --- Local article store fed by the background news ingestor ---
+
+def _hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def article_id(article):
+    """Stable id for an article: hash of its link, or of its normalized title if there is no link."""
+    link = (article.get('link') or "").strip()
+    if link:
+        return "l:" + _hash(link)
+    return "t:" + _hash(" ".join((article.get('title') or "").lower().split()))
+
+def _title_hash(article):
+    title = " ".join((article.get('title') or "").lower().split())
+    return _hash(title) if title else None
+
+class NewsStore:
+    """
+    Articles indexed by coin key (lowercased name or symbol).
+
+    Reads are served from an in-memory index; SQLite only persists the data
+    so a restart doesn't start empty. Articles are deduplicated by link hash,
+    by title hash (the same story re-published under another URL) and by the
+    overlap of title and description (a syndicated copy with a few words changed;
+    see services/news_dedup.py). Every new article is also added to the full-text
+    index (services/news_index.py). Past max_articles the oldest stored articles are
+    dropped everywhere, database included.
+
+    The database is opened, and its articles loaded, on first use rather than at import.
+    """
+    def __init__(self, db_path=NEWS_STORE_DB_PATH, max_age=NEWS_STORE_MAX_AGE_SECONDS, max_per_coin=NEWS_STORE_MAX_PER_COIN,
+                 index=news_index, on_demand_max_age=NEWS_ON_DEMAND_MAX_AGE_SECONDS, max_articles=NEWS_STORE_MAX_ARTICLES):
+        self.db_path = db_path
+        self.max_age = max_age
+        self.on_demand_max_age = on_demand_max_age
+        self.max_per_coin = max_per_coin
+        self.max_articles = max_articles
+        self.index = index
+        self._lock = threading.Lock()
+        self._open_lock = threading.Lock()
+        self._opened = False
+        self._articles = {} # article id -> article dict, oldest stored first
+        self._title_hashes = {} # title hash -> article id
+        self._near_duplicates = NearDuplicateIndex() # fingerprints of recent articles -> article id
+        self._by_coin = {} # coin key -> list of article ids, newest first
+        self._refreshed_at = {} # coin key -> unix time of the last successful ingest
+        self._fetched = {} # coin key -> (unix time of the last on-demand fetch, articles it asked for) (memory only)
+        self._db = None
+
+    def _ensure_open(self):
+        """Opens the database and loads its articles, once. Must not be called with _lock held."""
+        if self._opened:
+            return
+        with self._open_lock:
+            if self._opened:
+                return
+            if self.db_path:
+                self._open_db(self.db_path)
+            self._opened = True
+
+    @staticmethod
+    def coin_key(coin):
+        return (coin or "").strip().lower()
+
+    def _open_db(self, db_path):
+        try:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS articles (
+                    id TEXT PRIMARY KEY, title TEXT, link TEXT, description TEXT,
+                    source_id TEXT, published_at TEXT, keywords TEXT);
+                CREATE TABLE IF NOT EXISTS article_coins (
+                    coin TEXT NOT NULL, article_id TEXT NOT NULL, PRIMARY KEY (coin, article_id));
+                CREATE TABLE IF NOT EXISTS coin_refreshes (
+                    coin TEXT PRIMARY KEY, refreshed_at REAL NOT NULL);
+            """)
+            with self._lock:
+                self._load()
+                evicted = self._prune()
+            self._delete_rows(evicted)
+        except sqlite3.Error as e:
+            logger.warning("Could not open news store database '%s', using memory only: %s", db_path, e)
+            self._db = None
+
+    def _load(self):
+        """Caller must hold the lock."""
+        for row in self._db.execute("SELECT id, title, link, description, source_id, published_at, keywords FROM articles ORDER BY rowid"):
+            article = {
+                'title': row[1], 'link': row[2], 'description': row[3],
+                'source_id': row[4], 'published_at': row[5], 'keywords': json.loads(row[6] or "[]"),
+            }
+            self._articles[row[0]] = article
+            # Copies stored before near-duplicate detection stay in the store but out of search results
+            fingerprint = fingerprint_article(article)
+            if fingerprint is None or self._near_duplicates.find(fingerprint) is None:
+                self.index.add(row[0], article)
+            if fingerprint is not None:
+                self._near_duplicates.add(row[0], fingerprint)
+            title_hash = _title_hash(article)
+            if title_hash:
+                self._title_hashes[title_hash] = row[0]
+        for coin, ids in self._group_coin_rows():
+            self._by_coin[coin] = self._newest_first(ids)[:self.max_per_coin]
+        self._refreshed_at.update(self._db.execute("SELECT coin, refreshed_at FROM coin_refreshes"))
+
+    def _group_coin_rows(self):
+        grouped = {}
+        for coin, aid in self._db.execute("SELECT coin, article_id FROM article_coins"):
+            if aid in self._articles:
+                grouped.setdefault(coin, []).append(aid)
+        return grouped.items()
+
+    def _newest_first(self, ids):
+        return sorted(ids, key=lambda aid: self._articles[aid].get('published_at') or "", reverse=True)
+
+    def _stored_id(self, article):
+        """
+        The id of the stored article telling the same story (same link, same title or near-identical
+        text), else the article's own id; with its title hash and fingerprint. Caller must hold the lock.
+        """
+        aid = article_id(article)
+        title_hash = _title_hash(article)
+        if aid in self._articles:
+            return aid, title_hash, None
+        if title_hash in self._title_hashes:
+            return self._title_hashes[title_hash], title_hash, None # same story under another link
+        fingerprint = fingerprint_article(article)
+        copy_id = self._near_duplicates.find(fingerprint) if fingerprint is not None else None
+        if copy_id in self._articles:
+            return copy_id, title_hash, fingerprint # syndicated copy, reworded a little
+        return aid, title_hash, fingerprint
+
+    def unique(self, articles):
+        """articles with later copies of the same story dropped (compared with each other and the store)."""
+        self._ensure_open()
+        seen = set()
+        kept = []
+        with self._lock:
+            for article in articles or []:
+                aid = self._stored_id(article)[0]
+                if aid not in seen:
+                    seen.add(aid)
+                    kept.append(article)
+        return kept
+
+    def add_articles(self, coins, articles, refreshed=True):
+        """
+        Stores articles under every key in coins (e.g. ["Bitcoin", "BTC"]).
+        :param refreshed: Mark these coins as freshly ingested, so reads stop falling back upstream.
+        :return: Number of articles that weren't already in the store.
+        """
+        self._ensure_open()
+        keys = [self.coin_key(c) for c in coins if c]
+        new_rows = []
+        with self._lock:
+            ids = []
+            for article in articles or []:
+                aid, title_hash, fingerprint = self._stored_id(article)
+                if aid not in self._articles:
+                    self._articles[aid] = dict(article)
+                    if title_hash:
+                        self._title_hashes[title_hash] = aid
+                    if fingerprint is not None:
+                        self._near_duplicates.add(aid, fingerprint)
+                    new_rows.append((aid, self._articles[aid]))
+                    self.index.add(aid, self._articles[aid])
+                ids.append(aid)
+            now = time.time()
+            for key in keys:
+                merged = list(dict.fromkeys(ids + self._by_coin.get(key, [])))
+                self._by_coin[key] = self._newest_first(merged)[:self.max_per_coin]
+                if refreshed:
+                    self._refreshed_at[key] = now
+            evicted = self._prune()
+        self._persist(keys, [aid for aid in ids if aid not in evicted],
+                      [(aid, a) for aid, a in new_rows if aid not in evicted], now if refreshed else None)
+        self._delete_rows(evicted)
+        return len(new_rows)
+
+    def _prune(self):
+        """Drops the oldest stored articles past max_articles; returns their ids. Caller must hold the lock."""
+        excess = len(self._articles) - self.max_articles
+        if excess <= 0:
+            return set()
+        evicted = set()
+        for aid in self._articles:
+            if len(evicted) >= excess:
+                break
+            evicted.add(aid)
+        for aid in evicted:
+            article = self._articles.pop(aid)
+            title_hash = _title_hash(article)
+            if self._title_hashes.get(title_hash) == aid:
+                del self._title_hashes[title_hash]
+            self.index.remove(aid)
+        for key, ids in self._by_coin.items():
+            if not evicted.isdisjoint(ids):
+                self._by_coin[key] = [aid for aid in ids if aid not in evicted]
+        return evicted
+
+    def _delete_rows(self, evicted):
+        if self._db is None or not evicted:
+            return
+        with self._lock:
+            try:
+                rows = [(aid,) for aid in evicted]
+                self._db.executemany("DELETE FROM article_coins WHERE article_id = ?", rows)
+                self._db.executemany("DELETE FROM articles WHERE id = ?", rows)
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning("News store cleanup failed: %s", e)
+
+    def _persist(self, keys, ids, new_rows, refreshed_at):
+        if self._db is None:
+            return
+        with self._lock:
+            try:
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO articles (id, title, link, description, source_id, published_at, keywords) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(aid, a.get('title'), a.get('link'), a.get('description'), a.get('source_id'),
+                      a.get('published_at'), json.dumps(a.get('keywords') or [])) for aid, a in new_rows])
+                self._db.executemany("INSERT OR IGNORE INTO article_coins (coin, article_id) VALUES (?, ?)",
+                                     [(key, aid) for key in keys for aid in ids])
+                if refreshed_at is not None:
+                    self._db.executemany("INSERT OR REPLACE INTO coin_refreshes (coin, refreshed_at) VALUES (?, ?)",
+                                         [(key, refreshed_at) for key in keys])
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning("News store write failed: %s", e)
+
+    def mark_fetched(self, coin, requested):
+        """
+        Serves coin from the store for on_demand_max_age after a successful on-demand fetch that asked
+        upstream for `requested` articles (it may have got fewer, if that's all there is).
+        """
+        self._fetched[self.coin_key(coin)] = (time.time(), requested)
+
+    def is_fresh(self, coin, limit=1):
+        """
+        Whether reads of up to `limit` articles for coin can be served from the store. After an on-demand
+        fetch that's only while the fetch asked for at least `limit` articles or the store has that many.
+        """
+        self._ensure_open()
+        key = self.coin_key(coin)
+        now = time.time()
+        refreshed_at = self._refreshed_at.get(key)
+        if refreshed_at is not None and now - refreshed_at <= self.max_age:
+            return True
+        fetched_at, requested = self._fetched.get(key, (None, 0))
+        if fetched_at is None or now - fetched_at > self.on_demand_max_age:
+            return False
+        return requested >= limit or len(self._by_coin.get(key, ())) >= limit
+
+    def get_articles(self, coin, limit=3):
+        """
+        Returns up to `limit` newest articles for coin, or None if the coin hasn't been
+        ingested recently (the caller should then fetch upstream).
+        """
+        key = self.coin_key(coin)
+        if not self.is_fresh(key, limit):
+            return None
+        ids = self._by_coin.get(key, [])
+        return [dict(self._articles[aid]) for aid in ids[:limit]]
+
+    @property
+    def persistent(self):
+        self._ensure_open()
+        return self._db is not None
+
+    def export(self):
+        """Articles by coin with their refresh times, for saving across restarts when there is no database."""
+        self._ensure_open()
+        with self._lock:
+            return {
+                'coins': {key: [self._articles[aid] for aid in ids] for key, ids in self._by_coin.items()},
+                'refreshed_at': dict(self._refreshed_at),
+            }
+
+    def restore(self, exported):
+        """Adds exported articles back, keeping their coins' refresh times (so fresh coins need no fetch)."""
+        for key, articles in exported.get('coins', {}).items():
+            self.add_articles([key], articles, refreshed=False)
+        with self._lock:
+            for key, refreshed_at in exported.get('refreshed_at', {}).items():
+                if refreshed_at > self._refreshed_at.get(key, 0):
+                    self._refreshed_at[key] = refreshed_at
+
+    def search(self, query, limit=5, coin=None):
+        """
+        The stored articles most relevant to query (coin name, symbol or phrase), from the full-text index.
+        :param coin: Only rank the articles stored under this coin (every batch fetched or ingested for it).
+        """
+        self._ensure_open()
+        doc_ids = None
+        if coin is not None:
+            with self._lock:
+                doc_ids = set(self._by_coin.get(self.coin_key(coin), ()))
+            if not doc_ids:
+                return []
+        return self.index.search(query, limit, doc_ids)
+
+news_store = NewsStore()
@@ -0,0 +1,185 @@
+# price_history.py
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from config import PRICE_HISTORY_DIR, PRICE_HISTORY_INITIAL_CAPACITY, PRICE_HISTORY_ENABLED
+from services.market_data import quote_listeners
+
+logger = logging.getLogger(__name__)
+
+# --- Append-only, memory-mapped columnar price history per symbol ---
+
+# Windows for the precomputed rolling stats, in seconds
+STAT_WINDOWS = {'1h': 3600, '24h': 86400, '7d': 7 * 86400}
+COLUMNS = ('ts', 'price', 'volume')
+
+_SAFE_SYMBOL = re.compile(r"[^A-Z0-9_-]")
+
+def _parse_timestamp(value):
+    """CMC 'last_updated' (ISO 8601) -> unix seconds; now if missing or unparseable."""
+    if value:
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+        except (ValueError, AttributeError):
+            pass
+    return time.time()
+
+class _Series:
+    """Three float64 columns (ts, price, volume), each a memory-mapped file grown by doubling."""
+    def __init__(self, directory, capacity):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        paths = {c: os.path.join(directory, f"{c}.f64") for c in COLUMNS}
+        if os.path.exists(paths['ts']):
+            capacity = max(os.path.getsize(paths['ts']) // 8, 1)
+        self.capacity = capacity
+        self.columns = {c: self._map(paths[c], capacity) for c in COLUMNS}
+        # Unused slots are zero, and timestamps are always > 0
+        self.count = int(np.count_nonzero(self.columns['ts']))
+
+    @staticmethod
+    def _map(path, capacity):
+        with open(path, 'ab') as f:
+            if f.tell() < capacity * 8:
+                f.truncate(capacity * 8)
+        return np.memmap(path, dtype=np.float64, mode='r+', shape=(capacity,))
+
+    def _grow(self):
+        new_capacity = self.capacity * 2
+        for c in COLUMNS:
+            column = self.columns[c]
+            column.flush()
+            path = column.filename
+            del column
+            self.columns[c] = self._map(path, new_capacity)
+        self.capacity = new_capacity
+
+    def append(self, ts, price, volume):
+        if self.count and ts <= self.columns['ts'][self.count - 1]:
+            return False # same or older quote than the last one we stored
+        if self.count == self.capacity:
+            self._grow()
+        i = self.count
+        self.columns['ts'][i] = ts
+        self.columns['price'][i] = price
+        self.columns['volume'][i] = volume
+        self.count += 1
+        return True
+
+    def view(self, column):
+        return self.columns[column][:self.count]
+
+def _window_stats(ts, price, since):
+    start = int(np.searchsorted(ts, since, side='left'))
+    window = price[start:]
+    if window.size == 0:
+        return None
+    stats = {
+        'points': int(window.size),
+        'min': float(window.min()),
+        'max': float(window.max()),
+        'mean': float(window.mean()),
+        'change_pct': float((window[-1] / window[0] - 1.0) * 100.0) if window[0] else None,
+        'volatility_pct': None,
+    }
+    if window.size > 2:
+        # Standard deviation of per-sample log returns, in percent
+        stats['volatility_pct'] = float(np.std(np.diff(np.log(window))) * 100.0)
+    return stats
+
+class PriceHistory:
+    """
+    Per-symbol price/volume history in append-only memory-mapped columns.
+    Rolling stats for STAT_WINDOWS are recomputed on each append and kept in memory,
+    so readers (the prompt builder) get them without touching disk.
+    """
+    def __init__(self, directory=PRICE_HISTORY_DIR, initial_capacity=PRICE_HISTORY_INITIAL_CAPACITY):
+        self.directory = directory
+        self.initial_capacity = initial_capacity
+        self._series = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._load_existing()
+
+    def _load_existing(self):
+        """Opens the series already on disk so their stats are available right after a restart."""
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            try:
+                series = self._get_series(name)
+            except OSError as e:
+                logger.warning("Could not open price history for %s: %s", name, e)
+                continue
+            if series.count:
+                self._stats[name] = self._compute_stats(series)
+
+    def _get_series(self, symbol):
+        series = self._series.get(symbol)
+        if series is None:
+            series = _Series(os.path.join(self.directory, _SAFE_SYMBOL.sub('_', symbol)), self.initial_capacity)
+            self._series[symbol] = series
+        return series
+
+    def record(self, symbol, price, volume=None, ts=None):
+        """Appends one observation; ignored if it isn't newer than the last one. Returns True if stored."""
+        if not symbol or not isinstance(price, (int, float)):
+            return False
+        symbol = symbol.upper()
+        ts = ts if ts is not None else time.time()
+        with self._lock:
+            try:
+                series = self._get_series(symbol)
+            except OSError as e:
+                logger.warning("Could not open price history for %s: %s", symbol, e)
+                return False
+            if not series.append(ts, float(price), float(volume) if isinstance(volume, (int, float)) else np.nan):
+                return False
+            self._stats[symbol] = self._compute_stats(series)
+            return True
+
+    def record_quote(self, coin_data):
+        """Quote listener: stores a parsed CMC quote/listing entry."""
+        if coin_data:
+            self.record(coin_data.get('symbol'), coin_data.get('price_usd'),
+                        coin_data.get('volume_24h_usd'), _parse_timestamp(coin_data.get('last_updated')))
+
+    @staticmethod
+    def _compute_stats(series):
+        ts, price = series.view('ts'), series.view('price')
+        now = ts[-1]
+        return {name: _window_stats(ts, price, now - seconds) for name, seconds in STAT_WINDOWS.items()}
+
+    def get_stats(self, symbol):
+        """Precomputed {window: stats or None} for symbol, or None if we have no history. No I/O."""
+        return self._stats.get(symbol.upper()) if symbol else None
+
+    def range(self, symbol, start, end=None):
+        """
+        Observations with start <= ts <= end as (ts, price, volume) arrays.
+        The arrays are read-only views onto the memory-mapped columns.
+        """
+        with self._lock:
+            try:
+                series = self._get_series(symbol.upper())
+            except OSError:
+                return None
+            ts = series.view('ts')
+            lo = int(np.searchsorted(ts, start, side='left'))
+            hi = int(np.searchsorted(ts, end, side='right')) if end is not None else series.count
+            result = tuple(series.view(c)[lo:hi] for c in COLUMNS)
+        for column in result:
+            column.flags.writeable = False
+        return result
+
+price_history = PriceHistory()
+
+# Every quote and listing entry fetched anywhere in the process feeds the history
+if PRICE_HISTORY_ENABLED:
+    quote_listeners.append(price_history.record_quote)
@@ -0,0 +1,157 @@
+# prompt_builder.py
+import math
+import re
+import time
+from datetime import datetime, timezone
+
+from config import NEWS_RECENCY_HALF_LIFE_HOURS
+
+# --- Token-budgeted prompt assembly ---
+# Prompts are built from sections in priority order (instructions, question, market data, news),
+# each charged against a hard token budget, so prompt size and with it latency and cost stay bounded.
+
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+
+def estimate_tokens(text):
+    """
+    Estimates how many Gemini tokens `text` takes, without a count_tokens round trip.
+    Words cost one token per ~4 characters and every punctuation mark one token, which tracks
+    the real tokenizer on tables and numbers better than a flat characters / 4.
+    """
+    if not text:
+        return 0
+    return sum(math.ceil(len(piece) / 4) for piece in _TOKEN_PIECES.findall(text))
+
+class PromptBudget:
+    """
+    Collects prompt sections up to `max_tokens`. Sections that don't fit are skipped, so
+    add the ones that matter most first; required sections are always kept.
+    """
+    def __init__(self, max_tokens):
+        self.max_tokens = max_tokens
+        self.used = 0
+        self.parts = []
+
+    @property
+    def remaining(self):
+        return max(0, self.max_tokens - self.used)
+
+    def fits(self, text):
+        return estimate_tokens(text) <= self.remaining
+
+    def add(self, text, required=False):
+        """Appends a section if it fits (or is required). Returns True if it was added."""
+        tokens = estimate_tokens(text)
+        if not required and tokens > self.remaining:
+            return False
+        self.parts.append(text)
+        self.used += tokens
+        return True
+
+    def render(self):
+        return "\n".join(self.parts)
+
+# --- Compact market encoding ---
+
+def compact_number(value, money=False):
+    """1234567890 -> '1.23B', 0.00001234 -> '1.234e-05'; 'n/a' for missing values."""
+    if not isinstance(value, (int, float)):
+        return "n/a"
+    prefix = "$" if money else ""
+    for threshold, suffix in ((1e12, "T"), (1e9, "B"), (1e6, "M")):
+        if abs(value) >= threshold:
+            return f"{prefix}{value / threshold:.2f}{suffix}"
+    return f"{prefix}{value:,.2f}" if abs(value) >= 1 else f"{prefix}{value:.4g}"
+
+def _percent(value):
+    return f"{value:+.2f}%" if isinstance(value, (int, float)) else "n/a"
+
+def market_table(coins):
+    """
+    Market fields of one or more coins as a pipe-separated table: one header row, one row per coin.
+    Far fewer tokens than a labelled line per field, and the model reads it just as well.
+    """
+    lines = ["coin|price_usd|chg_24h|mcap_usd|vol_24h_usd|rank|updated"]
+    for coin in coins:
+        lines.append("|".join([
+            f"{coin.get('name', 'n/a')} ({coin.get('symbol', 'n/a')})",
+            compact_number(coin.get('price_usd')),
+            _percent(coin.get('percent_change_24h')),
+            compact_number(coin.get('market_cap_usd')),
+            compact_number(coin.get('volume_24h_usd')),
+            str(coin.get('rank') or "n/a"),
+            (coin.get('last_updated') or "n/a")[:16],
+        ]))
+    return "\n".join(lines)
+
+def price_stats_table(price_stats):
+    """Local price history windows (see price_history.get_stats) as a table, or '' if there are none."""
+    rows = [(window, stats) for window, stats in (price_stats or {}).items() if stats]
+    if not rows:
+        return ""
+    lines = ["window|min|max|mean|chg|volatility|samples"]
+    for window, stats in rows:
+        lines.append("|".join([window, compact_number(stats['min']), compact_number(stats['max']),
+                               compact_number(stats['mean']), _percent(stats.get('change_pct')),
+                               _percent(stats.get('volatility_pct')).lstrip("+"), str(stats['points'])]))
+    return "\n".join(lines)
+
+# --- News ranking and truncation ---
+
+def published_timestamp(article):
+    """Newsdata.io dates look like '2024-05-01 12:34:56' (UTC); None if missing or unparseable."""
+    published = article.get('published_at') or article.get('pubDate')
+    if not published:
+        return None
+    try:
+        return datetime.strptime(published[:19], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        return None
+
+def relevance(article, terms):
+    """How much an article is about the coin: title mentions count double, keywords and description once."""
+    title = (article.get('title') or "").lower()
+    description = (article.get('description') or "").lower()
+    keywords = " ".join(k for k in article.get('keywords') or [] if isinstance(k, str)).lower()
+    score = 0.0
+    for term in terms:
+        score += 2.0 * (term in title) + (term in keywords) + (term in description)
+    return score
+
+def rank_articles(articles, terms=(), now=None, half_life_hours=NEWS_RECENCY_HALF_LIFE_HOURS):
+    """
+    Orders articles by relevance to `terms` (lowercase coin name / symbol), discounted by age:
+    an article loses half its weight every half_life_hours. Undated articles count as one half-life old.
+    """
+    now = now if now is not None else time.time()
+    terms = [t.lower() for t in terms if t]
+    half_life = half_life_hours * 3600.0
+
+    def score(article):
+        published = published_timestamp(article)
+        age = max(0.0, now - published) if published is not None else half_life
+        return (1.0 + relevance(article, terms)) * 0.5 ** (age / half_life)
+
+    return sorted((a for a in articles or [] if a), key=score, reverse=True)
+
+def _shorten(text, max_chars):
+    text = " ".join((text or "").split())
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0] + "..."
+
+def add_articles(budget, articles, max_articles, description_chars, with_links=False):
+    """
+    Adds numbered articles to `budget`, best first, while they fit. An article whose description
+    doesn't fit is added by headline only. Returns how many articles were added.
+    """
+    added = 0
+    for article in articles[:max_articles]:
+        line = f"{added + 1}. {article.get('title') or 'No title'} ({article.get('source_id') or 'unknown source'})"
+        if with_links and article.get('link'):
+            line += f" {article['link']}"
+        description = _shorten(article.get('description'), description_chars) if description_chars else ""
+        if not (description and budget.add(f"{line}\n   {description}")) and not budget.add(line):
+            break
+        added += 1
+    return added
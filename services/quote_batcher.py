@@ -0,0 +1,70 @@
+# quote_batcher.py
+import asyncio
+
+# --- Micro-batching collector for CoinMarketCap quote lookups ---
+
+class QuoteBatcher:
+    """
+    Collects symbol lookups issued by concurrent coroutines during a short window
+    and resolves them with a single batched upstream call.
+
+    :param fetch_many: Coroutine function taking a list of symbols and returning
+                       a dict of SYMBOL -> coin data (missing symbols are simply absent).
+    :param window: Seconds to wait for more lookups after the first one arrives.
+    :param max_batch: Flush immediately once this many distinct symbols are pending.
+    """
+    def __init__(self, fetch_many, window=0.05, max_batch=100):
+        self.fetch_many = fetch_many
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = {} # SYMBOL -> list of futures waiting for it
+        self._flush_handle = None
+        self._tasks = set() # in-flight _resolve tasks; the loop only keeps weak references to them
+        self.batches_sent = 0
+        self.symbols_requested = 0
+
+    async def get(self, symbol):
+        """Returns coin data for symbol (or None), sharing an upstream call with concurrent lookups."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(symbol.upper(), []).append(future)
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        task = asyncio.ensure_future(self._resolve(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _resolve(self, batch):
+        self.batches_sent += 1
+        self.symbols_requested += len(batch)
+        try:
+            results = await self.fetch_many(list(batch)) or {}
+        except Exception as e:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        except BaseException:
+            # Cancelled (e.g. at shutdown): cancel the callers' futures too, or they'd wait forever
+            for futures in batch.values():
+                for future in futures:
+                    future.cancel()
+            raise
+        for symbol, futures in batch.items():
+            for future in futures:
+                if not future.done():
+                    future.set_result(results.get(symbol))
@@ -0,0 +1,131 @@
+# snapshot.py
+import asyncio
+import json
+import logging
+import os
+import time
+import zlib
+
+try:
+    import msgpack
+except ImportError: # optional: without it the snapshot is compressed JSON
+    msgpack = None
+
+from config import WARM_SNAPSHOT_PATH, WARM_SNAPSHOT_INTERVAL_SECONDS, WARM_SNAPSHOT_MAX_AGE_SECONDS
+from services.answer_cache import answer_cache
+from services.coin_resolver import coin_resolver
+from services.listings import listings_service
+from services.market_data import quote_cache
+from services.news_store import news_store
+
+logger = logging.getLogger(__name__)
+
+# --- Warm start: the in-memory caches saved to one file, restored when the process starts ---
+
+FORMAT_VERSION = 1
+_MSGPACK = b"M"
+_JSON = b"J"
+
+def encode(state):
+    """msgpack when it's installed, else zlib-compressed JSON; the first byte says which."""
+    if msgpack is not None:
+        return _MSGPACK + msgpack.packb(state, use_bin_type=True)
+    return _JSON + zlib.compress(json.dumps(state, separators=(",", ":"), default=str).encode("utf-8"), 1)
+
+def decode(data):
+    kind, payload = data[:1], data[1:]
+    if kind == _MSGPACK:
+        if msgpack is None:
+            raise ValueError("the snapshot was written with msgpack, which isn't installed")
+        return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+    if kind == _JSON:
+        return json.loads(zlib.decompress(payload))
+    raise ValueError("not a warm-start snapshot")
+
+class WarmSnapshot:
+    """
+    Saves what a new process would otherwise rebuild from upstream: the listings snapshot, the coin
+    resolver's coin map, live quotes, generated answers, and the news store when it has no database
+    of its own. load() puts it back, so the first requests after a restart are answered from local,
+    slightly stale data while the usual refreshes revalidate it in the background.
+    """
+    def __init__(self, path=WARM_SNAPSHOT_PATH, interval=WARM_SNAPSHOT_INTERVAL_SECONDS, max_age=WARM_SNAPSHOT_MAX_AGE_SECONDS):
+        self.path = path
+        self.interval = interval
+        self.max_age = max_age
+
+    def collect(self):
+        listings = listings_service.snapshot
+        state = {
+            'version': FORMAT_VERSION,
+            'written_at': time.time(),
+            'listings': {'fetched_at': listings.fetched_at, 'coins': list(listings.coins)},
+            'resolver': coin_resolver.coins or [],
+            'quotes': quote_cache.export(),
+            'answers': answer_cache.memory.export(),
+        }
+        if not news_store.persistent:
+            state['news'] = news_store.export()
+        return state
+
+    def save(self):
+        """Writes the snapshot (atomically: readers never see half a file). Returns the size written, 0 on failure."""
+        if not self.path:
+            return 0
+        try:
+            data = encode(self.collect())
+            temporary = self.path + ".tmp"
+            with open(temporary, "wb") as f:
+                f.write(data)
+            os.replace(temporary, self.path)
+            return len(data)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning("Could not write the warm-start snapshot '%s': %s", self.path, e)
+            return 0
+
+    def load(self):
+        """
+        Restores the caches from the snapshot, if there is a recent enough one.
+        :return: Counts of restored items per section, or None if nothing was restored.
+        """
+        if not self.path or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "rb") as f:
+                state = decode(f.read())
+        except (OSError, ValueError, zlib.error) as e:
+            logger.warning("Could not read the warm-start snapshot '%s': %s", self.path, e)
+            return None
+        age = time.time() - state.get('written_at', 0)
+        if state.get('version') != FORMAT_VERSION or age > self.max_age:
+            logger.info("Ignoring the warm-start snapshot: written %.0fs ago, version %s", age, state.get('version'))
+            return None
+
+        restored = {}
+        # A coin map this process already fetched is newer than the saved one
+        if state['resolver'] and coin_resolver.coins is None:
+            coin_resolver.rebuild(state['resolver'])
+            restored['resolver'] = len(state['resolver'])
+        listings = state['listings']
+        if listings_service.restore(listings['coins'], listings['fetched_at']):
+            restored['listings'] = len(listings['coins'])
+        restored['quotes'] = quote_cache.restore(state['quotes'])
+        restored['answers'] = answer_cache.memory.restore(state['answers'])
+        if 'news' in state and not news_store.persistent:
+            news_store.restore(state['news'])
+            restored['news_coins'] = len(state['news'].get('coins', {}))
+        logger.info("Warm start from a snapshot written %.0fs ago: %s", age, restored)
+        return restored
+
+    async def run_forever_async(self):
+        """Saves every `interval` seconds until cancelled (run as a task next to the bot)."""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.save)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Saving the warm-start snapshot failed: %s", e)
+
+warm_snapshot = WarmSnapshot()
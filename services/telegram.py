@@ -0,0 +1,101 @@
+# telegram.py
+import asyncio
+import logging
+import time
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from config import (TELEGRAM_API_URL, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_SECRET,
+                    WEBHOOK_MAX_CONNECTIONS, SHUTDOWN_DRAIN_SECONDS)
+
+logger = logging.getLogger(__name__)
+
+# --- Telegram plumbing shared by bot.py and cluster.py: the Bot client and the webhook server ---
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+def create_bot(token):
+    """A Bot talking to TELEGRAM_API_URL if set (self-hosted Bot API server or a local stub), else to Telegram."""
+    if TELEGRAM_API_URL:
+        return Bot(token=token, session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)))
+    return Bot(token=token)
+
+async def register_webhook(bot, url=WEBHOOK_URL, path=WEBHOOK_PATH):
+    """Points Telegram at our webhook. Without WEBHOOK_URL (local testing) nothing is registered."""
+    if not url:
+        logger.info("WEBHOOK_URL is not set; not registering the webhook with Telegram")
+        return False
+    await bot.set_webhook(url.rstrip("/") + path, secret_token=WEBHOOK_SECRET or None,
+                          max_connections=WEBHOOK_MAX_CONNECTIONS, drop_pending_updates=True)
+    return True
+
+class WebhookServer:
+    """
+    Receives Telegram updates as HTTP POSTs on `path`.
+
+    accept(update) is an async callable taking the raw update dict; it returns False when there is
+    no room for the update, and the delivery is then answered with 503 so Telegram retries it later
+    instead of us queueing without bound. At most `concurrency` deliveries are taken in at once.
+    stop() refuses new deliveries and waits for the ones in flight before closing.
+    """
+    def __init__(self, accept, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET, concurrency=WEBHOOK_MAX_CONNECTIONS):
+        self._accept = accept
+        self.path = path
+        self.secret = secret
+        self.concurrency = concurrency
+        self._slots = None
+        self._in_flight = 0
+        self._draining = False
+        self._runner = None
+        self.accepted = 0
+        self.rejected = 0
+
+    async def _handle(self, request):
+        if self.secret and request.headers.get(SECRET_HEADER) != self.secret:
+            return web.Response(status=401)
+        if self._draining:
+            return web.Response(status=503)
+        try:
+            update = await request.json()
+        except ValueError:
+            return web.Response(status=400, text="invalid JSON")
+        if not isinstance(update, dict) or 'update_id' not in update:
+            return web.Response(status=400, text="not a Telegram update")
+
+        self._in_flight += 1
+        try:
+            async with self._slots:
+                accepted = await self._accept(update)
+        except Exception:
+            logger.exception("Handling webhook update %s failed", update.get('update_id'))
+            accepted = True # redelivering an update that breaks a handler would only break it again
+        finally:
+            self._in_flight -= 1
+        if not accepted:
+            self.rejected += 1
+            return web.Response(status=503)
+        self.accepted += 1
+        return web.Response(status=200)
+
+    async def start(self, host=WEBHOOK_HOST, port=WEBHOOK_PORT):
+        """Starts serving from the running event loop. Returns self."""
+        self._slots = asyncio.Semaphore(self.concurrency)
+        app = web.Application()
+        app.router.add_post(self.path, self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info("Webhook server listening on %s:%s%s", host, port, self.path)
+        return self
+
+    async def stop(self, timeout=SHUTDOWN_DRAIN_SECONDS):
+        """Refuses new deliveries, waits up to timeout seconds for those in flight, then closes the server."""
+        self._draining = True
+        deadline = time.monotonic() + timeout
+        while self._in_flight and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self._runner is not None:
+            await self._runner.cleanup()
@@ -0,0 +1,101 @@
+# test_admission.py
+import asyncio
+import time
+
+from services.admission import ChatLimiter, FairScheduler, TokenBucket, provider_limits, report_limits
+
+def test_interactive_call_gets_a_token_while_a_report_runs():
+    async def report(bucket):
+        # a bulk report keeps waiting for tokens at its own share of the limit
+        while await bucket.acquire_async(timeout=120):
+            pass
+
+    async def scenario():
+        task = asyncio.ensure_future(report(report_limits['gemini']))
+        await asyncio.sleep(0.05) # the report has taken every token of its share and is waiting
+        try:
+            return await provider_limits['gemini'].acquire_async(timeout=0.1)
+        finally:
+            task.cancel()
+
+    assert asyncio.run(scenario())
+
+def test_acquire_async_waits_for_the_next_token():
+    bucket = TokenBucket(rate=20, capacity=1) # a token every 50ms
+
+    async def scenario():
+        assert await bucket.acquire_async(timeout=0)
+        started = time.monotonic()
+        assert await bucket.acquire_async(timeout=1)
+        return time.monotonic() - started
+
+    assert 0.03 <= asyncio.run(scenario()) < 0.5
+
+def test_acquire_async_gives_up_at_the_timeout():
+    bucket = TokenBucket(rate=1, capacity=1) # the next token is a second away
+
+    async def scenario():
+        assert await bucket.acquire_async(timeout=0)
+        started = time.monotonic()
+        taken = await bucket.acquire_async(timeout=0.1)
+        return taken, time.monotonic() - started
+
+    taken, waited = asyncio.run(scenario())
+    assert not taken
+    assert waited < 0.1 # gives up at once when the wait can't fit in the timeout
+
+def test_sync_acquire_waits_and_gives_up():
+    bucket = TokenBucket(rate=20, capacity=1)
+    assert bucket.acquire(timeout=0)
+    assert bucket.acquire(timeout=1)
+    assert not TokenBucket(rate=0, capacity=0).acquire(timeout=0.1)
+
+def test_chat_limiter_limits_each_chat_separately():
+    limiter = ChatLimiter(per_minute=1, burst=2)
+    assert [limiter.allow(1) for _ in range(3)] == [True, True, False]
+    assert limiter.allow(2)
+
+def test_chat_limiter_drops_idle_chats():
+    limiter = ChatLimiter(per_minute=1, burst=1, max_chats=2)
+    for chat_id in (1, 2, 3):
+        limiter.allow(chat_id)
+    assert list(limiter._buckets) == [2, 3]
+
+def test_scheduler_takes_chats_round_robin():
+    order = []
+
+    def job(name):
+        async def run():
+            order.append(name)
+        return run
+
+    async def scenario():
+        scheduler = FairScheduler(concurrency=1, max_queue=10, max_pending_per_chat=5)
+        for name in ("a1", "a2", "a3"):
+            assert scheduler.submit("a", job(name))
+        for name in ("b1", "b2"):
+            assert scheduler.submit("b", job(name))
+        assert scheduler.submit("c", job("c1"))
+        assert await scheduler.drain(timeout=1)
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+    # chat a queued three requests first, but b and c don't wait behind all of them
+    assert order == ["a1", "b1", "c1", "a2", "b2", "a3"]
+
+def test_scheduler_sheds_load_when_full():
+    async def idle():
+        await asyncio.sleep(0)
+
+    async def scenario():
+        scheduler = FairScheduler(concurrency=1, max_queue=3, max_pending_per_chat=2)
+        accepted = [scheduler.submit("a", idle), scheduler.submit("a", idle), scheduler.submit("a", idle), # per-chat cap
+                    scheduler.submit("b", idle), scheduler.submit("c", idle)] # queue cap
+        shed = scheduler.shed
+        await scheduler.drain(timeout=1)
+        await scheduler.stop()
+        return accepted, shed
+
+    accepted, shed = asyncio.run(scenario())
+    assert accepted == [True, True, False, True, False]
+    assert shed == 2
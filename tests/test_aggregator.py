@@ -0,0 +1,26 @@
+# test_aggregator.py
+import asyncio
+
+from services.aggregator import _await_within
+
+def test_fetch_past_its_deadline_keeps_running():
+    finished = []
+
+    async def slow_fetch():
+        await asyncio.sleep(0.2)
+        finished.append(True)
+        return "late"
+
+    async def scenario():
+        assert await _await_within(slow_fetch(), 0.05, "Test", "news_fetch") is None
+        await asyncio.sleep(0.3)
+
+    asyncio.run(scenario())
+    # Not cancelled: its result still reaches the caches and the circuit breaker sees the outcome
+    assert finished == [True]
+
+def test_fetch_within_its_deadline():
+    async def fetch():
+        return "data"
+
+    assert asyncio.run(_await_within(fetch(), 1, "Test", "news_fetch")) == "data"
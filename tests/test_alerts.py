@@ -0,0 +1,83 @@
+# test_alerts.py
+import math
+import random
+
+from services.alerts import ABOVE, BELOW, WATCH, AlertBook
+
+def _reference_evaluate(subs, prices):
+    """evaluate() written as a plain loop over (kind, symbol, threshold, ref) dicts."""
+    triggered = []
+    for sub in list(subs):
+        price = prices.get(sub['symbol'])
+        if price is None:
+            continue
+        if sub['kind'] == WATCH:
+            if math.isnan(sub['ref']):
+                sub['ref'] = price
+            elif abs(price / sub['ref'] - 1.0) * 100.0 >= sub['threshold']:
+                triggered.append((sub['id'], price, sub['ref']))
+                sub['ref'] = price
+        elif (sub['kind'] == ABOVE and price >= sub['threshold']) or (sub['kind'] == BELOW and price <= sub['threshold']):
+            triggered.append((sub['id'], price, sub['ref']))
+            subs.remove(sub)
+    return triggered
+
+def test_evaluate_matches_a_plain_loop():
+    rng = random.Random(7)
+    symbols = ["BTC", "ETH", "SOL", "DOGE"]
+    book = AlertBook(path=None)
+    reference = []
+    for chat_id in range(40):
+        symbol = rng.choice(symbols)
+        kind = rng.choice([WATCH, ABOVE, BELOW])
+        if kind == WATCH:
+            threshold = rng.choice([1, 2, 5])
+            sub = book.add_watch(chat_id, symbol, threshold)
+        else:
+            threshold = rng.uniform(80, 120)
+            sub = book.add_alert(chat_id, symbol, '>' if kind == ABOVE else '<', threshold)
+        reference.append({'id': sub.id, 'symbol': symbol, 'kind': kind, 'threshold': float(threshold), 'ref': float('nan')})
+
+    prices = dict.fromkeys(symbols, 100.0)
+    for _ in range(30):
+        prices = {symbol: price * rng.uniform(0.96, 1.04) for symbol, price in prices.items()}
+        tick = {symbol: price for symbol, price in prices.items() if rng.random() > 0.1} # some quotes missing
+        got = [(sub.id, price, ref) for sub, price, ref in book.evaluate(tick)]
+        assert _comparable(got) == _comparable(_reference_evaluate(reference, tick))
+        assert len(book) == len(reference)
+
+def _comparable(triggered):
+    # one-shot alerts have no reference price (NaN, which never equals itself)
+    return sorted((sub_id, price, None if math.isnan(ref) else ref) for sub_id, price, ref in triggered)
+
+def test_one_shot_alert_fires_once_and_is_removed():
+    book = AlertBook(path=None)
+    book.add_alert(1, "ETH", '>', 4000)
+    book.add_alert(1, "BTC", '<', 50000)
+    assert book.evaluate({'ETH': 3999.0, 'BTC': 50001.0}) == []
+    fired = book.evaluate({'ETH': 4000.0, 'BTC': 50001.0})
+    assert [(sub.symbol, price) for sub, price, _ in fired] == [("ETH", 4000.0)]
+    assert book.evaluate({'ETH': 4100.0}) == []
+    assert [sub.symbol for sub in book.for_chat(1)] == ["BTC"]
+
+def test_watch_repeats_from_the_new_reference_price():
+    book = AlertBook(path=None)
+    book.add_watch(1, "SOL", 5)
+    assert book.evaluate({'SOL': 100.0}) == [] # first price is the reference
+    assert book.evaluate({'SOL': 104.0}) == []
+    assert [(price, ref) for _, price, ref in book.evaluate({'SOL': 95.0})] == [(95.0, 100.0)]
+    assert [(price, ref) for _, price, ref in book.evaluate({'SOL': 100.0})] == [(100.0, 95.0)]
+
+def test_subscriptions_survive_a_restart(tmp_path):
+    path = str(tmp_path / "alerts.json")
+    book = AlertBook(path=path)
+    book.add_watch(1, "SOL", 5)
+    book.add_alert(2, "ETH", '>', 4000)
+    book.evaluate({'SOL': 100.0})
+    assert book.save()
+
+    restored = AlertBook(path=path)
+    assert restored.load() == 2
+    assert sorted(sub.describe() for sub in restored.for_chat(1) + restored.for_chat(2)) == ["alert ETH > 4000", "watch SOL ±5%"]
+    # the watch kept its reference price
+    assert [(price, ref) for _, price, ref in restored.evaluate({'SOL': 110.0})] == [(110.0, 100.0)]
@@ -0,0 +1,129 @@
+# test_cache.py
+import asyncio
+import threading
+import time
+
+from services.cache import TTLCache
+
+def test_concurrent_misses_share_one_load():
+    cache = TTLCache(ttl=60)
+    calls = []
+    release = threading.Event()
+
+    def loader():
+        calls.append(1)
+        release.wait(5)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("k", loader))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while cache.coalesced < 7 and time.monotonic() < deadline: # everyone but the leader is waiting
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert calls == [1]
+    assert results == ["value"] * 8
+    assert cache.get("k") == "value"
+
+def test_concurrent_async_misses_share_one_load():
+    cache = TTLCache(ttl=60)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_load_async("k", loader) for _ in range(8)))
+
+    assert asyncio.run(scenario()) == ["value"] * 8
+    assert calls == [1]
+    assert cache.stats()['coalesced'] == 7
+
+def test_load_error_reaches_every_waiter_and_is_not_cached():
+    cache = TTLCache(ttl=60)
+    release = threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise ValueError("upstream down")
+
+    errors = []
+    def call():
+        try:
+            cache.get_or_load("k", failing)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while cache.coalesced < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(errors) == 4
+    assert cache.get_or_load("k", lambda: "recovered") == "recovered"
+
+def test_async_load_error_reaches_every_waiter_and_is_not_cached():
+    cache = TTLCache(ttl=60)
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        raise ValueError("upstream down")
+
+    async def recovered():
+        return "recovered"
+
+    async def scenario():
+        results = await asyncio.gather(*(cache.get_or_load_async("k", failing) for _ in range(4)), return_exceptions=True)
+        return results, await cache.get_or_load_async("k", recovered)
+
+    results, after = asyncio.run(scenario())
+    assert calls == [1]
+    assert all(isinstance(r, ValueError) for r in results)
+    assert after == "recovered"
+
+def test_none_is_returned_but_not_cached():
+    cache = TTLCache(ttl=60)
+    assert cache.get_or_load("k", lambda: None) is None
+    assert cache.get_or_load("k", lambda: "value") == "value"
+
+def test_entries_expire_after_the_ttl():
+    cache = TTLCache(ttl=0.05)
+    cache.set("k", "value")
+    assert cache.get("k") == "value"
+    time.sleep(0.1)
+    assert cache.get("k") is None
+    assert len(cache) == 0
+    assert cache.get_or_load("k", lambda: "reloaded") == "reloaded"
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(ttl=60, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1
+
+def test_export_skips_expired_entries():
+    cache = TTLCache(ttl=60)
+    cache.set("old", 1, ttl=0.05)
+    cache.set("live", 2)
+    time.sleep(0.1)
+    restored = TTLCache(ttl=60)
+    assert restored.restore(cache.export()) == 1
+    assert restored.get("live") == 2
@@ -0,0 +1,46 @@
+# test_cluster.py
+import json
+import queue
+
+from cluster import WorkerPool, chat_id_of, worker_environment, worker_for
+
+def _update(update_id, chat_id):
+    return {'update_id': update_id, 'message': {'message_id': update_id, 'chat': {'id': chat_id, 'type': 'private'},
+                                                'from': {'id': chat_id}, 'text': f"message {update_id}"}}
+
+def _drain(updates):
+    # A multiprocessing queue hands items over through a feeder thread; empty() may be True right after put()
+    routed = []
+    while True:
+        try:
+            routed.append(json.loads(updates.get(timeout=0.5)))
+        except queue.Empty:
+            return routed
+
+def test_same_chat_always_goes_to_the_same_worker():
+    pool = WorkerPool(workers=2, queue_size=100) # queues only; no worker processes are started
+    chats = (1001, 1002)
+    assert worker_for(chats[0], 2) != worker_for(chats[1], 2)
+    for update_id in range(10):
+        assert pool.try_route(_update(update_id, chats[update_id % 2]))
+
+    for updates in pool.queues:
+        routed = _drain(updates)
+        assert len(routed) == 5
+        assert len({chat_id_of(u) for u in routed}) == 1 # one chat per worker
+        assert [u['update_id'] for u in routed] == sorted(u['update_id'] for u in routed) # in arrival order
+        assert pool.queues.index(updates) == worker_for(chat_id_of(routed[0]), 2)
+
+def test_group_chats_route_to_a_valid_worker():
+    assert all(0 <= worker_for(chat_id, 3) < 3 for chat_id in (-1001234567890, -5, 0, 7))
+
+def test_full_worker_queue_is_refused():
+    pool = WorkerPool(workers=1, queue_size=1)
+    assert pool.try_route(_update(1, 42))
+    assert not pool.try_route(_update(2, 42))
+
+def test_workers_get_their_own_single_writer_files():
+    assert worker_environment(0) == {}
+    first, second = worker_environment(1), worker_environment(2)
+    assert first["PRICE_HISTORY_DIR"] != second["PRICE_HISTORY_DIR"]
+    assert first.get("NEWS_STORE_DB_PATH") != second.get("NEWS_STORE_DB_PATH") or not first.get("NEWS_STORE_DB_PATH")
@@ -0,0 +1,38 @@
+# test_coin_resolver.py
+from services.coin_resolver import CoinResolver, _default_coins
+
+def _resolver():
+    """The seed coins plus tiny coins named like everyday words, ranked far down the map."""
+    coins = _default_coins() + [
+        {'id': 9001, 'name': 'I', 'symbol': 'I', 'slug': 'i', 'rank': 4210},
+        {'id': 9002, 'name': 'SEC', 'symbol': 'SEC', 'slug': 'sec', 'rank': 2875},
+        {'id': 9003, 'name': 'Want', 'symbol': 'WANT', 'slug': 'want', 'rank': 6120},
+        {'id': 9004, 'name': 'Ruling', 'symbol': 'RULE', 'slug': 'ruling', 'rank': 7333},
+    ]
+    return CoinResolver(coins=coins)
+
+def _symbol(resolver, query):
+    coin = resolver.resolve(query)
+    return coin['symbol'] if coin else None
+
+def test_single_letter_and_stopword_do_not_match():
+    assert _symbol(_resolver(), "I want news about bitcoin") == "BTC"
+
+def test_capitalised_word_of_an_obscure_coin_does_not_win():
+    assert _symbol(_resolver(), "What does the SEC ruling mean for ETH?") == "ETH"
+
+def test_obscure_coins_are_not_picked_from_free_text():
+    assert _symbol(_resolver(), "I want the SEC ruling") is None
+
+def test_best_ranked_candidate_wins():
+    # both are capitalised symbols; SOL is ranked above DOGE whatever the word order
+    assert _symbol(_resolver(), "DOGE or SOL?") == "SOL"
+
+def test_exact_lookup_still_finds_obscure_coins():
+    assert _resolver().lookup("SEC")['id'] == 9002
+
+def test_multi_word_names_and_typos():
+    resolver = _resolver()
+    assert _symbol(resolver, "news about shiba inu") == "SHIB"
+    assert _symbol(resolver, "bitcion price") == "BTC"
+    assert _symbol(resolver, "how is sol doing") == "SOL"
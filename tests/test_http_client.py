@@ -0,0 +1,145 @@
+# test_http_client.py
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+
+from config import HTTP_BACKOFF_MAX_SECONDS, HTTP_MAX_RETRIES
+from services import http_client
+from services.http_client import (CircuitBreaker, CircuitOpenError, _backoff_delay, _retry_after_seconds,
+                                  _should_retry, get_json_async, close_session)
+
+# --- Circuit breaker ---
+
+def test_opens_after_threshold_and_fails_fast():
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+def test_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.state == 'half-open'
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    breaker.before_call()
+
+def test_failed_trial_reopens():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+
+# --- Retry-After and backoff ---
+
+def test_retry_after_parsing():
+    assert _retry_after_seconds("5") == 5.0
+    assert _retry_after_seconds(None) is None
+    assert _retry_after_seconds("soon") is None
+    assert 0 < _retry_after_seconds(time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() + 30))) <= 30
+
+def test_retry_after_is_honoured_up_to_the_cap():
+    assert _backoff_delay(0, retry_after=2.5) == 2.5
+    assert _should_retry(0, HTTP_BACKOFF_MAX_SECONDS)
+    assert not _should_retry(0, HTTP_BACKOFF_MAX_SECONDS + 1)
+    assert not _should_retry(HTTP_MAX_RETRIES, None)
+
+def test_backoff_stays_under_the_cap():
+    assert all(0 <= _backoff_delay(attempt) <= HTTP_BACKOFF_MAX_SECONDS for attempt in range(20))
+
+# --- Against a local server ---
+
+async def _serve(handler):
+    app = web.Application()
+    app.router.add_get("/", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/"
+
+def _run(scenario):
+    async def wrapper():
+        try:
+            return await scenario()
+        finally:
+            await close_session()
+    return asyncio.run(wrapper())
+
+def _fresh_breaker(provider, **kwargs):
+    http_client.breakers[provider] = CircuitBreaker(provider, **kwargs)
+    return http_client.breakers[provider]
+
+def test_retries_503_honouring_retry_after():
+    hits = []
+
+    async def handler(request):
+        hits.append(time.monotonic())
+        if len(hits) < 3:
+            return web.Response(status=503, headers={'Retry-After': "0"})
+        return web.json_response({'ok': True})
+
+    async def scenario():
+        runner, url = await _serve(handler)
+        try:
+            return await get_json_async("test-retry", url, timeout=(1, 1))
+        finally:
+            await runner.cleanup()
+
+    _fresh_breaker("test-retry")
+    assert _run(scenario) == {'ok': True}
+    assert len(hits) == 3
+
+def test_retry_after_above_the_cap_fails_without_retrying():
+    hits = []
+
+    async def handler(request):
+        hits.append(1)
+        return web.Response(status=429, headers={'Retry-After': str(HTTP_BACKOFF_MAX_SECONDS * 10)})
+
+    async def scenario():
+        runner, url = await _serve(handler)
+        try:
+            with pytest.raises(Exception):
+                await get_json_async("test-refuse", url, timeout=(1, 1))
+        finally:
+            await runner.cleanup()
+
+    breaker = _fresh_breaker("test-refuse")
+    _run(scenario)
+    assert len(hits) == 1
+    assert breaker.failures == 1
+
+def test_cancelled_trial_releases_the_half_open_slot():
+    async def handler(request):
+        await asyncio.sleep(1)
+        return web.json_response({})
+
+    async def scenario():
+        runner, url = await _serve(handler)
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(get_json_async("test-cancel", url, timeout=(1, 10)), 0.2)
+        finally:
+            await runner.cleanup()
+
+    breaker = _fresh_breaker("test-cancel", failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    _run(scenario)
+    # The cancelled call was the half-open trial; the next call may try again
+    breaker.before_call()
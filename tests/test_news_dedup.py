@@ -0,0 +1,30 @@
+# test_news_dedup.py
+from types import SimpleNamespace
+
+from services.news_dedup import NearDuplicateIndex, fingerprint_article, _MAX_BUCKET
+
+def _fingerprint(*keys):
+    return SimpleNamespace(keys=list(keys))
+
+def test_evicting_a_key_left_out_of_a_full_bucket():
+    # One more article than a bucket holds shares an LSH key (boilerplate text); the last one isn't in the bucket
+    window = _MAX_BUCKET + 1
+    index = NearDuplicateIndex(window=window)
+    for i in range(window):
+        index.add(f"shared-{i}", _fingerprint(12345))
+    assert len(index._buckets[12345]) == _MAX_BUCKET
+
+    # Rolling the window empties and deletes the bucket before the left-out key is evicted
+    for i in range(window):
+        index.add(f"other-{i}", _fingerprint(1000 + i))
+    assert len(index) == window
+    assert 12345 not in index._buckets
+    assert all(len(index._buckets[1000 + i]) == 1 for i in range(window))
+
+def test_finds_a_syndicated_copy():
+    index = NearDuplicateIndex()
+    original = {'title': "Bitcoin climbs above 70,000 as ETF inflows return",
+                'description': "Bitcoin rose to its highest level in a month on Tuesday as spot ETF inflows resumed."}
+    copy = dict(original, description=original['description'] + " Read more on our site.")
+    index.add("original", fingerprint_article(original))
+    assert index.find(fingerprint_article(copy)) == "original"
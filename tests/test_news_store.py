@@ -0,0 +1,39 @@
+# test_news_store.py
+from services.news_index import NewsIndex
+from services.news_store import NewsStore
+
+def _article(n, title, published="2026-10-01 12:00:00"):
+    return {'title': title, 'link': f"https://example.com/{n}", 'description': "", 'published_at': published}
+
+def _store():
+    return NewsStore(db_path=None, index=NewsIndex())
+
+def test_search_ranks_every_batch_stored_for_the_coin():
+    store = _store()
+    store.add_articles(["Bitcoin"], [_article(1, "BTC miners expand capacity")], refreshed=False)
+    store.add_articles(["Bitcoin"], [_article(2, "Bitcoin ETF inflows return")], refreshed=False)
+    titles = {a['title'] for a in store.search("Bitcoin", limit=5, coin="Bitcoin")}
+    # the symbol-only article of the earlier batch is found through alias expansion
+    assert titles == {"BTC miners expand capacity", "Bitcoin ETF inflows return"}
+
+def test_search_for_a_coin_skips_other_coins_articles():
+    store = _store()
+    store.add_articles(["Bitcoin"], [_article(1, "Bitcoin hits a new high")], refreshed=False)
+    store.add_articles(["Ethereum"], [_article(2, "Ethereum upgrade lifts bitcoin too")], refreshed=False)
+    assert [a['title'] for a in store.search("Bitcoin", coin="Bitcoin")] == ["Bitcoin hits a new high"]
+    assert len(store.search("Bitcoin")) == 2
+    assert store.search("Bitcoin", coin="Solana") == []
+
+def test_small_on_demand_fetch_does_not_serve_bigger_reads():
+    store = _store()
+    store.add_articles(["Solana"], [_article(n, f"Solana story {n}") for n in range(3)], refreshed=False)
+    store.mark_fetched("Solana", 3) # e.g. the aggregator's size=3 fetch
+    assert len(store.get_articles("Solana", limit=3)) == 3
+    assert store.get_articles("Solana", limit=10) is None # fetch a full page instead
+
+def test_on_demand_fetch_serves_reads_up_to_what_it_asked_for():
+    store = _store()
+    store.add_articles(["Solana"], [_article(n, f"Solana story {n}") for n in range(2)], refreshed=False)
+    store.mark_fetched("Solana", 10) # asked for 10, upstream only had 2
+    assert len(store.get_articles("Solana", limit=10)) == 2
+    assert store.get_articles("Bitcoin", limit=1) is None
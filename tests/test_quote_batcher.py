@@ -0,0 +1,64 @@
+# test_quote_batcher.py
+import asyncio
+
+from services.quote_batcher import QuoteBatcher
+
+def test_concurrent_gets_share_one_upstream_call():
+    requested = []
+
+    async def fetch_many(symbols):
+        requested.append(sorted(symbols))
+        return {symbol: {'symbol': symbol} for symbol in symbols if symbol != "NOPE"}
+
+    async def scenario():
+        batcher = QuoteBatcher(fetch_many, window=0.01)
+        return batcher, await asyncio.gather(batcher.get("btc"), batcher.get("ETH"), batcher.get("BTC"), batcher.get("nope"))
+
+    batcher, results = asyncio.run(scenario())
+    assert requested == [["BTC", "ETH", "NOPE"]]
+    assert [r and r['symbol'] for r in results] == ["BTC", "ETH", "BTC", None]
+    assert batcher.batches_sent == 1
+
+def test_full_batch_is_sent_without_waiting_for_the_window():
+    requested = []
+
+    async def fetch_many(symbols):
+        requested.append(sorted(symbols))
+        return {}
+
+    async def scenario():
+        batcher = QuoteBatcher(fetch_many, window=60, max_batch=2)
+        await asyncio.wait_for(asyncio.gather(batcher.get("BTC"), batcher.get("ETH")), 1)
+
+    asyncio.run(scenario())
+    assert requested == [["BTC", "ETH"]]
+
+def test_upstream_error_reaches_every_caller():
+    async def fetch_many(symbols):
+        raise ConnectionError("CoinMarketCap is down")
+
+    async def scenario():
+        batcher = QuoteBatcher(fetch_many, window=0.01)
+        return await asyncio.gather(batcher.get("BTC"), batcher.get("ETH"), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert [type(r) for r in results] == [ConnectionError, ConnectionError]
+
+def test_cancelled_batch_reaches_every_caller():
+
+    async def scenario():
+        in_flight = asyncio.Event()
+
+        async def fetch_many(symbols):
+            in_flight.set()
+            await asyncio.sleep(60)
+
+        batcher = QuoteBatcher(fetch_many, window=0.01)
+        callers = asyncio.gather(batcher.get("BTC"), batcher.get("ETH"), return_exceptions=True)
+        await in_flight.wait()
+        for task in batcher._tasks:
+            task.cancel() # e.g. the loop shutting down
+        return await asyncio.wait_for(callers, 1)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(r, asyncio.CancelledError) for r in results)
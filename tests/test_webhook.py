@@ -0,0 +1,96 @@
+# test_webhook.py
+import asyncio
+
+import aiohttp
+
+from services.telegram import SECRET_HEADER, WebhookServer
+
+def _update(update_id):
+    return {'update_id': update_id, 'message': {'message_id': update_id, 'chat': {'id': 1, 'type': 'private'}, 'text': "hi"}}
+
+class _BlockedHandler:
+    """accept() for the server: holds every update until released; refuses new ones past `capacity` (a full queue)."""
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.held = 0
+        self.handled = []
+        self.release = asyncio.Event()
+
+    async def __call__(self, update):
+        if self.held >= self.capacity:
+            return False
+        self.held += 1
+        try:
+            await self.release.wait()
+        finally:
+            self.held -= 1
+        self.handled.append(update['update_id'])
+        return True
+
+async def _start(accept, **kwargs):
+    server = await WebhookServer(accept, path="/hook", **kwargs).start(host="127.0.0.1", port=0)
+    port = server._runner.addresses[0][1]
+    return server, f"http://127.0.0.1:{port}/hook"
+
+async def _post(session, url, update, headers=None):
+    async with session.post(url, json=update, headers=headers) as response:
+        return response.status
+
+async def _wait_for(condition, timeout=2):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition() and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.01)
+
+def test_full_queue_is_answered_with_503():
+    async def scenario():
+        handler = _BlockedHandler(capacity=1)
+        server, url = await _start(handler, secret="")
+        async with aiohttp.ClientSession() as session:
+            first = asyncio.ensure_future(_post(session, url, _update(1)))
+            await _wait_for(lambda: handler.held == 1)
+            refused = await _post(session, url, _update(2)) # Telegram will deliver it again later
+            handler.release.set()
+            accepted = await first
+        await server.stop(timeout=1)
+        return accepted, refused, handler.handled, server.rejected
+
+    assert asyncio.run(scenario()) == (200, 503, [1], 1)
+
+def test_stop_refuses_new_updates_and_drains_those_in_flight():
+    async def scenario():
+        handler = _BlockedHandler(capacity=5)
+        server, url = await _start(handler, secret="")
+        async with aiohttp.ClientSession() as session:
+            in_flight = asyncio.ensure_future(_post(session, url, _update(1)))
+            await _wait_for(lambda: handler.held == 1)
+            stopping = asyncio.ensure_future(server.stop(timeout=5))
+            await asyncio.sleep(0.1)
+            refused = await _post(session, url, _update(2))
+            stopped_early = stopping.done()
+            handler.release.set()
+            accepted = await in_flight
+            await stopping
+        return accepted, refused, stopped_early, handler.handled
+
+    accepted, refused, stopped_early, handled = asyncio.run(scenario())
+    assert (accepted, refused) == (200, 503)
+    assert not stopped_early # stop() waited for the update in flight
+    assert handled == [1]
+
+def test_wrong_secret_and_malformed_updates_are_refused():
+    async def accept(update):
+        return True
+
+    async def scenario():
+        server, url = await _start(accept, secret="s3cret")
+        headers = {SECRET_HEADER: "s3cret"}
+        async with aiohttp.ClientSession() as session:
+            statuses = [
+                await _post(session, url, _update(1), {SECRET_HEADER: "wrong"}),
+                await _post(session, url, {'no': 'update_id'}, headers),
+                await _post(session, url, _update(2), headers),
+            ]
+        await server.stop(timeout=1)
+        return statuses
+
+    assert asyncio.run(scenario()) == [401, 400, 200]